@@ -0,0 +1,86 @@
+"""Notes/minute through the bulk NDJSON import, and export throughput.
+
+Runs the app in-process against the database in DATABASE_URL, streaming a
+generated NDJSON body into POST /api/notes/import (compare --one-by-one, which
+creates the same notes with POST /api/notes/), then exporting them back:
+
+    cd backend && python -m benchmarks.bench_bulk_notes --notes 100000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from fastapi.testclient import TestClient
+from main import app
+
+
+def make_note(i: int) -> dict:
+    return {
+        "title": f"Imported note {i}",
+        "content": f"Body of note {i}. " + "Migrated from another tool with a few paragraphs of text. " * 10,
+        "tags": [f"topic-{i % 20}", "imported"] if i % 3 else [],
+    }
+
+
+def ndjson_body(n: int, chunk_size: int = 64 * 1024):
+    buf = []
+    size = 0
+    for i in range(n):
+        line = json.dumps(make_note(i)) + "\n"
+        buf.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(buf).encode()
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=100000)
+    parser.add_argument("--one-by-one", type=int, default=500, help="notes to time through POST /api/notes/ for comparison")
+    args = parser.parse_args()
+
+    with TestClient(app) as client:
+        email = f"bench-{uuid.uuid4().hex[:10]}@example.com"
+        r = client.post("/api/auth/register", json={"name": "Bench", "email": email, "password": "bench-password"})
+        r.raise_for_status()
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        if args.one_by_one:
+            start = time.perf_counter()
+            for i in range(args.one_by_one):
+                client.post("/api/notes/", json=make_note(i), headers=headers).raise_for_status()
+            elapsed = time.perf_counter() - start
+            print(f"POST /api/notes/     {args.one_by_one} notes in {elapsed:.2f}s  ({args.one_by_one / elapsed * 60:,.0f} notes/min)")
+
+        body = list(ndjson_body(args.notes))   # encoded up front so only the server side is timed
+        start = time.perf_counter()
+        r = client.post("/api/notes/import", content=iter(body),
+                        headers={**headers, "Content-Type": "application/x-ndjson"})
+        r.raise_for_status()
+        elapsed = time.perf_counter() - start
+        print(f"POST /import         {r.json()['imported']} notes in {elapsed:.2f}s  ({r.json()['imported'] / elapsed * 60:,.0f} notes/min)")
+
+        for fmt in ("ndjson", "zip"):
+            start = time.perf_counter()
+            size = 0
+            with client.stream("GET", f"/api/notes/export?format={fmt}", headers=headers) as r:
+                r.raise_for_status()
+                for chunk in r.iter_bytes():
+                    size += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(f"GET /export ({fmt:6}) {size / 1e6:.1f} MB in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
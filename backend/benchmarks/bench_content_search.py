@@ -0,0 +1,88 @@
+"""Content search latency: blind index lookup vs decrypting and scanning every note.
+
+Seeds one user with generated notes through the bulk import path, then runs
+the same single-word content queries both ways, against the database in
+DATABASE_URL:
+
+    cd backend && python -m benchmarks.bench_content_search --notes 10000 --queries 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from database import get_db, init_db
+from services import bulk_notes, search_index
+from utils.security import decrypt_content, hash_password
+
+VOCABULARY = [f"word{i}" for i in range(5000)]
+
+
+def seed(n: int) -> int:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO users (name, email, hashed_password) VALUES (%s, %s, %s) RETURNING id",
+            ("Bench", f"bench-{uuid.uuid4().hex[:10]}@example.com", hash_password("bench-password"))
+        )
+        user_id = cursor.fetchone()["id"]
+        cursor.close()
+    rng = random.Random(0)
+    for start in range(0, n, bulk_notes.IMPORT_BATCH_SIZE):
+        batch = [{
+            "title": f"Note {i}",
+            "content": " ".join(rng.choices(VOCABULARY, k=120)),
+            "tags": [],
+        } for i in range(start, min(n, start + bulk_notes.IMPORT_BATCH_SIZE))]
+        bulk_notes.import_batch(user_id, batch)
+    bulk_notes.analyze()
+    return user_id
+
+
+def blind_index(cursor, user_id: int, word: str) -> set:
+    hits, _ = search_index.search(cursor, user_id, "note", [word], limit=100000)
+    return {h["item_id"] for h in hits}
+
+
+def decrypt_and_scan(cursor, user_id: int, word: str) -> set:
+    cursor.execute("SELECT id, encrypted_content FROM notes WHERE user_id = %s", (user_id,))
+    return {r["id"] for r in cursor.fetchall() if word in search_index.tokenize(decrypt_content(r["encrypted_content"]))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    init_db()
+    start = time.perf_counter()
+    user_id = seed(args.notes)
+    print(f"seeded {args.notes} notes in {time.perf_counter() - start:.1f}s (user {user_id})")
+
+    words = random.Random(1).sample(VOCABULARY, args.queries)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for name, fn in (("blind index", blind_index), ("decrypt + scan", decrypt_and_scan)):
+            timings = []
+            for word in words:
+                t = time.perf_counter()
+                matches = fn(cursor, user_id, word)
+                timings.append((time.perf_counter() - t) * 1000)
+            print(f"{name:15} mean {statistics.mean(timings):8.1f} ms  p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:8.1f} ms"
+                  f"  ({len(matches)} matches for the last query)")
+        cursor.execute("DELETE FROM note_content_index WHERE user_id = %s", (user_id,))
+        cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        cursor.close()
+
+
+if __name__ == "__main__":
+    main()
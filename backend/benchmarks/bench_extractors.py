@@ -0,0 +1,97 @@
+"""Compare PDF extraction backends on pages/sec and peak RSS.
+
+Generates a corpus of synthetic PDFs (with PyMuPDF) and extracts each one with
+every installed backend in a fresh subprocess, so peak RSS is per run:
+
+    cd backend && python -m benchmarks.bench_extractors --pages 10 100 500
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ("vault knowledge document summary extraction parallel process page range "
+         "backend latency memory token index search note archive chapter section").split()
+
+
+def generate_pdf(path: str, pages: int, lines_per_page: int = 45):
+    import pymupdf
+    rng = random.Random(pages)
+    doc = pymupdf.open()
+    for p in range(pages):
+        page = doc.new_page()
+        y = 50
+        for _ in range(lines_per_page):
+            page.insert_text((50, y), " ".join(rng.choice(WORDS) for _ in range(12)), fontsize=9)
+            y += 16
+        page.insert_text((300, 820), str(p + 1), fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def child(backend: str, path: str, parallel: bool):
+    """Extract one file and print a JSON result line (runs in its own process)."""
+    from services.ai_service import clean_extracted_pages
+    from services.extractors import EXTRACTORS, iter_pdf_pages
+    EXTRACTORS[backend].available()  # import the backend before timing
+    start = time.perf_counter()
+    pages = 0
+
+    def counted():
+        nonlocal pages
+        for page in iter_pdf_pages(path, backend=backend, parallel=parallel):
+            pages += 1
+            yield page
+
+    text = clean_extracted_pages(counted())
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(json.dumps({
+        "pages": pages, "seconds": elapsed, "chars": len(text),
+        "peak_rss_mb": round(max(peak_kb, peak_children_kb) / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--backends", nargs="+", default=None)
+    parser.add_argument("--serial", action="store_true", help="disable page-range parallelism")
+    parser.add_argument("--child", nargs=2, metavar=("BACKEND", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], not args.serial)
+        return
+
+    from services.extractors import EXTRACTORS
+    backends = args.backends or [name for name, e in EXTRACTORS.items() if e.available()]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            path = os.path.join(tmp, f"corpus-{pages}.pdf")
+            generate_pdf(path, pages)
+            for backend in backends:
+                cmd = [sys.executable, "-m", "benchmarks.bench_extractors", "--child", backend, path]
+                if args.serial:
+                    cmd.append("--serial")
+                out = subprocess.run(cmd, capture_output=True, text=True, check=True,
+                                     cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                r.update(backend=backend, file_pages=pages, pages_per_sec=round(r["pages"] / r["seconds"], 1))
+                results.append(r)
+                print(f"{pages:>5} pages  {backend:<11} {r['pages_per_sec']:>9.1f} pages/s  "
+                      f"peak RSS {r['peak_rss_mb']:>7.1f} MB  ({r['chars']} chars)")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Throughput / latency of the shared LLM client against the stub LLM server.
+
+Starts benchmarks/stub_llm.py in-process and fires concurrent summaries
+through services.llm_client, with a share of identical texts to exercise
+coalescing (the LLM cache is bypassed so every call reaches the client):
+
+    cd backend && python -m benchmarks.bench_llm_client --requests 200 --concurrency 32 --duplicates 0.3
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def start_stub(port: int, latency_ms: float, tpm: int):
+    import uvicorn
+    from benchmarks import stub_llm
+    stub_llm.CONFIG.update(latency_ms=latency_ms, tpm=tpm)
+    server = uvicorn.Server(uvicorn.Config(stub_llm.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return stub_llm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="share of requests repeating an earlier text")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--stub-tpm", type=int, default=0, help="make the stub answer 429 above this TPM")
+    parser.add_argument("--port", type=int, default=8901)
+    args = parser.parse_args()
+
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+    os.environ.setdefault("GROQ_TPM", "10000000")
+    os.environ.setdefault("GROQ_RPM", "100000")
+    stub = start_stub(args.port, args.latency_ms, args.stub_tpm)
+
+    from services import llm_client
+    from services.ai_service import SUMMARY_MODEL, SUMMARY_SYSTEM_PROMPT
+    from services.llm_scheduler import PRIORITY_BACKGROUND
+
+    rng = random.Random(0)
+    texts = []
+    for i in range(args.requests):
+        if texts and rng.random() < args.duplicates:
+            texts.append(rng.choice(texts))
+        else:
+            texts.append(f"Document {i}. " + "Knowledge vault benchmark text. " * 300)
+
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one(text):
+        async with sem:
+            start = time.perf_counter()
+            await llm_client.chat([
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": f"Summarize this document:\n\n{text}"},
+            ], SUMMARY_MODEL, 500, PRIORITY_BACKGROUND)
+            return (time.perf_counter() - start) * 1000
+
+    async def run_all():
+        return await asyncio.gather(*(one(t) for t in texts))
+
+    start = time.perf_counter()
+    latencies = sorted(llm_client.run(run_all()))
+    elapsed = time.perf_counter() - start
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))], 1)
+
+    print(f"{args.requests} requests in {elapsed:.2f}s  ({args.requests / elapsed:.1f} req/s)")
+    print(f"latency ms  p50 {pct(50)}  p95 {pct(95)}  p99 {pct(99)}  mean {statistics.mean(latencies):.1f}")
+    print(f"client {llm_client.stats()}")
+    print(f"stub   {stub.STATE}")
+    llm_client.close()
+
+
+if __name__ == "__main__":
+    main()
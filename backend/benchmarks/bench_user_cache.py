@@ -0,0 +1,68 @@
+"""Requests/sec on GET /api/notes/ with and without the authenticated-user cache.
+
+Runs the app in-process against the database in DATABASE_URL:
+
+    cd backend && python -m benchmarks.bench_user_cache --requests 2000 --concurrency 16
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from fastapi.testclient import TestClient
+from main import app
+from utils import auth_deps
+
+
+def run(client, headers, requests, concurrency):
+    def hit(_):
+        return client.get("/api/notes/", headers=headers).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        statuses = list(pool.map(hit, range(requests)))
+    elapsed = time.perf_counter() - start
+    assert all(s == 200 for s in statuses), set(statuses)
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--notes", type=int, default=20, help="notes to seed for the benchmark user")
+    args = parser.parse_args()
+
+    with TestClient(app) as client:
+        email = f"bench-{uuid.uuid4().hex[:10]}@example.com"
+        r = client.post("/api/auth/register", json={"name": "Bench", "email": email, "password": "bench-password"})
+        r.raise_for_status()
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        for i in range(args.notes):
+            client.post("/api/notes/", json={"title": f"Note {i}", "content": "benchmark", "tags": ["bench"]}, headers=headers)
+
+        # Warm up the pool and the interpreter before measuring
+        run(client, headers, 100, args.concurrency)
+
+        saved = auth_deps.user_cache.maxsize
+        auth_deps.user_cache.maxsize = 0
+        auth_deps.clear_user_cache()
+        uncached = run(client, headers, args.requests, args.concurrency)
+
+        auth_deps.user_cache.maxsize = saved
+        cached = run(client, headers, args.requests, args.concurrency)
+
+    print(f"GET /api/notes/  requests={args.requests} concurrency={args.concurrency}")
+    print(f"  without user cache: {uncached:8.1f} req/s")
+    print(f"  with user cache:    {cached:8.1f} req/s  ({(cached / uncached - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""Throughput, latency and DB query counts per endpoint under concurrent load.
+
+Drives every route in routers/ with a weighted mix of requests over many
+concurrent connections and reports, per endpoint, req/s, p50/p95/p99 latency,
+errors and the statements each request ran (the X-DB-Queries header, sent
+when the server has DB_QUERY_COUNT_HEADER=1).
+
+With --serve the script starts the stub LLM (benchmarks/stub_llm.py) and a
+uvicorn server pointed at it, so summaries and ai_boost never reach Groq.
+Users come from benchmarks/seed_data.py (--seed-file), or a few small ones
+are created over HTTP:
+
+    cd backend && python -m benchmarks.seed_data --users 20 --notes 100000 --documents 10000 --out seed.json
+    python -m benchmarks.load_test --serve --seed-file seed.json --concurrency 500 --duration 60 --out after.json
+    python -m benchmarks.load_test --diff before.json after.json
+
+Against a server started separately, pass --url instead of --serve. --mix
+overrides route weights (e.g. --mix notes.create=5,notes.export=1,auth.login=0);
+--list-routes shows them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERY_HEADER = "X-DB-Queries"
+FALLBACK_WORDS = ["meeting", "project", "budget", "travel", "recipe", "invoice", "research", "draft", "garden", "python"]
+
+
+# ── Routes ───────────────────────────────────────────────────────────────────
+#
+# Each scenario sends one request for a user and returns the response. Notes
+# and documents created during the run are the only ones deleted, so a seeded
+# dataset can be reused across runs.
+
+def _note_body(rng, user) -> dict:
+    words = rng.choices(user["words"], k=40)
+    return {"title": " ".join(words[:3]).title(), "content": " ".join(words), "tags": rng.sample(user["tags"], 2)}
+
+
+def _search(params: str):
+    async def run(client, user, rng):
+        word = rng.choice(user["words"])
+        return await client.get(f"/api/search/?q={word}{params}", headers=user["headers"])
+    return run
+
+
+async def _search_prefix(client, user, rng):
+    word = rng.choice(user["words"])
+    return await client.get(f"/api/search/?q={rng.choice(user['words'])} {word[:max(2, len(word) - 2)]}",
+                            headers=user["headers"])
+
+
+async def _login(client, user, rng):
+    return await client.post("/api/auth/login", json={"email": user["email"], "password": user["password"]})
+
+
+async def _register(client, user, rng):
+    return await client.post("/api/auth/register", json={
+        "name": "Load", "email": f"load-{uuid.uuid4().hex[:12]}@example.com", "password": "load-password"})
+
+
+async def _me(client, user, rng):
+    return await client.get("/api/auth/me", headers=user["headers"])
+
+
+async def _notes_list(client, user, rng):
+    tag = f"&tag={rng.choice(user['tags'])}" if rng.random() < 0.3 else ""
+    return await client.get(f"/api/notes/?limit=20{tag}", headers=user["headers"])
+
+
+async def _note_get(client, user, rng):
+    return await client.get(f"/api/notes/{rng.choice(user['notes'])}", headers=user["headers"])
+
+
+async def _note_create(client, user, rng):
+    r = await client.post("/api/notes/", json=_note_body(rng, user), headers=user["headers"])
+    if r.status_code == 200:
+        user["created_notes"].append(r.json()["id"])
+    return r
+
+
+async def _note_update(client, user, rng):
+    note_id = rng.choice(user["created_notes"] or user["notes"])
+    return await client.put(f"/api/notes/{note_id}", json={"content": " ".join(rng.choices(user["words"], k=40))},
+                            headers=user["headers"])
+
+
+async def _note_delete(client, user, rng):
+    if not user["created_notes"]:
+        return await _note_create(client, user, rng)
+    return await client.delete(f"/api/notes/{user['created_notes'].pop()}", headers=user["headers"])
+
+
+async def _note_related(client, user, rng):
+    return await client.get(f"/api/notes/{rng.choice(user['notes'])}/related", headers=user["headers"])
+
+
+async def _note_summarize(client, user, rng):
+    return await client.post(f"/api/notes/{rng.choice(user['notes'])}/summarize", headers=user["headers"])
+
+
+async def _notes_batch(client, user, rng):
+    ids = rng.sample(user["notes"], min(5, len(user["notes"])))
+    return await client.post("/api/notes/batch", json={"update": [{"id": i, "is_pinned": False} for i in ids]},
+                             headers=user["headers"])
+
+
+async def _notes_import(client, user, rng):
+    body = "".join(json.dumps(_note_body(rng, user)) + "\n" for _ in range(20))
+    r = await client.post("/api/notes/import", content=body.encode(),
+                          headers={**user["headers"], "Content-Type": "application/x-ndjson"})
+    return r
+
+
+async def _notes_export(client, user, rng):
+    async with client.stream("GET", "/api/notes/export?format=ndjson", headers=user["headers"]) as r:
+        async for _ in r.aiter_bytes():
+            pass
+    return r
+
+
+async def _dashboard(client, user, rng):
+    return await client.get("/api/dashboard/stats", headers=user["headers"])
+
+
+async def _documents_list(client, user, rng):
+    return await client.get("/api/documents/?limit=20", headers=user["headers"])
+
+
+def _document(suffix: str = ""):
+    async def run(client, user, rng):
+        if not user["documents"]:
+            return await _documents_list(client, user, rng)
+        return await client.get(f"/api/documents/{rng.choice(user['documents'])}{suffix}", headers=user["headers"])
+    return run
+
+
+async def _document_upload(client, user, rng):
+    text = " ".join(rng.choices(user["words"], k=300)) + f" {uuid.uuid4().hex}"
+    r = await client.post("/api/documents/upload", files={"file": ("load-test.txt", text.encode(), "text/plain")},
+                          headers=user["headers"])
+    if r.status_code == 200:
+        user["uploaded_documents"].append(r.json()["id"])
+    return r
+
+
+async def _document_delete(client, user, rng):
+    if not user["uploaded_documents"]:
+        return await _document_upload(client, user, rng)
+    return await client.delete(f"/api/documents/{user['uploaded_documents'].pop()}", headers=user["headers"])
+
+
+async def _document_rescan(client, user, rng):
+    if not user["uploaded_documents"]:
+        return await _document_upload(client, user, rng)
+    return await client.post(f"/api/documents/{rng.choice(user['uploaded_documents'])}/rescan", headers=user["headers"])
+
+
+# name -> (default weight, scenario)
+ROUTES = {
+    "auth.register": (0.0, _register),
+    "auth.login": (0.2, _login),
+    "auth.me": (3.0, _me),
+    "notes.list": (3.0, _notes_list),
+    "notes.get": (3.0, _note_get),
+    "notes.create": (1.0, _note_create),
+    "notes.update": (1.0, _note_update),
+    "notes.delete": (0.5, _note_delete),
+    "notes.related": (1.0, _note_related),
+    "notes.summarize": (0.3, _note_summarize),
+    "notes.batch": (0.2, _notes_batch),
+    "notes.import": (0.1, _notes_import),
+    "notes.export": (0.0, _notes_export),
+    "search.keyword": (2.0, _search("")),
+    "search.prefix": (1.0, _search_prefix),
+    "search.semantic": (0.5, _search("&mode=semantic")),
+    "search.hybrid": (1.0, _search("&mode=hybrid")),
+    "search.ai_boost": (0.5, _search("&ai_boost=true")),
+    "dashboard.stats": (1.0, _dashboard),
+    "documents.list": (1.0, _documents_list),
+    "documents.get": (1.0, _document()),
+    "documents.status": (0.5, _document("/status")),
+    "documents.download": (0.5, _document("/download")),
+    "documents.text": (0.3, _document("/text")),
+    "documents.upload": (0.2, _document_upload),
+    "documents.delete": (0.1, _document_delete),
+    "documents.rescan": (0.05, _document_rescan),
+}
+
+
+def parse_mix(spec: str) -> dict:
+    weights = {name: weight for name, (weight, _) in ROUTES.items()}
+    for item in filter(None, (spec or "").split(",")):
+        name, _, weight = item.partition("=")
+        if name not in ROUTES:
+            raise SystemExit(f"Unknown route {name!r}; see --list-routes")
+        weights[name] = float(weight)
+    return {name: w for name, w in weights.items() if w > 0}
+
+
+# ── Setup ────────────────────────────────────────────────────────────────────
+
+async def login(client, email: str, password: str) -> dict:
+    r = await client.post("/api/auth/login", json={"email": email, "password": password})
+    r.raise_for_status()
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    notes = (await client.get("/api/notes/?fields=id,title,tags&limit=500", headers=headers)).json()
+    documents = (await client.get("/api/documents/?fields=id&limit=200", headers=headers)).json()
+    words = [w.lower() for n in notes for w in n["title"].split() if len(w) > 2]
+    tags = list({t for n in notes for t in n["tags"]})
+    return {
+        "email": email, "password": password, "headers": headers,
+        "notes": [n["id"] for n in notes], "documents": [d["id"] for d in documents],
+        "words": words or FALLBACK_WORDS, "tags": tags or FALLBACK_WORDS[:5],
+        "created_notes": [], "uploaded_documents": [],
+    }
+
+
+async def create_user(client, notes: int, rng: random.Random) -> dict:
+    email, password = f"load-{uuid.uuid4().hex[:10]}@example.com", "load-password"
+    r = await client.post("/api/auth/register", json={"name": "Load", "email": email, "password": password})
+    r.raise_for_status()
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    body = "".join(json.dumps({
+        "title": f"{rng.choice(FALLBACK_WORDS).title()} note {i}",
+        "content": " ".join(rng.choices(FALLBACK_WORDS, k=60)),
+        "tags": rng.sample(FALLBACK_WORDS, 2),
+    }) + "\n" for i in range(notes))
+    r = await client.post("/api/notes/import", content=body.encode(),
+                          headers={**headers, "Content-Type": "application/x-ndjson"}, timeout=300)
+    r.raise_for_status()
+    for i in range(3):
+        await client.post("/api/documents/upload", headers=headers,
+                          files={"file": (f"doc-{i}.txt", " ".join(rng.choices(FALLBACK_WORDS, k=500)).encode(), "text/plain")})
+    return await login(client, email, password)
+
+
+def start_server(args) -> subprocess.Popen:
+    from benchmarks.bench_llm_client import start_stub
+    start_stub(args.stub_port, args.stub_latency_ms, 0)
+    env = {**os.environ, "GROQ_BASE_URL": f"http://127.0.0.1:{args.stub_port}",
+           "GROQ_API_KEY": os.getenv("GROQ_API_KEY") or "stub", "DB_QUERY_COUNT_HEADER": "1"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--workers", str(args.workers),
+         "--log-level", "warning"], cwd=BACKEND_DIR, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/").status_code == 200:
+                return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("server did not start")
+
+
+# ── Load ─────────────────────────────────────────────────────────────────────
+
+async def worker(client, users, mix, deadline, rng, samples):
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            r = await ROUTES[name][1](client, rng.choice(users), rng)
+            ok, queries = r.status_code < 400, r.headers.get(QUERY_HEADER)
+        except httpx.HTTPError:
+            ok, queries = False, None
+        samples[name].append(((time.perf_counter() - start) * 1000, ok, int(queries) if queries else None))
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    latencies = sorted(ms for ms, ok, _ in samples if ok)
+    queries = [q for _, ok, q in samples if ok and q is not None]
+    q = statistics.quantiles(latencies, n=100) if len(latencies) >= 2 else [latencies[0] if latencies else 0.0] * 99
+    return {
+        "requests": len(samples),
+        "errors": sum(not ok for _, ok, _ in samples),
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(q[49], 1), "p95_ms": round(q[94], 1), "p99_ms": round(q[98], 1),
+        "mean_ms": round(statistics.mean(latencies), 1) if latencies else 0.0,
+        "db_queries_mean": round(statistics.mean(queries), 2) if queries else None,
+        "db_queries_max": max(queries) if queries else None,
+    }
+
+
+async def run(args) -> dict:
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        if args.seed_file:
+            with open(args.seed_file) as f:
+                seeded = json.load(f)["users"][:args.users]
+            users = [await login(client, u["email"], u["password"]) for u in seeded]
+        else:
+            rng = random.Random(args.seed)
+            users = [await create_user(client, args.notes, rng) for _ in range(args.users)]
+
+        # Warm up connections, caches and pools before measuring
+        await asyncio.gather(*(worker(client, users, mix, time.perf_counter() + args.warmup, random.Random(-i - 1),
+                                      defaultdict(list)) for i in range(args.concurrency)))
+        samples = defaultdict(list)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, users, mix, start + args.duration, random.Random(args.seed + i), samples)
+                               for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "meta": {"commit": commit, "timestamp": datetime.now().isoformat(timespec="seconds"), "url": args.url,
+                 "concurrency": args.concurrency, "duration_s": round(elapsed, 1), "users": len(users),
+                 "seed_file": args.seed_file, "mix": mix},
+        "routes": {name: summarize(samples[name], elapsed) for name in mix if samples[name]},
+        "total": summarize([s for values in samples.values() for s in values], elapsed),
+    }
+
+
+# ── Reporting ────────────────────────────────────────────────────────────────
+
+def print_results(results: dict):
+    meta = results["meta"]
+    print(f"{meta['url']}  commit={meta['commit']}  concurrency={meta['concurrency']}  duration={meta['duration_s']}s")
+    print(f"  {'route':20} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'queries':>8}")
+    for name, r in list(results["routes"].items()) + [("all", results["total"])]:
+        queries = "" if r["db_queries_mean"] is None else f"{r['db_queries_mean']:.1f}"
+        print(f"  {name:20} {r['rps']:8.1f} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f} {r['errors']:7d} {queries:>8}")
+
+
+def print_diff(base: dict, new: dict, threshold: float):
+    """Side-by-side p95 / req/s / query counts; flags p95 or query regressions beyond ``threshold``."""
+    print(f"  {base['meta']['commit']} → {new['meta']['commit']}")
+    print(f"  {'route':20} {'p95 ms':>17} {'req/s':>17} {'queries':>13}")
+    regressions = 0
+    for name in list(new["routes"]) + ["all"]:
+        a = base["total"] if name == "all" else base["routes"].get(name)
+        b = new["total"] if name == "all" else new["routes"][name]
+        if a is None:
+            continue
+        worse = b["p95_ms"] > a["p95_ms"] * (1 + threshold) or (
+            a["db_queries_mean"] is not None and b["db_queries_mean"] is not None
+            and b["db_queries_mean"] > a["db_queries_mean"] + 0.01)
+        regressions += worse
+        queries = (f"{a['db_queries_mean']:5.1f} → {b['db_queries_mean']:5.1f}"
+                   if a["db_queries_mean"] is not None and b["db_queries_mean"] is not None else "")
+        print(f"{'!' if worse else ' '} {name:20} {a['p95_ms']:7.1f} → {b['p95_ms']:7.1f} "
+              f"{a['rps']:7.1f} → {b['rps']:7.1f} {queries:>13}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--serve", action="store_true", help="start the stub LLM and a uvicorn server for the run")
+    parser.add_argument("--port", type=int, default=8000, help="port for --serve")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for --serve")
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--stub-latency-ms", type=float, default=300)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--seed-file", help="users written by benchmarks/seed_data.py")
+    parser.add_argument("--users", type=int, default=20, help="users to use (or create without --seed-file)")
+    parser.add_argument("--notes", type=int, default=200, help="notes per created user without --seed-file")
+    parser.add_argument("--mix", help="route=weight overrides, comma separated")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--compare", help="results JSON of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="p95 increase counted as a regression")
+    parser.add_argument("--diff", nargs=2, metavar=("BASE", "NEW"), help="compare two results files and exit")
+    parser.add_argument("--list-routes", action="store_true")
+    args = parser.parse_args()
+
+    if args.list_routes:
+        for name, (weight, _) in ROUTES.items():
+            print(f"  {name:20} {weight:g}")
+        return
+    if args.diff:
+        with open(args.diff[0]) as a, open(args.diff[1]) as b:
+            raise SystemExit(1 if print_diff(json.load(a), json.load(b), args.threshold) else 0)
+
+    server = None
+    if args.serve:
+        sys.path.insert(0, BACKEND_DIR)
+        server = start_server(args)
+        args.url = f"http://127.0.0.1:{args.port}"
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_results(results)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            raise SystemExit(1 if print_diff(json.load(f), results, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Seed the database in DATABASE_URL with synthetic users, notes and documents.
+
+Notes (with tags, spread over the last year) go through the bulk import path,
+so search / tag / rollup tables are filled the way the app fills them.
+Documents get a text file in the blob store plus realistic extracted text and
+a summary, as if the worker had processed them. Scales from a few thousand
+to around a million rows:
+
+    cd backend && python -m benchmarks.seed_data --users 20 --notes 100000 --documents 10000 --out seed.json
+
+The JSON written to --out lists the users' credentials for benchmarks/load_test.py.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from psycopg2.extras import execute_values
+
+from database import get_db
+from services import blobs, bulk_notes, document_text, search_index, stats
+from services.embeddings import document_embedding_text, get_embedder, to_bytes
+from utils.security import hash_password
+
+DOCUMENT_BATCH_SIZE = 200
+_ONSETS = ["b", "c", "d", "f", "g", "l", "m", "n", "p", "r", "s", "t", "v", "st", "pr", "tr", "ch", "sh"]
+_NUCLEI = ["a", "e", "i", "o", "u", "ea", "ou", "ai"]
+_CODAS = ["", "n", "r", "s", "t", "l", "nd", "st", "ck"]
+
+
+class TextGenerator:
+    """Zipf-distributed words from a fixed synthetic vocabulary, so term and
+    document frequencies look like natural language to the BM25 index."""
+
+    def __init__(self, rng: random.Random, vocabulary: int = 8000):
+        self.rng = rng
+        words = set()
+        while len(words) < vocabulary:
+            words.add("".join(rng.choice(_ONSETS) + rng.choice(_NUCLEI) + rng.choice(_CODAS)
+                              for _ in range(rng.choice((1, 2, 2, 3)))))
+        self.words = sorted(words, key=lambda w: (len(w), w))
+        self.cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(self.words))))
+
+    def sentence(self) -> str:
+        words = self.rng.choices(self.words, cum_weights=self.cum_weights, k=self.rng.randint(6, 18))
+        return " ".join(words).capitalize() + self.rng.choice(".....?!")
+
+    def paragraph(self) -> str:
+        return " ".join(self.sentence() for _ in range(self.rng.randint(2, 6)))
+
+    def text(self, approx_chars: int) -> str:
+        parts, size = [], 0
+        while size < approx_chars:
+            parts.append(self.paragraph())
+            size += len(parts[-1]) + 2
+        return "\n\n".join(parts)
+
+    def title(self) -> str:
+        return " ".join(self.rng.choices(self.words, cum_weights=self.cum_weights, k=self.rng.randint(2, 5))).title()
+
+
+def create_users(count: int, password: str, tag: str) -> list:
+    hashed = hash_password(password)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        rows = execute_values(cursor, "INSERT INTO users (name, email, hashed_password) VALUES %s RETURNING id, email", [
+            (f"Seed user {i}", f"seed-{tag}-{i}@example.com", hashed) for i in range(count)
+        ], fetch=True)
+        cursor.close()
+    return [{"id": r["id"], "email": r["email"], "password": password} for r in rows]
+
+
+def seed_notes(user_id: int, count: int, gen: TextGenerator, tags: list, now: datetime):
+    rng = gen.rng
+    for start in range(0, count, bulk_notes.IMPORT_BATCH_SIZE):
+        batch = []
+        for _ in range(min(bulk_notes.IMPORT_BATCH_SIZE, count - start)):
+            created = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+            batch.append({
+                "title": gen.title(),
+                "content": gen.text(rng.choice((200, 600, 1500, 4000))),
+                "tags": rng.sample(tags, rng.choice((0, 1, 2, 2, 3))),
+                "is_pinned": rng.random() < 0.02,
+                "created_at": created.isoformat(),
+                "updated_at": (created + timedelta(seconds=rng.randint(0, 30 * 24 * 3600))).isoformat(),
+            })
+        bulk_notes.import_batch(user_id, batch)
+
+
+def seed_documents(user_id: int, count: int, gen: TextGenerator, doc_kb: float, now: datetime):
+    rng = gen.rng
+    for start in range(0, count, DOCUMENT_BATCH_SIZE):
+        docs = []
+        for i in range(min(DOCUMENT_BATCH_SIZE, count - start)):
+            text = gen.text(int(rng.uniform(0.25, 1.75) * doc_kb * 1024))
+            docs.append({
+                "name": f"{gen.title()}.txt",
+                "text": text,
+                "data": text.encode(),
+                "summary": " ".join(gen.sentence() for _ in range(3)),
+                "created_at": now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)),
+            })
+        vectors = get_embedder().embed([document_embedding_text(d["name"], d["summary"], d["text"]) for d in docs])
+        with get_db() as conn:
+            cursor = conn.cursor()
+            for d in docs:
+                d["sha256"] = hashlib.sha256(d["data"]).hexdigest()
+                tmp_path = os.path.join(blobs.UPLOAD_DIR, f".seed-{uuid.uuid4().hex}.part")
+                with open(tmp_path, "wb") as f:
+                    f.write(d["data"])
+                d["blob"] = blobs.store(cursor, tmp_path, d["sha256"], len(d["data"]), ".txt")
+                blobs.save_results(cursor, d["sha256"], d["text"], d["summary"])
+            rows = execute_values(cursor, """
+                INSERT INTO documents (user_id, filename, original_name, text_length, summary, embedding,
+                                       file_size, status, content_sha256, deduplicated, created_at)
+                VALUES %s RETURNING id
+            """, [
+                (user_id, d["blob"]["filename"], d["name"], len(d["text"]), d["summary"],
+                 to_bytes(v), len(d["data"]), "done", d["sha256"], not d["blob"]["created"], d["created_at"])
+                for d, v in zip(docs, vectors)
+            ], page_size=len(docs), fetch=True)
+            for d, r in zip(docs, rows):
+                document_text.store(cursor, r["id"], d["text"])
+                search_index.index_document(cursor, user_id, r["id"], d["name"], d["summary"])
+            cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--notes", type=int, default=10000, help="total across all users")
+    parser.add_argument("--documents", type=int, default=1000, help="total across all users")
+    parser.add_argument("--doc-kb", type=float, default=8, help="average extracted text size per document")
+    parser.add_argument("--tags", type=int, default=50, help="distinct tags to draw from")
+    parser.add_argument("--password", default="seed-password")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="seed.json")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    gen = TextGenerator(rng)
+    tags = list(dict.fromkeys(gen.title().split()[0] for _ in range(args.tags * 4)))[:args.tags]
+    os.makedirs(blobs.UPLOAD_DIR, exist_ok=True)
+    now = datetime.now()
+    start = time.perf_counter()
+
+    users = create_users(args.users, args.password, uuid.uuid4().hex[:8])
+    for i, user in enumerate(users):
+        notes = args.notes // args.users + (i < args.notes % args.users)
+        documents = args.documents // args.users + (i < args.documents % args.users)
+        seed_notes(user["id"], notes, gen, tags, now)
+        seed_documents(user["id"], documents, gen, args.doc_kb, now)
+        with get_db() as conn:
+            cursor = conn.cursor()
+            stats.rebuild_user(cursor, user["id"])
+            cursor.close()
+        print(f"user {user['id']}: {notes} notes, {documents} documents ({time.perf_counter() - start:.0f}s)")
+    bulk_notes.analyze()
+
+    with open(args.out, "w") as f:
+        json.dump({"users": users, "notes": args.notes, "documents": args.documents, "tags": tags,
+                   "seeded_at": now.isoformat()}, f, indent=2)
+    print(f"✅ Seeded {args.users} users, {args.notes} notes, {args.documents} documents "
+          f"in {time.perf_counter() - start:.0f}s → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
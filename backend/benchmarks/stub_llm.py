@@ -0,0 +1,102 @@
+"""Local stand-in for the Groq chat completions API, for offline load tests.
+
+Answers POST /openai/v1/chat/completions after a configurable delay with a
+deterministic "summary" (or a JSON keyword list for query expansion), reports
+token usage, and can enforce its own TPM limit with 429 + Retry-After:
+
+    cd backend && python -m benchmarks.stub_llm --port 8900 --latency-ms 300 --tpm 6000
+    GROQ_BASE_URL=http://127.0.0.1:8900 GROQ_API_KEY=stub uvicorn main:app
+
+GET /stats returns request / 429 counts.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Stub LLM")
+
+CONFIG = {"latency_ms": 200.0, "tpm": 0}
+STATE = {"requests": 0, "rate_limited": 0, "tokens": 0}
+_window = []   # (timestamp, tokens) of the last minute of requests
+
+
+def _tokens(text: str) -> int:
+    return max(1, int(len(text) / 3.5))
+
+
+def _reply(messages: list) -> str:
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    user = messages[-1]["content"] if messages else ""
+    if "expander" in system:
+        words = [w.strip(".,;:!?\"'").lower() for w in user.split() if len(w) > 3][:3]
+        return json.dumps(words + [f"{user} overview", f"{user} notes"])
+    digest = hashlib.sha1(user.encode()).hexdigest()[:8]
+    words = " ".join(user.split()[-40:])
+    return f"Stub summary {digest} of {len(user)} chars. {words}"
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    prompt_tokens = sum(_tokens(m.get("content", "")) for m in messages)
+    max_tokens = body.get("max_tokens") or 256
+
+    if CONFIG["tpm"]:
+        now = time.monotonic()
+        while _window and _window[0][0] < now - 60:
+            _window.pop(0)
+        used = sum(t for _, t in _window)
+        if used + prompt_tokens > CONFIG["tpm"]:
+            STATE["rate_limited"] += 1
+            retry_after = max(0.1, 60 - (now - _window[0][0])) if _window else 1.0
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": f"{retry_after:.2f}"},
+                content={"error": {"message": "Rate limit reached for tokens per minute", "type": "tokens", "code": "rate_limit_exceeded"}},
+            )
+        _window.append((now, prompt_tokens + max_tokens))
+
+    await asyncio.sleep(CONFIG["latency_ms"] / 1000)
+    content = _reply(messages)
+    completion_tokens = min(max_tokens, _tokens(content))
+    STATE["requests"] += 1
+    STATE["tokens"] += prompt_tokens + completion_tokens
+    return {
+        "id": f"chatcmpl-stub-{STATE['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.get("/stats")
+def stats():
+    return STATE
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=CONFIG["latency_ms"])
+    parser.add_argument("--tpm", type=int, default=0, help="answer 429 above this many tokens/minute (0 = unlimited)")
+    args = parser.parse_args()
+    CONFIG.update(latency_ms=args.latency_ms, tpm=args.tpm)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,464 @@
 import psycopg2
 import psycopg2.extras
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
+from collections import deque
+from contextvars import ContextVar
+from functools import lru_cache
+import io
 import os
+import re
+import threading
+import time
+
+from utils import metrics, slow_queries
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# ── Connection pool settings ──────────────────────
+# Sized per process: with gunicorn, total connections = workers × DB_POOL_MAX.
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))          # max seconds to wait for a connection
+DB_POOL_MAX_WAITING = int(os.getenv("DB_POOL_MAX_WAITING", "100"))   # bounded wait queue
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))       # close connections idle longer than this
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+DB_POOL_CHECK_AFTER = float(os.getenv("DB_POOL_CHECK_AFTER", "30"))  # ping connections idle longer than this
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available in time, or the wait queue is full."""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 connection pool.
+
+    - keeps between ``minconn`` and ``maxconn`` connections open
+    - validates connections on checkout (closed / broken / idle for a while → ping)
+    - recycles connections that sat idle or lived longer than the configured limits
+    - callers beyond ``maxconn`` wait in a bounded FIFO queue up to ``timeout`` seconds
+    """
+
+    def __init__(self, dsn, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 max_waiting=DB_POOL_MAX_WAITING, max_idle=DB_POOL_MAX_IDLE,
+                 max_lifetime=DB_POOL_MAX_LIFETIME, check_after=DB_POOL_CHECK_AFTER):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = max(maxconn, 1)
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+
+        self._lock = threading.Condition()
+        self._idle = deque()        # most recently returned on the right
+        self._in_use = {}           # id(conn) -> _PooledConnection
+        self._opening = 0
+        self._waiting = 0
+        self._closed = False
+
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "failed_health_checks": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+        for _ in range(self.minconn):
+            self._idle.append(self._open())
+
+    # ── internals ────────────────────────────────
+    def _open(self):
+        conn = psycopg2.connect(self.dsn)
+        conn.cursor_factory = RecordingCursor
+        self._stats["connections_opened"] += 1
+        return _PooledConnection(conn)
+
+    def _discard(self, pooled):
+        self._stats["connections_closed"] += 1
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, pooled, now):
+        return (now - pooled.created_at > self.max_lifetime
+                or (now - pooled.last_used > self.max_idle and self._total() > self.minconn))
+
+    def _healthy(self, pooled, now):
+        conn = pooled.conn
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if now - pooled.last_used > self.check_after:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _total(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    # ── public API ───────────────────────────────
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            pooled = None
+            with self._lock:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                if not self._idle and self._total() >= self.maxconn and self._waiting >= self.max_waiting:
+                    self._stats["rejected"] += 1
+                    raise PoolTimeout("Too many clients waiting for a database connection")
+                self._waiting += 1
+                try:
+                    while not self._idle and self._total() >= self.maxconn:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection")
+                        self._lock.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                if self._idle:
+                    pooled = self._idle.pop()
+                # Reserve the slot while validating / opening outside the lock
+                self._opening += 1
+
+            try:
+                now = time.monotonic()
+                if pooled is not None and self._expired(pooled, now):
+                    self._discard(pooled)
+                    continue
+                if pooled is not None and not self._healthy(pooled, now):
+                    self._stats["failed_health_checks"] += 1
+                    self._discard(pooled)
+                    continue
+                if pooled is None:
+                    pooled = self._open()
+            finally:
+                with self._lock:
+                    self._opening -= 1
+                    if pooled is not None and not pooled.conn.closed:
+                        self._in_use[id(pooled.conn)] = pooled
+                    self._lock.notify()
+            break
+
+        with self._lock:
+            waited = time.monotonic() - start
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+        return pooled.conn
+
+    def putconn(self, conn, discard=False):
+        with self._lock:
+            pooled = self._in_use.pop(id(conn), None)
+            if pooled is None:
+                return
+            if (discard or self._closed or conn.closed
+                    or conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE):
+                self._discard(pooled)
+            else:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+            self._lock.notify()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._lock.notify_all()
+
+    def stats(self) -> dict:
+        with self._lock:
+            checkouts = self._stats["checkouts"]
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "size": self._total(),
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "checkouts": checkouts,
+                "timeouts": self._stats["timeouts"],
+                "rejected": self._stats["rejected"],
+                "connections_opened": self._stats["connections_opened"],
+                "connections_closed": self._stats["connections_closed"],
+                "failed_health_checks": self._stats["failed_health_checks"],
+                "checkout_wait_avg_ms": round(self._stats["wait_time_total"] / checkouts * 1000, 3) if checkouts else 0.0,
+                "checkout_wait_max_ms": round(self._stats["wait_time_max"] * 1000, 3),
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Return this process's pool, creating it lazily (so each gunicorn worker gets its own after fork)."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(DATABASE_URL)
+                _pool_pid = pid
+    return _pool
+
+def pool_stats() -> dict:
+    return get_pool().stats()
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+# ── Statement recording / counting ──────────────────
+# While record_statements() is active, every statement run through either pool
+# is appended, with its parameters bound, to the list it yields (manage.py
+# check-plans). statement_counter is a per-request [count] set by
+# utils/query_count.py; threadpool calls copy the context, so they share it.
+# Every statement's duration goes to the db_query_duration_seconds histogram,
+# labelled by operation and the first table it names.
+_recorded = None
+statement_counter = ContextVar("statement_counter", default=None)
+
+DB_QUERY_SECONDS = metrics.histogram("db_query_duration_seconds", "Time to execute a statement",
+                                     ("pool", "operation", "table"), buckets=metrics.QUERY_BUCKETS)
+DB_QUERY_ERRORS = metrics.counter("db_query_errors_total", "Statements that raised", ("pool", "operation", "table"))
+_OPERATION = re.compile(r"^[\s(]*(\w+)")
+_TABLE = {
+    "update": re.compile(r"^\s*UPDATE\s+(?:ONLY\s+)?(\w+)", re.IGNORECASE),
+    "insert": re.compile(r"\bINTO\s+(\w+)", re.IGNORECASE),
+}
+_FROM = re.compile(r"\bFROM\s+(?:ONLY\s+)?(\w+)", re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def _classify(query: str) -> tuple:
+    """(operation, table) for a SQL string, e.g. ("select", "notes")."""
+    match = _OPERATION.match(query)
+    operation = match.group(1).lower() if match else "other"
+    match = _TABLE.get(operation, _FROM).search(query)
+    return operation, match.group(1).lower() if match else ""
+
+def _count_statement():
+    counter = statement_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+def _observe_statement(pool: str, query, params, start: float, failed: bool):
+    elapsed = time.perf_counter() - start
+    labels = (pool,) + (_classify(query) if isinstance(query, str) else ("other", ""))
+    DB_QUERY_SECONDS.observe(elapsed, labels)
+    if failed:
+        DB_QUERY_ERRORS.inc(labels)
+    threshold = slow_queries.threshold_ms()
+    if threshold and elapsed * 1000 >= threshold and isinstance(query, str):
+        slow_queries.record(pool, labels[1], labels[2], query, params, elapsed, failed)
+
+@contextmanager
+def record_statements():
+    global _recorded
+    _recorded = statements = []
+    try:
+        yield statements
+    finally:
+        _recorded = None
+
+class RecordingCursor(psycopg2.extras.RealDictCursor):
+    def execute(self, query, vars=None):
+        _count_statement()
+        if _recorded is not None:
+            _recorded.append(self.mogrify(query, vars).decode())
+        start, failed = time.perf_counter(), True
+        try:
+            result = super().execute(query, vars)
+            failed = False
+            return result
+        finally:
+            _observe_statement("sync", query, vars, start, failed)
+
 def get_connection():
     conn = psycopg2.connect(DATABASE_URL)
     return conn
 
+# ── After-commit callbacks ──────────────────────────
+# In-process state patched by a write (the vector matrices in
+# services/vector_index.py) must not change before the write commits, or a
+# rollback leaves it ahead of the database. Code inside get_db() registers
+# after_commit(cursor, fn, *args); get_db() runs the callbacks once the
+# transaction has committed and drops them on rollback. A connection is used
+# by one thread at a time, so the per-connection lists need no lock.
+_after_commit = {}
+
+def after_commit(cursor, fn, *args):
+    _after_commit.setdefault(id(cursor.connection), []).append((fn, args))
+
 @contextmanager
 def get_db():
-    conn = get_connection()
-    conn.cursor_factory = psycopg2.extras.RealDictCursor
+    pool = get_pool()
+    conn = pool.getconn()
+    _after_commit.pop(id(conn), None)
+    broken = False
+    callbacks = ()
     try:
         yield conn
         conn.commit()
+        callbacks = _after_commit.pop(id(conn), ())
     except Exception:
-        conn.rollback()
+        _after_commit.pop(id(conn), None)
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
         raise
     finally:
-        conn.close()
+        pool.putconn(conn, discard=broken or conn.closed)
+    for fn, args in callbacks:
+        fn(*args)
+
+# ── Async pool (psycopg 3) ───────────────────────
+# The read hot paths (auth, note/document reads, search, dashboard) run on the
+# event loop instead of holding a threadpool worker for every query. Cursors
+# bind parameters client-side, like psycopg2, so the same SQL strings work
+# on both pools. Write transactions stay on the sync pool with the service
+# hooks that take a psycopg2 cursor.
+DB_ASYNC_POOL_MIN = int(os.getenv("DB_ASYNC_POOL_MIN", "2"))
+DB_ASYNC_POOL_MAX = int(os.getenv("DB_ASYNC_POOL_MAX", "20"))
+
+_async_pool = None
+_async_pool_lock = None
+
+async def get_async_pool():
+    global _async_pool, _async_pool_lock
+    if _async_pool is None:
+        import asyncio
+        from psycopg import AsyncClientCursor
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+
+        class RecordingAsyncCursor(AsyncClientCursor):
+            async def execute(self, query, params=None, **kwargs):
+                _count_statement()
+                if _recorded is not None:
+                    _recorded.append(self.mogrify(query, params))
+                start, failed = time.perf_counter(), True
+                try:
+                    result = await super().execute(query, params, **kwargs)
+                    failed = False
+                    return result
+                finally:
+                    _observe_statement("async", query, params, start, failed)
+
+        if _async_pool_lock is None:
+            _async_pool_lock = asyncio.Lock()
+        async with _async_pool_lock:
+            if _async_pool is None:
+                pool = AsyncConnectionPool(
+                    DATABASE_URL,
+                    min_size=DB_ASYNC_POOL_MIN,
+                    max_size=DB_ASYNC_POOL_MAX,
+                    timeout=DB_POOL_TIMEOUT,
+                    max_waiting=DB_POOL_MAX_WAITING,
+                    max_idle=DB_POOL_MAX_IDLE,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    kwargs={"row_factory": dict_row, "cursor_factory": RecordingAsyncCursor},
+                    open=False,
+                )
+                await pool.open()
+                _async_pool = pool
+    return _async_pool
+
+@asynccontextmanager
+async def get_adb():
+    """Async counterpart of get_db(): commits on success, rolls back on error."""
+    from psycopg_pool import PoolTimeout as AsyncPoolTimeout, TooManyRequests
+
+    pool = await get_async_pool()
+    try:
+        async with pool.connection() as conn:
+            yield conn
+    except (AsyncPoolTimeout, TooManyRequests) as e:
+        raise PoolTimeout(str(e)) from e
+
+async def fetchall(conn, sql: str, params=None) -> list:
+    cursor = await conn.execute(sql, params)
+    return await cursor.fetchall()
+
+async def fetchone(conn, sql: str, params=None):
+    cursor = await conn.execute(sql, params)
+    return await cursor.fetchone()
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+# ── Pool metrics (read when /metrics is scraped) ─
+def _pool_connections() -> dict:
+    values = {}
+    if _pool is not None and _pool_pid == os.getpid():
+        s = _pool.stats()
+        values.update({("sync", "in_use"): s["in_use"], ("sync", "idle"): s["idle"], ("sync", "waiting"): s["waiting"]})
+    if _async_pool is not None:
+        s = _async_pool.get_stats()
+        values.update({
+            ("async", "in_use"): s.get("pool_size", 0) - s.get("pool_available", 0),
+            ("async", "idle"): s.get("pool_available", 0),
+            ("async", "waiting"): s.get("requests_waiting", 0),
+        })
+    return values
+
+def _pool_events() -> dict:
+    if _pool is None or _pool_pid != os.getpid():
+        return {}
+    s = _pool.stats()
+    return {(event,): s[event] for event in ("checkouts", "timeouts", "rejected", "connections_opened", "connections_closed")}
+
+metrics.callback("db_pool_connections", "Connections per pool by state (waiting = callers queued for one)",
+                 _pool_connections, ("pool", "state"))
+metrics.callback("db_pool_events_total", "Sync pool checkouts, timeouts, rejections and connections opened / closed",
+                 _pool_events, ("event",), type="counter")
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+def copy_rows(cursor, table: str, columns: tuple, rows):
+    """Bulk-insert rows with COPY FROM STDIN (text format); much cheaper than INSERT for big batches."""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join(
+            v.translate(_COPY_ESCAPES) if isinstance(v, str) else "\\N" if v is None else str(v) for v in row
+        ))
+        buf.write("\n")
+    buf.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
 
 def init_db():
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                name TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                hashed_password TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS notes (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                encrypted_content TEXT NOT NULL,
-                tags TEXT DEFAULT '[]',
-                embedding TEXT DEFAULT NULL,
-                is_pinned INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            );
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                filename TEXT NOT NULL,
-                original_name TEXT NOT NULL,
-                file_url TEXT NOT NULL,
-                extracted_text TEXT,
-                summary TEXT,
-                embedding TEXT DEFAULT NULL,
-                file_size INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            );
-        """)
-        cursor.close()
-    print("✅ Database initialized")
\ No newline at end of file
+    """Apply pending migrations (migrations/). Deployments run `python manage.py migrate`."""
+    from migrations import migrate
+    migrate()
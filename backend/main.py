@@ -1,12 +1,18 @@
 from dotenv import load_dotenv
 load_dotenv()
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import os
 
-from database import init_db
-from routers import auth, notes, documents, search, dashboard
+from database import close_pool, close_async_pool, pool_stats, PoolTimeout
+import migrations
+from utils.uploads import MaxBodySizeMiddleware
+from utils.query_count import QueryCountMiddleware, DB_QUERY_COUNT_HEADER
+from utils import metrics
+from utils.profiling import ProfilingMiddleware
+from services import llm_cache, llm_scheduler, llm_client, query_expansion
+from routers import auth, notes, documents, search, dashboard, admin
 
 app = FastAPI(title="Knowledge Vault API", version="1.0.0")
 
@@ -16,21 +22,61 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-DB-Queries", "X-Profile-Id", "ETag"],
 )
 
+app.add_middleware(MaxBodySizeMiddleware, paths=("/api/documents/upload",))
+
+if DB_QUERY_COUNT_HEADER:
+    app.add_middleware(QueryCountMiddleware)
+
+app.add_middleware(ProfilingMiddleware)
+
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Uploaded files are only served through /api/documents/{id}/download and
+# signed links (utils/downloads.py), never as a public static directory
 os.makedirs("uploads", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"detail": "Database busy, please retry"}, headers={"Retry-After": "1"})
 
 @app.on_event("startup")
 async def startup():
-    init_db()
+    migrations.check_on_startup()
+
+@app.on_event("shutdown")
+async def shutdown():
+    llm_client.close()
+    close_pool()
+    await close_async_pool()
 
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(notes.router, prefix="/api/notes", tags=["notes"])
 app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
 app.include_router(search.router, prefix="/api/search", tags=["search"])
 app.include_router(dashboard.router, prefix="/api/dashboard", tags=["dashboard"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
 @app.get("/")
 def root():
-    return {"message": "Knowledge Vault API is running"}
\ No newline at end of file
+    return {"message": "Knowledge Vault API is running"}
+
+@app.get("/api/health/db")
+def db_health():
+    return {"pool": pool_stats()}
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(request: Request):
+    if not metrics.METRICS_ENABLED:
+        return JSONResponse(status_code=404, content={"detail": "Not Found"})
+    if metrics.METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {metrics.METRICS_TOKEN}":
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/health/llm")
+def llm_health():
+    return {"cache": llm_cache.stats(), "scheduler": llm_scheduler.limiter.stats(), "client": llm_client.stats(),
+            "expansion": query_expansion.stats()}
@@ -0,0 +1,393 @@
+"""Maintenance commands.
+
+    python manage.py reindex-search [--user-id ID]
+    python manage.py index-content [--user-id ID] [--batch-size N]
+    python manage.py embed [--user-id ID] [--all]
+    python manage.py rebuild-stats [--user-id ID] [--check]
+    python manage.py migrate-blobs [--user-id ID]
+    python manage.py sweep-blobs [--grace SECONDS]
+    python manage.py prefetch-expansions [--user-id ID] [--limit N]
+    python manage.py migrate [--list] [--target VERSION]
+    python manage.py check-plans
+"""
+from dotenv import load_dotenv
+load_dotenv()
+import argparse
+
+from database import get_db
+import migrations
+
+
+def _user_ids(user_id=None):
+    if user_id is not None:
+        return [user_id]
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM users ORDER BY id")
+        ids = [r["id"] for r in cursor.fetchall()]
+        cursor.close()
+    return ids
+
+
+# ── Commands ─────────────────────────────────────────────────────────────────
+
+def reindex_search(args):
+    """Backfill / rebuild the inverted search index from notes and documents."""
+    from services import search_index
+    total = 0
+    for uid in _user_ids(args.user_id):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            count = search_index.reindex_user(cursor, uid)
+            cursor.close()
+        total += count
+        print(f"user {uid}: indexed {count} items")
+    print(f"✅ Search index rebuilt ({total} items)")
+
+
+def index_content(args):
+    """Backfill the blind content index for notes that have none (e.g. created before it existed)."""
+    import json
+    from services import search_index
+    from utils.security import decrypt_content
+
+    def plaintext(encrypted):
+        try:
+            return decrypt_content(encrypted)
+        except Exception:
+            return ""
+
+    total = 0
+    for uid in _user_ids(args.user_id):
+        last_id, count = 0, 0
+        while True:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT id, title, tags, encrypted_content FROM notes n
+                    WHERE user_id = %s AND id > %s
+                      AND NOT EXISTS (SELECT 1 FROM note_content_index c WHERE c.note_id = n.id)
+                    ORDER BY id LIMIT %s
+                """, (uid, last_id, args.batch_size))
+                notes = cursor.fetchall()
+                search_index.index_notes(cursor, uid, [
+                    (n["id"], n["title"], json.loads(n["tags"] or "[]"), plaintext(n["encrypted_content"])) for n in notes
+                ])
+                cursor.close()
+            if not notes:
+                break
+            last_id = notes[-1]["id"]
+            count += len(notes)
+        if count:
+            print(f"user {uid}: indexed content of {count} notes")
+        total += count
+    print(f"✅ Content index backfilled ({total} notes)")
+
+
+def embed(args):
+    """Fill missing note/document embeddings (--all recomputes every vector)."""
+    import json
+    from services import document_text
+    from services.embeddings import (
+        embed_text, note_embedding_text, document_embedding_text, to_bytes, MAX_EMBED_CHARS,
+    )
+    from utils.security import decrypt_content
+    only_missing = "" if args.all else " AND embedding IS NULL"
+    total = 0
+    for uid in _user_ids(args.user_id):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT id, title, tags, encrypted_content FROM notes WHERE user_id = %s{only_missing}", (uid,))
+            for n in cursor.fetchall():
+                try:
+                    content = decrypt_content(n["encrypted_content"])
+                except Exception:
+                    content = ""
+                vector = embed_text(note_embedding_text(n["title"], json.loads(n["tags"] or "[]"), content))
+                cursor.execute("UPDATE notes SET embedding = %s WHERE id = %s", (to_bytes(vector), n["id"]))
+                total += 1
+            cursor.execute(f"SELECT id, original_name, summary FROM documents WHERE user_id = %s{only_missing}", (uid,))
+            for d in cursor.fetchall():
+                text = document_text.read(cursor, d["id"], 0, MAX_EMBED_CHARS)
+                vector = embed_text(document_embedding_text(d["original_name"], d["summary"], text))
+                cursor.execute("UPDATE documents SET embedding = %s WHERE id = %s", (to_bytes(vector), d["id"]))
+                total += 1
+            cursor.close()
+    print(f"✅ Embedded {total} items")
+
+
+def rebuild_stats(args):
+    """Recompute dashboard rollups from the base tables (--check only reports drift)."""
+    from services import stats, tags
+    from utils import http_cache
+    drifted = 0
+    for uid in _user_ids(args.user_id):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            stored = stats.stored_user(cursor, uid)
+            fresh = stats.compute_user(cursor, uid)
+            if stored != fresh:
+                drifted += 1
+                diff = {k: (stored["counters"][k], v) for k, v in fresh["counters"].items() if stored["counters"][k] != v}
+                weeks = sorted(set(stored["weekly"].items()) ^ set(fresh["weekly"].items()))
+                print(f"user {uid}: counters {diff or 'ok'}, weekly buckets differing: {len(weeks)}")
+            if not args.check:
+                http_cache.touch(cursor, uid)   # before the rollup rows, same lock order as the write paths
+                stats.rebuild_user(cursor, uid)
+                tags.rebuild_tag_counts(cursor, uid)
+            cursor.close()
+    if args.check:
+        print(f"{'❌' if drifted else '✅'} {drifted} user(s) with drifted rollups")
+        raise SystemExit(1 if drifted else 0)
+    print(f"✅ Rollups rebuilt ({drifted} user(s) had drifted)")
+
+
+def migrate_blobs(args):
+    """Move legacy flat uploads into the content-addressed blob store."""
+    import hashlib
+    import os
+    from services import blobs, stats, document_text
+    moved = saved = 0
+    for uid in _user_ids(args.user_id):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, filename, content_sha256, summary, status FROM documents WHERE user_id = %s ORDER BY id",
+                (uid,)
+            )
+            docs = [d for d in cursor.fetchall() if not blobs.is_blob_backed(d)]
+            cursor.close()
+        for d in docs:
+            legacy_path = os.path.join(blobs.UPLOAD_DIR, d["filename"])
+            if not os.path.exists(legacy_path):
+                print(f"document {d['id']}: {d['filename']} missing on disk, skipped")
+                continue
+            digest, size = hashlib.sha256(), 0
+            with open(legacy_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            # Hand the blob store a hard link so the legacy file stays put until the row is updated
+            tmp_path = os.path.join(blobs.UPLOAD_DIR, f".migrate-{d['id']}.part")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            os.link(legacy_path, tmp_path)
+            with get_db() as conn:
+                cursor = conn.cursor()
+                blob = blobs.store(cursor, tmp_path, sha256, size, os.path.splitext(d["filename"])[1].lower())
+                deduplicated = not blob["created"] and blobs.user_has_content(cursor, uid, sha256, d["id"])
+                cursor.execute(
+                    "UPDATE documents SET filename = %s, content_sha256 = %s, deduplicated = %s WHERE id = %s",
+                    (blob["filename"], sha256, deduplicated, d["id"])
+                )
+                if deduplicated:
+                    stats.bump(cursor, uid, dedup_bytes_saved=size)
+                    saved += size
+                if d["status"] == "done" and d["summary"] and not blob["processed_at"]:
+                    blobs.save_results(cursor, sha256, document_text.read(cursor, d["id"]), d["summary"])
+                cursor.close()
+            os.remove(legacy_path)
+            moved += 1
+    print(f"✅ Moved {moved} upload(s) into the blob store ({saved} bytes deduplicated)")
+
+
+def sweep_blobs(args):
+    """Delete upload files no blob references (rolled-back uploads) and stale temp files."""
+    from services import blobs
+    removed = blobs.sweep(args.grace)
+    print(f"✅ Removed {removed} orphaned file(s)")
+
+
+def prefetch_expansions(args):
+    """Refresh popular ai_boost expansions and precompute them for top tags."""
+    from services import query_expansion, llm_client
+    count = query_expansion.prefetch(args.user_id, args.limit)
+    llm_client.close()
+    print(f"✅ Prefetched {count} query expansion(s)")
+
+
+def migrate(args):
+    """Apply pending schema migrations (migrations/)."""
+    if args.list:
+        missing = {v for v, _ in migrations.pending()}
+        for version, name, module in migrations.discover():
+            summary = (module.__doc__ or "").strip().splitlines()[0] if module.__doc__ else ""
+            print(f"{'  pending' if version in missing else '  applied'}  {version}_{name}  {summary}")
+        return
+    applied = migrations.migrate(args.target)
+    print(f"✅ Schema up to date ({len(applied)} migration(s) applied)")
+
+
+_SCANS = ("Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan")
+# Small tables that are read whole by design (utils/runtime_config.py reloads every setting)
+_FULL_READ_TABLES = {"runtime_settings"}
+
+
+def _plan_problems(plan: dict) -> list:
+    """Seq Scans, and LIMITed sorts straight over a table scan (no index provides the order)."""
+    found = []
+    if plan["Node Type"] == "Seq Scan" and plan["Relation Name"] not in _FULL_READ_TABLES:
+        found.append(f"Seq Scan on {plan['Relation Name']}")
+    if plan["Node Type"] == "Limit":
+        sort = plan["Plans"][0]
+        if sort["Node Type"] == "Sort" and sort["Plans"][0]["Node Type"] in _SCANS:
+            found.append(f"Sort of {sort['Plans'][0]['Relation Name']} for a LIMIT")
+    for child in plan.get("Plans", []):
+        found.extend(_plan_problems(child))
+    return found
+
+
+def _route_statements(client) -> list:
+    """Drive every API route once as a throwaway user; returns [(label, [bound statements])]."""
+    import json
+    import uuid
+    from database import record_statements
+    from utils.auth_deps import invalidate_user
+
+    routes = []
+
+    def call(method, path, label=None, **kwargs):
+        with record_statements() as statements:
+            r = client.request(method, path, headers=kwargs.pop("headers", headers), **kwargs)
+        if r.status_code >= 400:
+            raise SystemExit(f"❌ {method} {path} returned {r.status_code}: {r.text}")
+        routes.append((label or f"{method} {path.split('?')[0]}", statements))
+        return r
+
+    headers = {}
+    email = f"plans-{uuid.uuid4().hex[:10]}@example.com"
+    r = call("POST", "/api/auth/register", json={"name": "Plans", "email": email, "password": "plans-password"})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    call("POST", "/api/auth/login", json={"email": email, "password": "plans-password"})
+    call("GET", "/api/auth/me")
+    try:
+        notes = [call("POST", "/api/notes/", json={"title": f"Plan note {i}", "content": "quarterly budget review",
+                                                    "tags": ["plans", f"t{i}"]}).json()["id"] for i in range(3)]
+        call("POST", "/api/notes/import", content="\n".join(json.dumps({"title": f"Imported {i}", "content": "budget",
+                                                                       "tags": ["plans"]}) for i in range(3)),
+             headers={**headers, "Content-Type": "application/x-ndjson"})
+        r = call("GET", "/api/notes/?limit=2&fields=id,title")
+        call("GET", f"/api/notes/?limit=2&tag=plans&cursor={r.headers['X-Next-Cursor']}", "GET /api/notes/ (tag, cursor)")
+        call("GET", f"/api/notes/{notes[0]}", "GET /api/notes/{id}")
+        call("GET", f"/api/notes/{notes[0]}/related", "GET /api/notes/{id}/related")
+        call("PUT", f"/api/notes/{notes[0]}", "PUT /api/notes/{id}", json={"content": "annual budget", "tags": ["plans"]})
+        call("POST", "/api/notes/batch", json={"update": [{"id": notes[1], "title": "Renamed"}], "delete": [notes[2]]})
+        call("GET", "/api/notes/export?format=ndjson")
+        for mode in ("keyword", "semantic", "hybrid"):
+            call("GET", f"/api/search/?q=budget+rev&mode={mode}", f"GET /api/search/ ({mode})")
+        call("GET", "/api/dashboard/stats")
+        doc = call("POST", "/api/documents/upload", files={"file": ("plans.txt", b"plan check document", "text/plain")}).json()
+        call("GET", "/api/documents/?limit=10")
+        call("GET", f"/api/documents/{doc['id']}", "GET /api/documents/{id}")
+        call("GET", f"/api/documents/{doc['id']}/status", "GET /api/documents/{id}/status")
+        call("DELETE", f"/api/documents/{doc['id']}", "DELETE /api/documents/{id}")
+        call("DELETE", f"/api/notes/{notes[0]}", "DELETE /api/notes/{id}")
+    finally:
+        me = client.get("/api/auth/me", headers=headers).json()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM note_content_index WHERE user_id = %s", (me["id"],))
+            cursor.execute("DELETE FROM users WHERE id = %s", (me["id"],))
+            cursor.close()
+        invalidate_user(me["id"])
+    return routes
+
+
+def _route_plan_problems(routes: list) -> list:
+    """For each route, [(problem, sql)] for its statements that need a Seq Scan or a full sort (see check_plans)."""
+    problems = []
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("SET LOCAL enable_sort = off")
+        for label, statements in routes:
+            scans = []
+            for sql in statements:
+                if sql.lstrip(" \t\r\n(").split(None, 1)[0].upper() not in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE"):
+                    continue
+                cursor.execute("EXPLAIN (FORMAT JSON) " + sql)
+                scans.extend((problem, sql) for problem in _plan_problems(cursor.fetchone()["QUERY PLAN"][0]["Plan"]))
+            problems.append(scans)
+        cursor.close()
+        conn.rollback()
+    return problems
+
+
+def check_plans(args):
+    """EXPLAIN every statement the API routes run; fail if any needs a sequential scan or a full sort.
+
+    Drives the app in-process as a throwaway user, records each statement with
+    its parameters bound, and plans it with enable_seqscan and enable_sort off:
+    the planner then only picks a Seq Scan or a Sort when no index can serve
+    the query, which is what happens at scale whatever the test data looks like.
+    """
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as client:
+        routes = _route_statements(client)
+
+    failures = 0
+    for (label, statements), scans in zip(routes, _route_plan_problems(routes)):
+        print(f"{'❌' if scans else '✅'} {label} ({len(statements)} statement(s))")
+        for problem, sql in scans:
+            print(f"     {problem}: {' '.join(sql.split())[:160]}")
+        failures += bool(scans)
+    if failures:
+        raise SystemExit(f"❌ {failures} route(s) with unindexed queries")
+    print("✅ Every route query is index-backed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Knowledge Vault maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("reindex-search", help=reindex_search.__doc__)
+    p.add_argument("--user-id", type=int)
+    p.set_defaults(func=reindex_search)
+
+    p = sub.add_parser("index-content", help=index_content.__doc__)
+    p.add_argument("--user-id", type=int)
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.set_defaults(func=index_content)
+
+    p = sub.add_parser("embed", help=embed.__doc__)
+    p.add_argument("--user-id", type=int)
+    p.add_argument("--all", action="store_true")
+    p.set_defaults(func=embed)
+
+    p = sub.add_parser("rebuild-stats", help=rebuild_stats.__doc__)
+    p.add_argument("--user-id", type=int)
+    p.add_argument("--check", action="store_true")
+    p.set_defaults(func=rebuild_stats)
+
+    p = sub.add_parser("migrate-blobs", help=migrate_blobs.__doc__)
+    p.add_argument("--user-id", type=int)
+    p.set_defaults(func=migrate_blobs)
+
+    p = sub.add_parser("sweep-blobs", help=sweep_blobs.__doc__)
+    p.add_argument("--grace", type=int, help="ignore files younger than this many seconds (default BLOB_SWEEP_GRACE)")
+    p.set_defaults(func=sweep_blobs)
+
+    p = sub.add_parser("prefetch-expansions", help=prefetch_expansions.__doc__)
+    p.add_argument("--user-id", type=int)
+    p.add_argument("--limit", type=int, default=20, help="top tags per user")
+    p.set_defaults(func=prefetch_expansions)
+
+    p = sub.add_parser("migrate", help=migrate.__doc__)
+    p.add_argument("--list", action="store_true", help="show applied and pending migrations")
+    p.add_argument("--target", help="stop after this version")
+    p.set_defaults(func=migrate)
+
+    p = sub.add_parser("check-plans", help=check_plans.__doc__.splitlines()[0])
+    p.set_defaults(func=check_plans)
+
+    args = parser.parse_args()
+    if args.func is not migrate:
+        migrations.check_on_startup()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Baseline: the schema init_db() used to create on every startup.
+
+Every statement is idempotent, so databases created before migrations existed
+apply it as a no-op (apart from the one-time backfills guarded below).
+"""
+
+
+def up(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            hashed_password TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notes (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            encrypted_content TEXT NOT NULL,
+            tags TEXT DEFAULT '[]',
+            embedding BYTEA DEFAULT NULL,
+            is_pinned INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            original_name TEXT NOT NULL,
+            file_url TEXT NOT NULL,
+            extracted_text TEXT,
+            summary TEXT,
+            embedding BYTEA DEFAULT NULL,
+            file_size INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        );
+    """)
+    # Embeddings are float32 vectors stored as BYTEA (services/embeddings.py).
+    # The columns started out as unused TEXT, so converting them loses nothing.
+    cursor.execute("""
+        SELECT table_name FROM information_schema.columns
+        WHERE table_name IN ('notes', 'documents') AND column_name = 'embedding' AND data_type = 'text'
+    """)
+    for row in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {row['table_name']} ALTER COLUMN embedding TYPE BYTEA USING NULL")
+    # ── Search index (services/search_index.py) ──
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS search_items (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            item_type TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            length REAL NOT NULL,
+            PRIMARY KEY (user_id, item_type, item_id)
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS search_postings (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            item_type TEXT NOT NULL,
+            token TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            tf REAL NOT NULL,
+            PRIMARY KEY (user_id, item_type, token, item_id)
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_search_postings_item ON search_postings (user_id, item_type, item_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_search_postings_prefix ON search_postings (user_id, item_type, token text_pattern_ops)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS search_stats (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            item_type TEXT NOT NULL,
+            item_count INTEGER NOT NULL DEFAULT 0,
+            total_length REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, item_type)
+        );
+    """)
+    # Blind index over encrypted note content: keyed token hashes, never plaintext
+    # (filled by the note write paths; `manage.py index-content` backfills).
+    # No foreign keys: a note has a row per distinct word, and the FK triggers
+    # cost several times the insert itself; the note delete paths remove them.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS note_content_index (
+            user_id INTEGER NOT NULL,
+            token_hash BIGINT NOT NULL,
+            note_id INTEGER NOT NULL,
+            tf REAL NOT NULL,
+            PRIMARY KEY (user_id, token_hash, note_id)
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_content_index_note ON note_content_index (note_id)")
+    # ── Normalised tags (services/tags.py) ──
+    cursor.execute("SELECT to_regclass('note_tags') IS NOT NULL AS present")
+    tags_table_existed = cursor.fetchone()["present"]
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS note_tags (
+            note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            tag TEXT NOT NULL,
+            label TEXT NOT NULL,
+            PRIMARY KEY (note_id, tag)
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_tags_user_tag ON note_tags (user_id, tag, note_id)")
+    if not tags_table_existed:
+        # One-time backfill from the JSON tags column
+        cursor.execute("""
+            INSERT INTO note_tags (note_id, user_id, tag, label)
+            SELECT DISTINCT ON (n.id, lower(btrim(t.label))) n.id, n.user_id, lower(btrim(t.label)), btrim(t.label)
+            FROM notes n
+            CROSS JOIN LATERAL json_array_elements_text(COALESCE(NULLIF(n.tags, ''), '[]')::json) AS t(label)
+            WHERE btrim(t.label) != ''
+        """)
+    # ── Dashboard rollups (services/stats.py, services/tags.py) ──
+    cursor.execute("SELECT to_regclass('user_stats') IS NOT NULL AS present")
+    rollups_existed = cursor.fetchone()["present"]
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            total_notes INTEGER NOT NULL DEFAULT 0,
+            total_documents INTEGER NOT NULL DEFAULT 0,
+            ai_summaries INTEGER NOT NULL DEFAULT 0,
+            storage_bytes BIGINT NOT NULL DEFAULT 0,
+            notes_with_tags INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_weekly_activity (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            week TEXT NOT NULL,
+            notes INTEGER NOT NULL DEFAULT 0,
+            documents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, week)
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_tag_counts (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            tag TEXT NOT NULL,
+            label TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, tag)
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_tag_counts_top ON user_tag_counts (user_id, count DESC, tag)")
+    if not rollups_existed:
+        # One-time backfill; `python manage.py rebuild-stats` recomputes later on
+        cursor.execute("""
+            INSERT INTO user_stats (user_id, total_notes, total_documents, ai_summaries, storage_bytes, notes_with_tags)
+            SELECT u.id,
+                (SELECT COUNT(*) FROM notes n WHERE n.user_id = u.id),
+                (SELECT COUNT(*) FROM documents d WHERE d.user_id = u.id),
+                (SELECT COUNT(*) FROM documents d WHERE d.user_id = u.id AND d.summary IS NOT NULL AND d.summary != ''),
+                (SELECT COALESCE(SUM(file_size), 0) FROM documents d WHERE d.user_id = u.id),
+                (SELECT COUNT(DISTINCT note_id) FROM note_tags t WHERE t.user_id = u.id)
+            FROM users u
+        """)
+        cursor.execute("""
+            INSERT INTO user_weekly_activity (user_id, week, notes, documents)
+            SELECT user_id, week, SUM(notes), SUM(documents) FROM (
+                SELECT user_id, to_char(created_at, 'IYYY-IW') AS week, 1 AS notes, 0 AS documents FROM notes
+                UNION ALL
+                SELECT user_id, to_char(created_at, 'IYYY-IW'), 0, 1 FROM documents
+            ) t GROUP BY user_id, week
+        """)
+        cursor.execute("""
+            INSERT INTO user_tag_counts (user_id, tag, label, count)
+            SELECT user_id, tag, MIN(label), COUNT(*) FROM note_tags GROUP BY user_id, tag
+        """)
+    # ── Document processing queue (services/jobs.py, worker.py) ──
+    # Rows that predate the queue were processed inline, so they start as 'done'.
+    cursor.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'done'")
+    cursor.execute("ALTER TABLE documents ALTER COLUMN status SET DEFAULT 'pending'")
+    cursor.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS error TEXT")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS document_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+            kind TEXT NOT NULL DEFAULT 'process',
+            mimetype TEXT DEFAULT '',
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_at TIMESTAMP,
+            locked_by TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_document_jobs_runnable ON document_jobs (run_after, id) WHERE status = 'queued'")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_document_jobs_one_queued ON document_jobs (document_id) WHERE status = 'queued'")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_document_jobs_document ON document_jobs (document_id, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_document_jobs_running ON document_jobs (locked_at) WHERE status = 'running'")
+    # Map-reduce summarisation progress (LLM steps done / planned)
+    cursor.execute("ALTER TABLE document_jobs ADD COLUMN IF NOT EXISTS progress_done INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE document_jobs ADD COLUMN IF NOT EXISTS progress_total INTEGER")
+    # ── Streaming uploads (utils/uploads.py) ──
+    cursor.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_sha256 TEXT")
+    # ── Content-addressed blob store (services/blobs.py) ──
+    # Older uploads are moved in by `python manage.py migrate-blobs`.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            size BIGINT NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            extracted_text TEXT,
+            summary TEXT,
+            processed_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS deduplicated BOOLEAN NOT NULL DEFAULT FALSE")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_content_sha256 ON documents (content_sha256)")
+    cursor.execute("ALTER TABLE user_stats ADD COLUMN IF NOT EXISTS dedup_bytes_saved BIGINT NOT NULL DEFAULT 0")
+    # ── LLM response cache (services/llm_cache.py) ──
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            prompt_version TEXT NOT NULL,
+            response TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used_at)")
+    # ── ai_boost query expansion cache (services/query_expansion.py) ──
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS query_expansions (
+            query TEXT PRIMARY KEY,
+            terms TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS search_queries (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            query TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 1,
+            last_searched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, query)
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_search_queries_frequent ON search_queries (user_id, count DESC)")
+    # ── Keyset pagination of the note / document lists ──
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_user_list ON notes (user_id, is_pinned DESC, updated_at DESC, id DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_user_list ON documents (user_id, created_at DESC, id DESC)")
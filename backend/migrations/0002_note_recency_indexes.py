@@ -0,0 +1,13 @@
+"""Composite indexes for the note queries idx_notes_user_list can't order.
+
+- dashboard "recent notes" and related notes: WHERE user_id ORDER BY updated_at DESC
+- export and `manage.py index-content`: WHERE user_id [AND id > cursor] ORDER BY id
+"""
+from migrations import create_index_concurrently
+
+TRANSACTIONAL = False
+
+
+def up(cursor):
+    create_index_concurrently(cursor, "idx_notes_user_recent", "notes (user_id, updated_at DESC, id DESC)")
+    create_index_concurrently(cursor, "idx_notes_user_id", "notes (user_id, id)")
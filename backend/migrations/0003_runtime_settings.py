@@ -0,0 +1,11 @@
+"""Diagnostics settings changed at runtime (utils/runtime_config.py), as JSON values."""
+
+
+def up(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS runtime_settings (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
@@ -0,0 +1,47 @@
+"""Per-user change counter behind the ETags on note / document / dashboard reads.
+
+Statement-level triggers on notes and documents bump user_versions.version
+once per statement for every user whose rows it touched, whichever code
+path does the write (routes, bulk import, worker, manage.py). The bump
+runs with the write, so user_versions is locked from the first note /
+document write of a transaction until commit; write paths touch notes or
+documents before the other per-user rollups to keep a single lock order.
+"""
+
+
+def up(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user_id INTEGER PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION bump_user_versions() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO user_versions (user_id, version)
+                SELECT DISTINCT user_id, 1 FROM changed_old ORDER BY user_id
+                ON CONFLICT (user_id) DO UPDATE SET version = user_versions.version + 1;
+            ELSE
+                INSERT INTO user_versions (user_id, version)
+                SELECT DISTINCT user_id, 1 FROM changed_new ORDER BY user_id
+                ON CONFLICT (user_id) DO UPDATE SET version = user_versions.version + 1;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    for table in ("notes", "documents"):
+        cursor.execute(f"""
+            CREATE TRIGGER {table}_version_insert AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS changed_new FOR EACH STATEMENT EXECUTE FUNCTION bump_user_versions()
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER {table}_version_update AFTER UPDATE ON {table}
+            REFERENCING NEW TABLE AS changed_new FOR EACH STATEMENT EXECUTE FUNCTION bump_user_versions()
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER {table}_version_delete AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS changed_old FOR EACH STATEMENT EXECUTE FUNCTION bump_user_versions()
+        """)
@@ -0,0 +1,15 @@
+"""documents.file_url points at the authenticated download route.
+
+The public /uploads static mount is gone (utils/downloads.py), so the stored
+"/uploads/<blob path>" links no longer resolve. file_url becomes a generated
+column, so it is always the download URL and writers no longer set it.
+Adding a stored generated column rewrites the table.
+"""
+
+
+def up(cursor):
+    cursor.execute("ALTER TABLE documents DROP COLUMN file_url")
+    cursor.execute("""
+        ALTER TABLE documents ADD COLUMN file_url TEXT
+        GENERATED ALWAYS AS ('/api/documents/' || id::text || '/download') STORED
+    """)
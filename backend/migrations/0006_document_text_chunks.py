@@ -0,0 +1,53 @@
+"""Move documents.extracted_text into compressed chunks (services/document_text.py).
+
+Existing text is copied over in batches and documents.text_length is filled
+in, then the column is dropped. Dropping doesn't give the space back; run
+VACUUM FULL documents afterwards (it locks the table) to shrink it.
+
+The chunk format is spelled out here rather than imported, so replaying this
+migration does the same thing whatever services/document_text.py becomes.
+"""
+import zlib
+
+from psycopg2.extras import execute_values
+
+BATCH_SIZE = 100
+CHUNK_CHARS = 65536
+COMPRESSION_LEVEL = 6
+
+
+def _store(cursor, doc_id: int, text: str):
+    execute_values(cursor, "INSERT INTO document_text (document_id, seq, start_char, char_count, data) VALUES %s", [
+        (doc_id, seq, start, len(text[start:start + CHUNK_CHARS]),
+         zlib.compress(text[start:start + CHUNK_CHARS].encode(), COMPRESSION_LEVEL))
+        for seq, start in enumerate(range(0, len(text), CHUNK_CHARS))
+    ])
+
+
+def up(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS document_text (
+            document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            start_char INTEGER NOT NULL,
+            char_count INTEGER NOT NULL,
+            data BYTEA NOT NULL,
+            PRIMARY KEY (document_id, seq)
+        )
+    """)
+    cursor.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS text_length INTEGER")
+    last_id = 0
+    while True:
+        cursor.execute(
+            "SELECT id, extracted_text FROM documents WHERE id > %s AND extracted_text IS NOT NULL ORDER BY id LIMIT %s",
+            (last_id, BATCH_SIZE)
+        )
+        docs = cursor.fetchall()
+        if not docs:
+            break
+        for d in docs:
+            if d["extracted_text"]:
+                _store(cursor, d["id"], d["extracted_text"])
+            cursor.execute("UPDATE documents SET text_length = %s WHERE id = %s", (len(d["extracted_text"]) or None, d["id"]))
+        last_id = docs[-1]["id"]
+    cursor.execute("ALTER TABLE documents DROP COLUMN extracted_text")
@@ -0,0 +1,26 @@
+"""documents.deduplicated only counts copies within the same account.
+
+It used to be set whenever any account had already uploaded the content,
+which told users about other people's files. Flags and the dashboard's
+dedup_bytes_saved are recomputed: a document is a duplicate when the same
+user has an older document with the same content.
+"""
+
+
+def up(cursor):
+    cursor.execute("""
+        UPDATE documents d SET deduplicated = dup.flag
+        FROM (
+            SELECT id, EXISTS (
+                SELECT 1 FROM documents o
+                WHERE o.user_id = x.user_id AND o.content_sha256 = x.content_sha256 AND o.id < x.id
+            ) AS flag
+            FROM documents x
+        ) dup
+        WHERE d.id = dup.id AND d.deduplicated IS DISTINCT FROM dup.flag
+    """)
+    cursor.execute("""
+        UPDATE user_stats s SET dedup_bytes_saved = COALESCE((
+            SELECT SUM(file_size) FROM documents WHERE user_id = s.user_id AND deduplicated
+        ), 0)
+    """)
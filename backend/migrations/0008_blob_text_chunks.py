@@ -0,0 +1,49 @@
+"""Move blobs.extracted_text into compressed chunks in blob_text.
+
+Same chunk format as document_text (migration 0006, services/document_text.py),
+keyed by content hash. The column is dropped afterwards; VACUUM FULL blobs
+gives the space back. The format is spelled out here so the migration stays
+frozen.
+"""
+import zlib
+
+from psycopg2.extras import execute_values
+
+BATCH_SIZE = 100
+CHUNK_CHARS = 65536
+COMPRESSION_LEVEL = 6
+
+
+def _store(cursor, sha256: str, text: str):
+    execute_values(cursor, "INSERT INTO blob_text (sha256, seq, start_char, char_count, data) VALUES %s", [
+        (sha256, seq, start, len(text[start:start + CHUNK_CHARS]),
+         zlib.compress(text[start:start + CHUNK_CHARS].encode(), COMPRESSION_LEVEL))
+        for seq, start in enumerate(range(0, len(text), CHUNK_CHARS))
+    ])
+
+
+def up(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blob_text (
+            sha256 TEXT NOT NULL REFERENCES blobs(sha256) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            start_char INTEGER NOT NULL,
+            char_count INTEGER NOT NULL,
+            data BYTEA NOT NULL,
+            PRIMARY KEY (sha256, seq)
+        )
+    """)
+    last = ""
+    while True:
+        cursor.execute(
+            "SELECT sha256, extracted_text FROM blobs WHERE sha256 > %s AND extracted_text IS NOT NULL ORDER BY sha256 LIMIT %s",
+            (last, BATCH_SIZE)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for r in rows:
+            if r["extracted_text"]:
+                _store(cursor, r["sha256"], r["extracted_text"])
+        last = rows[-1]["sha256"]
+    cursor.execute("ALTER TABLE blobs DROP COLUMN extracted_text")
@@ -0,0 +1,13 @@
+"""Popularity of ai_boost expansions without per-user search history.
+
+search_queries kept every user's ai_boost queries (keystroke prefixes
+included) in plaintext and was written on each search. Hits are now counted
+in memory and added to query_expansions.hits in batches
+(services/query_expansion.py); the per-user table is dropped.
+"""
+
+
+def up(cursor):
+    cursor.execute("ALTER TABLE query_expansions ADD COLUMN IF NOT EXISTS hits INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_query_expansions_hits ON query_expansions (hits DESC)")
+    cursor.execute("DROP TABLE IF EXISTS search_queries")
@@ -0,0 +1,145 @@
+import importlib
+import os
+import pkgutil
+import re
+import time
+
+import psycopg2
+import psycopg2.extras
+
+from database import DATABASE_URL
+
+# ── Versioned schema migrations ──────────────────────────────────────────────
+#
+# Each module here named NNNN_description.py is one migration: a docstring and
+# an up(cursor). Applied versions are recorded in schema_migrations; `python
+# manage.py migrate` applies the pending ones in order, each in its own
+# transaction. Modules that set TRANSACTIONAL = False run in autocommit mode
+# instead, which CREATE INDEX CONCURRENTLY needs so large tables stay
+# writable while the index builds. An advisory lock keeps two deploys from
+# migrating at once.
+#
+# The API and the worker no longer touch the schema on startup; they warn
+# when migrations are pending (or apply them with DB_AUTO_MIGRATE=1, which
+# is handy in development).
+
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "0") == "1"
+
+_LOCK_KEY = 0x6d696772   # pg_advisory_lock key shared by every migrate run
+_NAME = re.compile(r"^(\d{4})_(\w+)$")
+
+
+def discover() -> list:
+    """[(version, name, module)] for every migration, in version order."""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _NAME.match(info.name)
+        if match:
+            found.append((match.group(1), match.group(2), importlib.import_module(f"{__name__}.{info.name}")))
+    return sorted(found, key=lambda m: m[0])
+
+
+def _connect():
+    conn = psycopg2.connect(DATABASE_URL)
+    conn.cursor_factory = psycopg2.extras.RealDictCursor
+    return conn
+
+
+def _applied(cursor) -> set:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {r["version"] for r in cursor.fetchall()}
+
+
+def pending() -> list:
+    """Migrations not applied yet, as (version, name)."""
+    conn = _connect()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL AS present")
+            done = _applied(cursor) if cursor.fetchone()["present"] else set()
+        conn.rollback()
+    finally:
+        conn.close()
+    return [(v, n) for v, n, _ in discover() if v not in done]
+
+
+def _lock(cursor, verbose: bool):
+    # Polled rather than a blocking pg_advisory_lock(): a waiting lock call is an
+    # open transaction, which another run's CREATE INDEX CONCURRENTLY would wait on
+    waiting = False
+    while True:
+        cursor.execute("SELECT pg_try_advisory_lock(%s) AS locked", (_LOCK_KEY,))
+        if cursor.fetchone()["locked"]:
+            return
+        if verbose and not waiting:
+            print("⏳ Another migrate run holds the lock, waiting…")
+        waiting = True
+        time.sleep(1)
+
+
+def migrate(target: str = None, verbose: bool = True) -> list:
+    """Apply pending migrations up to ``target`` (all by default); returns the versions applied."""
+    conn = _connect()
+    conn.autocommit = True
+    applied = []
+    try:
+        with conn.cursor() as cursor:
+            _lock(cursor, verbose)
+            try:
+                done = _applied(cursor)
+                for version, name, module in discover():
+                    if version in done or (target and version > target):
+                        continue
+                    transactional = getattr(module, "TRANSACTIONAL", True)
+                    conn.autocommit = not transactional
+                    try:
+                        module.up(cursor)
+                        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                        if transactional:
+                            conn.commit()
+                    except Exception:
+                        if transactional:
+                            conn.rollback()
+                        raise
+                    finally:
+                        conn.autocommit = True
+                    applied.append(version)
+                    if verbose:
+                        print(f"✅ Applied migration {version}_{name}")
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_KEY,))
+    finally:
+        conn.close()
+    return applied
+
+
+def check_on_startup():
+    """Called by the API and worker at startup instead of creating the schema."""
+    if DB_AUTO_MIGRATE:
+        migrate()
+        return
+    missing = pending()
+    if missing:
+        print(f"⚠️  {len(missing)} pending migration(s): {', '.join(v + '_' + n for v, n in missing)}"
+              " — run `python manage.py migrate`")
+
+
+def create_index_concurrently(cursor, name: str, definition: str):
+    """CREATE INDEX CONCURRENTLY ``name`` ON ``definition``, for TRANSACTIONAL = False
+    migrations. A build that failed part-way leaves an INVALID index behind that
+    IF NOT EXISTS would skip, so that one is dropped and rebuilt."""
+    cursor.execute("""
+        SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+    """, (name,))
+    row = cursor.fetchone()
+    if row and not row["indisvalid"]:
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi.responses import FileResponse
+from datetime import datetime
+from utils.auth_deps import require_admin
+from utils import runtime_config, slow_queries, profiling
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/diagnostics")
+def get_diagnostics(limit: int = 50):
+    """Current diagnostics settings, this process's latest slow queries and the newest profile dumps."""
+    profiles = sorted(profiling.list_profiles(), key=lambda p: p["at"], reverse=True)[:limit]
+    return {
+        "settings": runtime_config.snapshot(),
+        "slow_queries": list(reversed(slow_queries.recent))[:limit],
+        "profiles": [{**p, "at": datetime.fromtimestamp(p["at"]).isoformat(timespec="seconds")} for p in profiles],
+    }
+
+@router.put("/diagnostics")
+def update_diagnostics(changes: dict = Body(...)):
+    """Change settings for every process (picked up within RUNTIME_SETTINGS_REFRESH seconds); null resets one."""
+    try:
+        return {"settings": runtime_config.update(changes)}
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown setting: {e.args[0]}")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.get("/profiles/{name}")
+def get_profile(name: str):
+    path = profiling.profile_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, EmailStr
-from database import get_db
+from starlette.concurrency import run_in_threadpool
+from database import get_adb, fetchone
 from utils.security import hash_password, verify_password, create_access_token
 from utils.auth_deps import get_current_user
 
@@ -15,36 +16,36 @@ class LoginRequest(BaseModel):
     email: EmailStr
     password: str
 
+# bcrypt is deliberately slow (~100+ ms of CPU), so it always runs in the threadpool
+
 @router.post("/register")
-def register(data: RegisterRequest):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE email = %s", (data.email,))
-        existing = cursor.fetchone()
-        if existing:
-            raise HTTPException(status_code=400, detail="Email already registered")
-        hashed = hash_password(data.password)
-        cursor.execute(
-            "INSERT INTO users (name, email, hashed_password) VALUES (%s, %s, %s) RETURNING id",
+async def register(data: RegisterRequest):
+    async with get_adb() as conn:
+        existing = await fetchone(conn, "SELECT id FROM users WHERE email = %s", (data.email,))
+    if existing:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    hashed = await run_in_threadpool(hash_password, data.password)
+    async with get_adb() as conn:
+        user = await fetchone(
+            conn,
+            "INSERT INTO users (name, email, hashed_password) VALUES (%s, %s, %s) ON CONFLICT (email) DO NOTHING RETURNING id",
             (data.name, data.email, hashed)
         )
-        user_id = cursor.fetchone()["id"]
-        cursor.close()
+    if not user:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    user_id = user["id"]
     token = create_access_token({"sub": str(user_id)})
     return {"access_token": token, "token_type": "bearer", "user": {"id": user_id, "name": data.name, "email": data.email}}
 
 @router.post("/login")
-def login(data: LoginRequest):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE email = %s", (data.email,))
-        user = cursor.fetchone()
-        cursor.close()
-    if not user or not verify_password(data.password, user["hashed_password"]):
+async def login(data: LoginRequest):
+    async with get_adb() as conn:
+        user = await fetchone(conn, "SELECT * FROM users WHERE email = %s", (data.email,))
+    if not user or not await run_in_threadpool(verify_password, data.password, user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = create_access_token({"sub": str(user["id"])})
     return {"access_token": token, "token_type": "bearer", "user": {"id": user["id"], "name": user["name"], "email": user["email"]}}
 
 @router.get("/me")
-def get_me(current_user: dict = Depends(get_current_user)):
+async def get_me(current_user: dict = Depends(get_current_user)):
     return {"id": current_user["id"], "name": current_user["name"], "email": current_user["email"]}
\ No newline at end of file
@@ -1,73 +1,41 @@
-from fastapi import APIRouter, Depends
-from database import get_db
+from fastapi import APIRouter, Depends, Request, Response
+from database import get_adb, fetchall, fetchone
+from utils import http_cache
 from utils.auth_deps import get_current_user
-import json
-from collections import Counter
+from services import stats
 from datetime import datetime, timedelta
 
 router = APIRouter()
 
 @router.get("/stats")
-def get_stats(current_user: dict = Depends(get_current_user)):
+async def get_stats(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     uid = current_user["id"]
-    with get_db() as conn:
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT COUNT(*) as c FROM notes WHERE user_id = %s", (uid,))
-        total_notes = cursor.fetchone()["c"]
-
-        cursor.execute("SELECT COUNT(*) as c FROM documents WHERE user_id = %s", (uid,))
-        total_docs = cursor.fetchone()["c"]
-
-        cursor.execute("SELECT COUNT(*) as c FROM documents WHERE user_id = %s AND summary IS NOT NULL AND summary != ''", (uid,))
-        ai_summaries = cursor.fetchone()["c"]
-
-        cursor.execute("SELECT SUM(file_size) as s FROM documents WHERE user_id = %s", (uid,))
-        storage_bytes = cursor.fetchone()["s"] or 0
-
-        cursor.execute("SELECT COUNT(*) as c FROM notes WHERE user_id = %s AND tags != '[]'", (uid,))
-        notes_with_tags = cursor.fetchone()["c"]
-
-        cursor.execute("SELECT id, title, updated_at FROM notes WHERE user_id = %s ORDER BY updated_at DESC LIMIT 5", (uid,))
-        recent_notes = cursor.fetchall()
-
-        cursor.execute("SELECT id, original_name, created_at FROM documents WHERE user_id = %s ORDER BY created_at DESC LIMIT 5", (uid,))
-        recent_docs = cursor.fetchall()
-
-        cursor.execute("SELECT tags FROM notes WHERE user_id = %s AND tags != '[]'", (uid,))
-        all_tags_rows = cursor.fetchall()
-
-        # Weekly activity - PostgreSQL uses to_char instead of strftime
-        cursor.execute("""
-            SELECT to_char(created_at, 'IYYY-IW') as week, COUNT(*) as count
-            FROM notes WHERE user_id = %s AND created_at >= NOW() - INTERVAL '56 days'
-            GROUP BY week ORDER BY week
-        """, (uid,))
-        weekly_notes = cursor.fetchall()
-
-        cursor.execute("""
-            SELECT to_char(created_at, 'IYYY-IW') as week, COUNT(*) as count
-            FROM documents WHERE user_id = %s AND created_at >= NOW() - INTERVAL '56 days'
-            GROUP BY week ORDER BY week
-        """, (uid,))
-        weekly_docs = cursor.fetchall()
-        cursor.close()
-
-    tag_counter = Counter()
-    for row in all_tags_rows:
-        try:
-            tags = json.loads(row["tags"])
-            tag_counter.update(tags)
-        except Exception:
-            pass
-    top_tags = [{"tag": t, "count": c} for t, c in tag_counter.most_common(8)]
+    today = datetime.now()
+    async with get_adb() as conn:
+        # Weekly activity is bucketed relative to today, so the date is part of the tag
+        etag = http_cache.etag("stats", uid, await http_cache.user_version(conn, uid), today.date().isoformat())
+        if http_cache.not_modified(request, etag):
+            return http_cache.not_modified_response(etag)
+        rollup = stats.read_result(await fetchone(conn, *stats.read_query(uid)))
+        recent = await fetchall(conn, """
+            (SELECT 'note' AS kind, id, title AS name, updated_at AS at FROM notes
+             WHERE user_id = %(uid)s ORDER BY updated_at DESC LIMIT 5)
+            UNION ALL
+            (SELECT 'document', id, original_name, created_at FROM documents
+             WHERE user_id = %(uid)s ORDER BY created_at DESC LIMIT 5)
+        """, {"uid": uid})
+
+    recent_notes = [{"id": r["id"], "title": r["name"], "updated_at": r["at"]} for r in recent if r["kind"] == "note"]
+    recent_docs = [{"id": r["id"], "original_name": r["name"], "created_at": r["at"]} for r in recent if r["kind"] == "document"]
+    storage_bytes = rollup["storage_bytes"]
     storage_mb = round(storage_bytes / (1024 * 1024), 2)
+    saved_bytes = rollup["dedup_bytes_saved"]
+    stored_bytes = storage_bytes - saved_bytes
+    dedup_ratio = round(storage_bytes / stored_bytes, 2) if stored_bytes > 0 else 1.0
 
-    notes_by_week = {r["week"]: r["count"] for r in weekly_notes}
-    docs_by_week = {r["week"]: r["count"] for r in weekly_docs}
+    weekly = rollup["weekly"]
 
     activity = []
-    today = datetime.now()
     for i in range(7, -1, -1):
         d = today - timedelta(weeks=i)
         week_key = d.strftime("%G-%V")
@@ -75,18 +43,21 @@ def get_stats(current_user: dict = Depends(get_current_user)):
         label = week_start.strftime("%b %d")
         activity.append({
             "week": label,
-            "notes": notes_by_week.get(week_key, 0),
-            "documents": docs_by_week.get(week_key, 0),
+            "notes": weekly.get(week_key, {}).get("notes", 0),
+            "documents": weekly.get(week_key, {}).get("documents", 0),
         })
 
+    http_cache.set_headers(response, etag)
     return {
-        "total_notes": total_notes,
-        "total_documents": total_docs,
-        "ai_summaries": ai_summaries,
+        "total_notes": rollup["total_notes"],
+        "total_documents": rollup["total_documents"],
+        "ai_summaries": rollup["ai_summaries"],
         "storage_mb": storage_mb,
-        "notes_with_tags": notes_with_tags,
-        "top_tags": top_tags,
-        "recent_notes": [dict(n) for n in recent_notes],
-        "recent_documents": [dict(d) for d in recent_docs],
+        "dedup_ratio": dedup_ratio,
+        "dedup_saved_mb": round(saved_bytes / (1024 * 1024), 2),
+        "notes_with_tags": rollup["notes_with_tags"],
+        "top_tags": rollup["top_tags"],
+        "recent_notes": recent_notes,
+        "recent_documents": recent_docs,
         "weekly_activity": activity,
     }
\ No newline at end of file
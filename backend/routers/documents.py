@@ -1,119 +1,242 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, BackgroundTasks
-from fastapi.responses import FileResponse
-from database import get_db
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Request, Response
+from fastapi import Query as QueryParam
+from starlette.concurrency import run_in_threadpool
+from database import get_db, get_adb, fetchall, fetchone
 from utils.auth_deps import get_current_user
-from services.ai_service import extract_text_from_file, summarize_text
-import os, uuid
+from services import search_index, vector_index, stats, jobs, blobs, document_text
+from services.document_pipeline import UPLOAD_DIR, apply_results
+from utils import http_cache, downloads
+from utils.uploads import save_upload, discard
+from utils.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, parse_fields
+from typing import Optional
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+import os
 
 router = APIRouter()
-UPLOAD_DIR = "uploads"
-
-def process_document_bg(doc_id: int, filepath: str, mimetype: str):
-    text = extract_text_from_file(filepath, mimetype)
-    summary = summarize_text(text) if text else ""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE documents SET extracted_text = %s, summary = %s WHERE id = %s", (text, summary, doc_id))
-        cursor.close()
 
 def doc_to_dict(doc):
     d = dict(doc)
     d.pop("embedding", None)
-    d.pop("extracted_text", None)
     return d
 
+DOCUMENT_LIST_FIELDS = ("id", "user_id", "filename", "original_name", "file_url", "summary", "file_size", "status", "error", "created_at", "text_length")
+# get_document: everything but the embedding (the text itself is paged through /{doc_id}/text)
+DOCUMENT_FIELDS = ", ".join(DOCUMENT_LIST_FIELDS + ("content_sha256", "deduplicated"))
+TEXT_PAGE_DEFAULT = 20000
+TEXT_PAGE_MAX = 500000
+DOCUMENT_SORT_KEY = ("created_at", "id")
+DOCUMENT_SORT_TYPES = (datetime, int)
+
 @router.get("/")
-def list_documents(current_user: dict = Depends(get_current_user)):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT id, user_id, filename, original_name, file_url, summary, file_size, created_at FROM documents WHERE user_id = %s ORDER BY created_at DESC",
-            (current_user["id"],)
-        )
-        docs = cursor.fetchall()
-        cursor.close()
-    return [doc_to_dict(d) for d in docs]
+async def list_documents(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = QueryParam(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Documents, newest first; keyset-paginated when ``limit`` is given (see list_notes)."""
+    columns = parse_fields(fields, DOCUMENT_LIST_FIELDS)
+    where = "user_id = %s"
+    params = [current_user["id"]]
+    if cursor:
+        where += " AND (created_at, id) < (%s, %s)"
+        params.extend(decode_cursor(cursor, DOCUMENT_SORT_TYPES))
+    page = ""
+    if limit:
+        page = " LIMIT %s"
+        params.append(limit + 1)
+    select = ", ".join(dict.fromkeys(columns + list(DOCUMENT_SORT_KEY)))
+    async with get_adb() as conn:
+        etag = http_cache.etag("documents", current_user["id"], await http_cache.user_version(conn, current_user["id"]),
+                               str(request.query_params))
+        if http_cache.not_modified(request, etag):
+            return http_cache.not_modified_response(etag)
+        docs = await fetchall(conn, f"SELECT {select} FROM documents WHERE {where} ORDER BY created_at DESC, id DESC{page}", params)
+    if limit and len(docs) > limit:
+        docs = docs[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([docs[-1][k] for k in DOCUMENT_SORT_KEY])
+    http_cache.set_headers(response, etag)
+    return [doc_to_dict({k: d[k] for k in columns}) for d in docs]
 
 @router.post("/upload")
-async def upload_document(background_tasks: BackgroundTasks, file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
+async def upload_document(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
     allowed_ext = {".pdf", ".docx", ".txt"}
     ext = os.path.splitext(file.filename)[1].lower()
     if ext not in allowed_ext:
         raise HTTPException(status_code=400, detail=f"File type not allowed. Use: {', '.join(allowed_ext)}")
-    unique_name = f"{uuid.uuid4().hex}{ext}"
-    filepath = os.path.join(UPLOAD_DIR, unique_name)
-    content = await file.read()
-    file_size = len(content)
-    with open(filepath, "wb") as f:
-        f.write(content)
-    file_url = f"/uploads/{unique_name}"
+    tmp_path, file_size, sha256 = await save_upload(file, UPLOAD_DIR)
+    try:
+        doc = await run_in_threadpool(
+            _insert_document, current_user["id"], tmp_path, ext, file.filename, file_size, sha256, file.content_type or ""
+        )
+    finally:
+        discard(tmp_path)
+    return doc_to_dict(doc)
+
+def _insert_document(user_id, tmp_path, ext, original_name, file_size, sha256, mimetype):
     with get_db() as conn:
         cursor = conn.cursor()
+        blob = blobs.store(cursor, tmp_path, sha256, file_size, ext)
+        deduplicated = not blob["created"] and blobs.user_has_content(cursor, user_id, sha256)
         cursor.execute(
-            "INSERT INTO documents (user_id, filename, original_name, file_url, file_size) VALUES (%s, %s, %s, %s, %s) RETURNING id",
-            (current_user["id"], unique_name, file.filename, file_url, file_size)
+            """INSERT INTO documents (user_id, filename, original_name, file_size, content_sha256, deduplicated)
+               VALUES (%s, %s, %s, %s, %s, %s) RETURNING id""",
+            (user_id, blob["filename"], original_name, file_size, sha256, deduplicated)
         )
         doc_id = cursor.fetchone()["id"]
+        search_index.index_document(cursor, user_id, doc_id, original_name)
+        stats.document_created(cursor, user_id, file_size, deduplicated)
+        # Another account's results are picked up by the worker instead, so the
+        # upload response looks the same whether or not the content was known
+        cached = blobs.processed(cursor, sha256) if deduplicated else None
+        if cached:
+            apply_results(cursor, doc_id, cached["extracted_text"], cached["summary"])
+            jobs.settle(cursor, doc_id)
+        else:
+            jobs.enqueue(cursor, doc_id, mimetype)
         cursor.execute(
-            "SELECT id, user_id, filename, original_name, file_url, summary, file_size, created_at FROM documents WHERE id = %s",
+            f"SELECT {', '.join(DOCUMENT_LIST_FIELDS)} FROM documents WHERE id = %s",
             (doc_id,)
         )
         doc = cursor.fetchone()
         cursor.close()
-    background_tasks.add_task(process_document_bg, doc_id, filepath, file.content_type or "")
-    return doc_to_dict(doc)
+    return doc
 
 @router.get("/{doc_id}")
-def get_document(doc_id: int, current_user: dict = Depends(get_current_user)):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM documents WHERE id = %s AND user_id = %s", (doc_id, current_user["id"]))
-        doc = cursor.fetchone()
-        cursor.close()
+async def get_document(doc_id: int, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    async with get_adb() as conn:
+        etag = http_cache.etag("document", current_user["id"], await http_cache.user_version(conn, current_user["id"]), doc_id)
+        if http_cache.not_modified(request, etag):
+            return http_cache.not_modified_response(etag)
+        doc = await fetchone(conn, f"SELECT {DOCUMENT_FIELDS} FROM documents WHERE id = %s AND user_id = %s", (doc_id, current_user["id"]))
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
-    d = dict(doc)
-    d.pop("embedding", None)
-    return d
+    http_cache.set_headers(response, etag)
+    return dict(doc)
+
+@router.get("/{doc_id}/text")
+async def get_document_text(
+    doc_id: int,
+    request: Request,
+    response: Response,
+    offset: int = QueryParam(0, ge=0),
+    limit: int = QueryParam(TEXT_PAGE_DEFAULT, ge=1, le=TEXT_PAGE_MAX),
+    current_user: dict = Depends(get_current_user)
+):
+    """A page of the extracted text; offset and limit count characters."""
+    async with get_adb() as conn:
+        etag = http_cache.etag("document-text", current_user["id"], await http_cache.user_version(conn, current_user["id"]),
+                               doc_id, offset, limit)
+        if http_cache.not_modified(request, etag):
+            return http_cache.not_modified_response(etag)
+        doc = await fetchone(conn, "SELECT text_length FROM documents WHERE id = %s AND user_id = %s", (doc_id, current_user["id"]))
+        if not doc:
+            raise HTTPException(status_code=404, detail="Document not found")
+        chunks = await fetchall(conn, document_text.PAGE_SQL, (doc_id, offset + limit, offset))
+    text = await run_in_threadpool(document_text.assemble, chunks, offset, limit)
+    total = doc["text_length"] or 0
+    http_cache.set_headers(response, etag)
+    return {
+        "offset": offset,
+        "text": text,
+        "total_length": total,
+        "next_offset": offset + len(text) if offset + len(text) < total else None,
+    }
 
-@router.get("/{doc_id}/download")
-def download_document(doc_id: int, current_user: dict = Depends(get_current_user)):
+def _load_file(doc_id: int, user_id: Optional[int] = None):
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT filename, original_name FROM documents WHERE id = %s AND user_id = %s", (doc_id, current_user["id"]))
+        if user_id is None:
+            cursor.execute("SELECT filename, original_name FROM documents WHERE id = %s", (doc_id,))
+        else:
+            cursor.execute("SELECT filename, original_name FROM documents WHERE id = %s AND user_id = %s", (doc_id, user_id))
         doc = cursor.fetchone()
         cursor.close()
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
-    filepath = os.path.join(UPLOAD_DIR, doc["filename"])
-    if not os.path.exists(filepath):
+    if not os.path.exists(os.path.join(UPLOAD_DIR, doc["filename"])):
         raise HTTPException(status_code=404, detail="File not found on disk")
-    return FileResponse(path=filepath, filename=doc["original_name"], media_type="application/octet-stream")
+    return doc
+
+@router.api_route("/{doc_id}/download", methods=["GET", "HEAD"])
+def download_document(doc_id: int, request: Request, inline: bool = False, current_user: dict = Depends(get_current_user)):
+    """The uploaded file; Range requests are honoured (see utils/downloads.py for proxy offload)."""
+    doc = _load_file(doc_id, current_user["id"])
+    return downloads.file_response(request, UPLOAD_DIR, doc["filename"], doc["original_name"], inline)
+
+@router.get("/{doc_id}/download-url")
+def get_download_url(doc_id: int, inline: bool = False, current_user: dict = Depends(get_current_user)):
+    """A short-lived link to the file that needs no Authorization header."""
+    _load_file(doc_id, current_user["id"])
+    params = downloads.sign(doc_id, inline)
+    return {
+        "url": f"/api/documents/{doc_id}/file?{urlencode(params)}",
+        "expires_at": datetime.fromtimestamp(params["expires"], timezone.utc).isoformat(),
+    }
+
+@router.api_route("/{doc_id}/file", methods=["GET", "HEAD"])
+def download_signed(doc_id: int, request: Request, expires: int, sig: str, inline: bool = False):
+    if not downloads.verify(doc_id, expires, sig, inline):
+        raise HTTPException(status_code=403, detail="Invalid or expired link")
+    doc = _load_file(doc_id)
+    return downloads.file_response(request, UPLOAD_DIR, doc["filename"], doc["original_name"], inline)
 
 @router.delete("/{doc_id}")
 def delete_document(doc_id: int, current_user: dict = Depends(get_current_user)):
+    garbage = []
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM documents WHERE id = %s AND user_id = %s", (doc_id, current_user["id"]))
+        cursor.execute(
+            "SELECT filename, content_sha256, created_at, file_size, summary, deduplicated FROM documents WHERE id = %s AND user_id = %s",
+            (doc_id, current_user["id"])
+        )
         doc = cursor.fetchone()
         if not doc:
             raise HTTPException(status_code=404, detail="Document not found")
-        filepath = os.path.join(UPLOAD_DIR, doc["filename"])
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        cursor.execute("DELETE FROM documents WHERE id = %s", (doc_id,))
+        # Blob before the documents row (lock order in services/blobs.py)
+        blob_backed = blobs.is_blob_backed(doc)
+        if blob_backed:
+            garbage = blobs.release(cursor, doc["content_sha256"])
+        cursor.execute("DELETE FROM documents WHERE id = %s AND user_id = %s", (doc_id, current_user["id"]))
+        if not cursor.rowcount:
+            # Deleted concurrently; raising rolls the release back
+            raise HTTPException(status_code=404, detail="Document not found")
+        if not blob_backed:
+            # Uploads from before the blob store (see manage.py migrate-blobs)
+            path = os.path.join(UPLOAD_DIR, doc["filename"])
+            garbage = [path, path + downloads.PRECOMPRESSED_SUFFIX]
+        search_index.remove_item(cursor, current_user["id"], "document", doc_id)
+        stats.document_deleted(cursor, current_user["id"], doc["created_at"], doc["file_size"], bool(doc["summary"]), doc["deduplicated"])
+        vector_index.remove(cursor, current_user["id"], "document", doc_id)
         cursor.close()
+    # Files go only once the delete has committed
+    if blob_backed:
+        blobs.discard_unreferenced(doc["content_sha256"], garbage)
+    else:
+        for path in garbage:
+            discard(path)
     return {"message": "Document deleted"}
 
 @router.post("/{doc_id}/rescan")
-def rescan_document(doc_id: int, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
+def rescan_document(doc_id: int, current_user: dict = Depends(get_current_user)):
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM documents WHERE id = %s AND user_id = %s", (doc_id, current_user["id"]))
+        cursor.execute("SELECT id FROM documents WHERE id = %s AND user_id = %s", (doc_id, current_user["id"]))
         doc = cursor.fetchone()
+        if not doc:
+            raise HTTPException(status_code=404, detail="Document not found")
+        jobs.enqueue(cursor, doc_id, kind="rescan")
         cursor.close()
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
-    filepath = os.path.join(UPLOAD_DIR, doc["filename"])
-    background_tasks.add_task(process_document_bg, doc_id, filepath, "")
-    return {"message": "Processing started"}
\ No newline at end of file
+    return {"message": "Processing started"}
+
+@router.get("/{doc_id}/status")
+async def get_document_status(doc_id: int, current_user: dict = Depends(get_current_user)):
+    async with get_adb() as conn:
+        doc = await fetchone(conn, "SELECT id, status, error FROM documents WHERE id = %s AND user_id = %s", (doc_id, current_user["id"]))
+        if not doc:
+            raise HTTPException(status_code=404, detail="Document not found")
+        job = await fetchone(conn, jobs.LATEST_JOB_SQL, (doc_id,))
+    return {"id": doc["id"], "status": doc["status"], "error": doc["error"], "job": dict(job) if job else None}
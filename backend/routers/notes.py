@@ -1,11 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi import Query as QueryParam
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional
+from datetime import datetime
+import asyncio
 import json
-from database import get_db
+from database import get_db, get_adb, fetchall, fetchone
 from utils.auth_deps import get_current_user
 from utils.security import encrypt_content, decrypt_content
-from services.ai_service import summarize_text
+from utils import http_cache
+from utils.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, parse_fields
+from services.ai_service import asummarize_text
+from services import llm_client, search_index, vector_index, stats, bulk_notes, tags as tag_store
+from services.embeddings import embed_text, note_embedding_text, to_bytes
 
 router = APIRouter()
 
@@ -20,10 +29,28 @@ class NoteUpdate(BaseModel):
     tags: Optional[List[str]] = None
     is_pinned: Optional[bool] = None
 
+class NoteImport(NoteCreate):
+    is_pinned: bool = False
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class NoteBatchUpdate(NoteUpdate):
+    id: int
+
+class NoteBatch(BaseModel):
+    create: List[NoteCreate] = []
+    update: List[NoteBatchUpdate] = []
+    delete: List[int] = []
+
+BATCH_MAX_ITEMS = 1000
+IMPORT_MAX_ERRORS = 100
+
 def note_to_dict(note, decrypt=False):
     d = dict(note)
-    d["tags"] = json.loads(d.get("tags", "[]"))
-    d["is_pinned"] = bool(d.get("is_pinned", 0))
+    if "tags" in d:
+        d["tags"] = json.loads(d["tags"] or "[]")
+    if "is_pinned" in d:
+        d["is_pinned"] = bool(d["is_pinned"])
     if decrypt and d.get("encrypted_content"):
         try:
             d["content"] = decrypt_content(d["encrypted_content"])
@@ -33,44 +60,198 @@ def note_to_dict(note, decrypt=False):
     d.pop("embedding", None)
     return d
 
+NOTE_LIST_FIELDS = ("id", "user_id", "title", "tags", "is_pinned", "created_at", "updated_at")
+NOTE_SORT_KEY = ("is_pinned", "updated_at", "id")
+NOTE_SORT_TYPES = (int, datetime, int)
+
 @router.get("/")
-def list_notes(current_user: dict = Depends(get_current_user)):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT id, user_id, title, tags, is_pinned, created_at, updated_at FROM notes WHERE user_id = %s ORDER BY is_pinned DESC, updated_at DESC",
-            (current_user["id"],)
+async def list_notes(
+    request: Request,
+    response: Response,
+    tag: Optional[str] = None,
+    limit: Optional[int] = QueryParam(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Notes, pinned first then most recently updated.
+
+    Without ``limit`` every note is returned; with it, pages are keyset-paginated
+    and the next page's cursor is sent in the X-Next-Cursor header. Answers
+    304 when If-None-Match still matches (see utils/http_cache.py).
+    """
+    columns = parse_fields(fields, NOTE_LIST_FIELDS)
+    where = "user_id = %s"
+    params = [current_user["id"]]
+    if tag:
+        where += " AND id IN (SELECT note_id FROM note_tags WHERE user_id = %s AND tag = %s)"
+        params.extend([current_user["id"], tag_store.normalize_tag(tag)])
+    if cursor:
+        where += " AND (is_pinned, updated_at, id) < (%s, %s, %s)"
+        params.extend(decode_cursor(cursor, NOTE_SORT_TYPES))
+    page = ""
+    if limit:
+        page = " LIMIT %s"
+        params.append(limit + 1)
+    select = ", ".join(dict.fromkeys(columns + list(NOTE_SORT_KEY)))
+    async with get_adb() as conn:
+        etag = http_cache.etag("notes", current_user["id"], await http_cache.user_version(conn, current_user["id"]),
+                               str(request.query_params))
+        if http_cache.not_modified(request, etag):
+            return http_cache.not_modified_response(etag)
+        notes = await fetchall(
+            conn,
+            f"SELECT {select} FROM notes WHERE {where} ORDER BY is_pinned DESC, updated_at DESC, id DESC{page}",
+            params
         )
-        notes = cursor.fetchall()
-        cursor.close()
-    return [note_to_dict(n) for n in notes]
+    if limit and len(notes) > limit:
+        notes = notes[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([notes[-1][k] for k in NOTE_SORT_KEY])
+    http_cache.set_headers(response, etag)
+    return [note_to_dict({k: n[k] for k in columns}) for n in notes]
 
 @router.post("/")
 def create_note(data: NoteCreate, current_user: dict = Depends(get_current_user)):
     encrypted = encrypt_content(data.content)
     tags_json = json.dumps(data.tags)
+    vector = embed_text(note_embedding_text(data.title, data.tags, data.content))
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO notes (user_id, title, encrypted_content, tags) VALUES (%s, %s, %s, %s) RETURNING id",
-            (current_user["id"], data.title, encrypted, tags_json)
+            "INSERT INTO notes (user_id, title, encrypted_content, tags, embedding) VALUES (%s, %s, %s, %s, %s) RETURNING id",
+            (current_user["id"], data.title, encrypted, tags_json, to_bytes(vector))
         )
         note_id = cursor.fetchone()["id"]
+        search_index.index_note(cursor, current_user["id"], note_id, data.title, data.tags, data.content)
+        tag_store.set_note_tags(cursor, current_user["id"], note_id, data.tags)
+        stats.note_created(cursor, current_user["id"], tag_store.has_tags(data.tags))
+        vector_index.upsert(cursor, current_user["id"], "note", note_id, vector)
         cursor.execute("SELECT id, user_id, title, tags, is_pinned, created_at, updated_at FROM notes WHERE id = %s", (note_id,))
         note = cursor.fetchone()
         cursor.close()
     return note_to_dict(note)
 
-@router.get("/{note_id}")
-def get_note(note_id: int, current_user: dict = Depends(get_current_user)):
+# ── Bulk import / export / batch ─────────────────────────────────────────────
+# Declared before the /{note_id} routes so "import", "export" and "batch"
+# aren't taken for note ids.
+
+@router.post("/import")
+async def import_notes(request: Request, current_user: dict = Depends(get_current_user)):
+    """Stream NDJSON notes ({"title", "content", "tags", "is_pinned"?, "created_at"?,
+    "updated_at"?} per line) into the vault.
+
+    Lines are inserted in batches of NOTE_IMPORT_BATCH_SIZE, each committed on
+    its own; the next batch is parsed and encrypted while the previous one is
+    written. Invalid lines, and lines longer than NOTE_IMPORT_MAX_LINE_BYTES,
+    are skipped and reported by line number.
+    """
+    imported, failed, errors = 0, 0, []
+    batch, pending = [], None
+    line_no, buffer = 0, b""
+
+    async def flush(notes):
+        nonlocal imported, pending
+        prepared = await run_in_threadpool(bulk_notes.prepare_notes, notes) if notes else None
+        if pending is not None:
+            imported += len(await pending)
+            pending = None
+        if notes:
+            pending = asyncio.ensure_future(
+                run_in_threadpool(bulk_notes.import_batch, current_user["id"], notes, prepared)
+            )
+
+    async def lines():
+        """Each line, or None for one over the size cap (dropped as it streams in, never buffered whole)."""
+        nonlocal buffer
+        oversized = False
+        async for chunk in request.stream():
+            buffer += chunk
+            *complete, buffer = buffer.split(b"\n")
+            for line in complete:
+                yield None if oversized or len(line) > bulk_notes.IMPORT_MAX_LINE_BYTES else line
+                oversized = False
+            if len(buffer) > bulk_notes.IMPORT_MAX_LINE_BYTES:
+                oversized, buffer = True, b""
+        if oversized or buffer:
+            yield None if oversized else buffer
+
+    def reject(error: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"line": line_no, "error": error})
+
+    try:
+        async for line in lines():
+            line_no += 1
+            if line is None:
+                reject(f"Line longer than {bulk_notes.IMPORT_MAX_LINE_BYTES} bytes")
+                continue
+            if not line.strip():
+                continue
+            try:
+                batch.append(NoteImport.model_validate_json(line).model_dump())
+            except ValidationError as e:
+                reject(e.errors(include_url=False, include_context=False)[0]["msg"])
+                continue
+            if len(batch) >= bulk_notes.IMPORT_BATCH_SIZE:
+                await flush(batch)
+                batch = []
+        await flush(batch)
+        await flush(None)
+    finally:
+        if pending is not None:
+            await asyncio.shield(pending)
+    if imported >= bulk_notes.ANALYZE_AFTER:
+        await run_in_threadpool(bulk_notes.analyze)
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+@router.get("/export")
+def export_notes(format: str = QueryParam("ndjson", pattern="^(ndjson|zip)$"), current_user: dict = Depends(get_current_user)):
+    """Stream every note, decrypted, as NDJSON (re-importable) or a ZIP of Markdown files."""
+    stamp = datetime.utcnow().strftime("%Y%m%d")
+    if format == "zip":
+        body, media_type = bulk_notes.export_zip(current_user["id"]), "application/zip"
+    else:
+        body, media_type = bulk_notes.export_ndjson(current_user["id"]), "application/x-ndjson"
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="notes-{stamp}.{format}"'
+    })
+
+@router.post("/batch")
+def batch_notes(data: NoteBatch, current_user: dict = Depends(get_current_user)):
+    """Create, update and delete notes by id list in one transaction.
+
+    Updates are applied before deletes; several updates of one id are merged
+    (later fields win). Ids that aren't the user's notes are returned in
+    ``not_found``.
+    """
+    if len(data.create) + len(data.update) + len(data.delete) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} operations per batch")
+    updates = {}
+    for u in data.update:
+        updates.setdefault(u.id, {}).update(u.model_dump(exclude_none=True))
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM notes WHERE id = %s AND user_id = %s", (note_id, current_user["id"]))
-        note = cursor.fetchone()
+        created = bulk_notes.create_notes(cursor, current_user["id"], [n.model_dump() for n in data.create])
+        updated = bulk_notes.update_notes(cursor, current_user["id"], list(updates.values()))
+        deleted = bulk_notes.delete_notes(cursor, current_user["id"], list(dict.fromkeys(data.delete)))
         cursor.close()
+    found = set(updated) | set(deleted)
+    not_found = [i for i in dict.fromkeys(list(updates) + data.delete) if i not in found]
+    return {"created": created, "updated": updated, "deleted": deleted, "not_found": not_found}
+
+@router.get("/{note_id}")
+async def get_note(note_id: int, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    async with get_adb() as conn:
+        etag = http_cache.etag("note", current_user["id"], await http_cache.user_version(conn, current_user["id"]), note_id)
+        if http_cache.not_modified(request, etag):
+            return http_cache.not_modified_response(etag)
+        note = await fetchone(conn, "SELECT * FROM notes WHERE id = %s AND user_id = %s", (note_id, current_user["id"]))
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
-    return note_to_dict(note, decrypt=True)
+    http_cache.set_headers(response, etag)
+    return await run_in_threadpool(note_to_dict, note, True)
 
 @router.put("/{note_id}")
 def update_note(note_id: int, data: NoteUpdate, current_user: dict = Depends(get_current_user)):
@@ -94,12 +275,29 @@ def update_note(note_id: int, data: NoteUpdate, current_user: dict = Depends(get
         if data.is_pinned is not None:
             updates.append("is_pinned = %s")
             params.append(1 if data.is_pinned else 0)
+        vector = None
+        if data.title is not None or data.content is not None or data.tags is not None:
+            vector = embed_text(note_embedding_text(
+                data.title if data.title is not None else note["title"],
+                data.tags if data.tags is not None else json.loads(note["tags"] or "[]"),
+                data.content if data.content is not None else decrypt_content(note["encrypted_content"]),
+            ))
+            updates.append("embedding = %s")
+            params.append(to_bytes(vector))
         if updates:
             updates.append("updated_at = CURRENT_TIMESTAMP")
             params.append(note_id)
             cursor.execute(f"UPDATE notes SET {', '.join(updates)} WHERE id = %s", params)
         cursor.execute("SELECT * FROM notes WHERE id = %s", (note_id,))
         updated = cursor.fetchone()
+        if data.title is not None or data.tags is not None or data.content is not None:
+            search_index.index_note(cursor, current_user["id"], note_id, updated["title"],
+                                    json.loads(updated["tags"] or "[]"), data.content)
+        if data.tags is not None:
+            previous = tag_store.set_note_tags(cursor, current_user["id"], note_id, data.tags)
+            stats.note_tags_changed(cursor, current_user["id"], bool(previous), tag_store.has_tags(data.tags))
+        if vector is not None:
+            vector_index.upsert(cursor, current_user["id"], "note", note_id, vector)
         cursor.close()
     return note_to_dict(updated, decrypt=True)
 
@@ -107,11 +305,17 @@ def update_note(note_id: int, data: NoteUpdate, current_user: dict = Depends(get
 def delete_note(note_id: int, current_user: dict = Depends(get_current_user)):
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT id FROM notes WHERE id = %s AND user_id = %s", (note_id, current_user["id"]))
+        cursor.execute("SELECT id, created_at FROM notes WHERE id = %s AND user_id = %s", (note_id, current_user["id"]))
         note = cursor.fetchone()
         if not note:
             raise HTTPException(status_code=404, detail="Note not found")
+        # Same lock order as create_note (user_versions, search_stats, tag counts,
+        # rollups), so concurrent writes by one user can't deadlock
         cursor.execute("DELETE FROM notes WHERE id = %s", (note_id,))
+        search_index.remove_note(cursor, current_user["id"], note_id)
+        removed_tags = tag_store.clear_note_tags(cursor, current_user["id"], note_id)
+        stats.note_deleted(cursor, current_user["id"], note["created_at"], bool(removed_tags))
+        vector_index.remove(cursor, current_user["id"], "note", note_id)
         cursor.close()
     return {"message": "Note deleted"}
 
@@ -119,44 +323,24 @@ def delete_note(note_id: int, current_user: dict = Depends(get_current_user)):
 def get_related_notes(note_id: int, current_user: dict = Depends(get_current_user)):
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM notes WHERE id = %s AND user_id = %s", (note_id, current_user["id"]))
+        cursor.execute("SELECT id FROM notes WHERE id = %s AND user_id = %s", (note_id, current_user["id"]))
         note = cursor.fetchone()
         if not note:
             raise HTTPException(status_code=404, detail="Note not found")
-        note_tags = json.loads(note["tags"] or "[]")
-        if not note_tags:
-            cursor.close()
-            return []
-        cursor.execute(
-            "SELECT id, title, tags, updated_at FROM notes WHERE user_id = %s AND id != %s",
-            (current_user["id"], note_id)
-        )
-        other_notes = cursor.fetchall()
+        related = tag_store.related_notes(cursor, current_user["id"], note_id)
         cursor.close()
-    results = []
-    for n in other_notes:
-        other_tags = json.loads(n["tags"] or "[]")
-        if not other_tags:
-            continue
-        overlap = len(set(t.lower() for t in note_tags) & set(t.lower() for t in other_tags))
-        if overlap > 0:
-            max_possible = max(len(note_tags), len(other_tags))
-            results.append({
-                "id": n["id"], "title": n["title"], "tags": other_tags,
-                "updated_at": n["updated_at"], "similarity": round(overlap / max_possible, 2)
-            })
-    results.sort(key=lambda x: x["similarity"], reverse=True)
-    return results[:5]
+    return [{
+        "id": n["id"], "title": n["title"], "tags": json.loads(n["tags"] or "[]"),
+        "updated_at": n["updated_at"], "similarity": n["similarity"]
+    } for n in related]
 
 @router.post("/{note_id}/summarize")
-def summarize_note(note_id: int, current_user: dict = Depends(get_current_user)):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM notes WHERE id = %s AND user_id = %s", (note_id, current_user["id"]))
-        note = cursor.fetchone()
-        cursor.close()
+async def summarize_note(note_id: int, current_user: dict = Depends(get_current_user)):
+    async with get_adb() as conn:
+        note = await fetchone(conn, "SELECT encrypted_content FROM notes WHERE id = %s AND user_id = %s", (note_id, current_user["id"]))
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
-    content = decrypt_content(note["encrypted_content"])
-    summary = summarize_text(content)
+    content = await run_in_threadpool(decrypt_content, note["encrypted_content"])
+    # Awaited on the shared LLM loop, so no threadpool worker waits on Groq
+    summary = await llm_client.run_async(asummarize_text(content))
     return {"summary": summary}
\ No newline at end of file
@@ -1,102 +1,127 @@
 from fastapi import APIRouter, Depends
 from fastapi import Query as QueryParam
-from database import get_db
+from starlette.concurrency import run_in_threadpool
+from database import get_adb, fetchall
 from utils.auth_deps import get_current_user
-import json, re
+from services import search_index, vector_index, query_expansion
+from services.embeddings import embed_text
+import json
 
 router = APIRouter()
 
-def tokenize(text: str) -> set:
-    return set(re.findall(r'\w+', text.lower()))
+HYBRID_CANDIDATES = 100
+HYBRID_KEYWORD_WEIGHT = 0.5
 
-def score_match(query_tokens: set, title: str, tags_str: str, summary: str = "") -> float:
-    if not query_tokens:
-        return 0.0
-    title_hits = len(query_tokens & tokenize(title or ""))
-    tag_hits = len(query_tokens & tokenize(tags_str or ""))
-    summary_hits = len(query_tokens & tokenize(summary or ""))
-    weighted = (title_hits * 3) + (tag_hits * 2) + (summary_hits * 1)
-    max_possible = len(query_tokens) * 3
-    return min(round(weighted / max_possible, 2), 1.0) if max_possible > 0 else 0.0
+async def query_tokens_for(conn, user_id: int, item_type: str, query: str, search_terms: list) -> list:
+    tokens = []
+    for term in search_terms:
+        tokens.extend(search_index.tokenize(term))
+    # Search-as-you-type: the last word may be incomplete, so also match tokens it prefixes
+    words = search_index.tokenize(query)
+    if words and not query[-1:].isspace() and len(words[-1]) >= 2:
+        tokens.extend(await search_index.aexpand_prefix(conn, user_id, item_type, words[-1]))
+    return tokens
+
+def semantic_hits(vectors, query_vector, limit: int, offset: int):
+    nearest, total = vectors.matches(query_vector, limit + offset)
+    hits = [{"item_id": i, "score": round(cos, 4), "similarity": round(cos, 2)} for i, cos in nearest]
+    return hits[offset:], total
+
+def hybrid_hits(vectors, keyword_hits: list, query_vector, k: int, limit: int, offset: int):
+    """Blend normalised BM25 with cosine over the union of both candidate sets."""
+    keyword = {h["item_id"]: h["similarity"] for h in keyword_hits}
+    semantic = {i: cos for i, cos in vectors.top_k(query_vector, k) if cos > 0}
+    blended = []
+    for item_id in keyword.keys() | semantic.keys():
+        cos = semantic.get(item_id)
+        if cos is None:
+            v = vectors.vector(item_id)
+            cos = max(float(v @ query_vector), 0.0) if v is not None else 0.0
+        score = HYBRID_KEYWORD_WEIGHT * keyword.get(item_id, 0.0) + (1 - HYBRID_KEYWORD_WEIGHT) * cos
+        blended.append({"item_id": item_id, "score": round(score, 4), "similarity": round(min(score, 1.0), 2)})
+    blended.sort(key=lambda h: (h["score"], h["item_id"]), reverse=True)
+    return blended[offset:offset + limit], len(blended)
+
+async def rank(conn, user_id: int, item_type: str, mode: str, tokens: list, query_vector, limit: int, offset: int):
+    """Return ``(hits, total)`` for one item type; hits carry item_id, score and similarity."""
+    if mode == "keyword":
+        return await search_index.asearch(conn, user_id, item_type, tokens, limit, offset)
+
+    # The mat-vec products release the GIL, so they run in the threadpool off the event loop
+    vectors = await vector_index.aget_user_vectors(conn, user_id, item_type)
+    if mode == "semantic":
+        return await run_in_threadpool(semantic_hits, vectors, query_vector, limit, offset)
+
+    k = max(HYBRID_CANDIDATES, limit + offset)
+    keyword_hits, _ = await search_index.asearch(conn, user_id, item_type, tokens, k, 0)
+    return await run_in_threadpool(hybrid_hits, vectors, keyword_hits, query_vector, k, limit, offset)
 
 @router.get("/")
-def smart_search(
+async def smart_search(
     q: str = QueryParam(..., min_length=1),
     include_notes: bool = True,
     include_docs: bool = True,
     ai_boost: bool = False,
+    mode: str = QueryParam("keyword", pattern="^(keyword|semantic|hybrid)$"),
+    limit: int = QueryParam(20, ge=1, le=100),
+    offset: int = QueryParam(0, ge=0),
     current_user: dict = Depends(get_current_user)
 ):
+    raw_query = q
     query = q.strip()
-    if ai_boost:
-        try:
-            from services.ai_service import expand_search_query
-            search_terms = expand_search_query(query)
-        except Exception:
-            search_terms = [query]
-    else:
-        search_terms = list(set([query] + query.split()))
-
-    query_tokens = tokenize(query)
-    results = {"notes": [], "documents": [], "query": query, "ai_boost": ai_boost}
+    uid = current_user["id"]
+    search_terms, expansion_pending = [query], False
+    results = {"notes": [], "documents": [], "query": query, "ai_boost": ai_boost, "mode": mode,
+               "limit": limit, "offset": offset, "total_notes": 0, "total_documents": 0}
 
-    with get_db() as conn:
-        cursor = conn.cursor()
+    async with get_adb() as conn:
+        if ai_boost:
+            # Cached, or waited on for at most EXPANSION_BUDGET_MS
+            search_terms, expansion_pending = await query_expansion.aexpand(conn, query)
+        query_vector = await run_in_threadpool(embed_text, " ".join(search_terms)) if mode != "keyword" else None
         if include_notes:
-            conditions = []
-            params = [current_user["id"]]
-            for term in search_terms:
-                conditions.append("(title ILIKE %s OR tags ILIKE %s)")
-                params.extend([f"%{term}%", f"%{term}%"])
-            where = " OR ".join(conditions) if conditions else "1=0"
-            cursor.execute(
-                f"SELECT id, title, tags, updated_at FROM notes WHERE user_id = %s AND ({where}) ORDER BY updated_at DESC LIMIT 20",
-                params
-            )
-            notes = cursor.fetchall()
-            seen_ids = set()
-            for n in notes:
-                if n["id"] in seen_ids:
-                    continue
-                seen_ids.add(n["id"])
-                tags_raw = n["tags"] or "[]"
-                tags_list = json.loads(tags_raw) if isinstance(tags_raw, str) else tags_raw
-                score = score_match(query_tokens, n["title"], tags_raw)
-                if score > 0:
+            tokens = await query_tokens_for(conn, uid, "note", raw_query, search_terms) if mode != "semantic" else []
+            hits, results["total_notes"] = await rank(conn, uid, "note", mode, tokens, query_vector, limit, offset)
+            if hits:
+                rows = await fetchall(
+                    conn,
+                    "SELECT id, title, tags, updated_at FROM notes WHERE user_id = %s AND id = ANY(%s)",
+                    (uid, [h["item_id"] for h in hits])
+                )
+                rows = {n["id"]: n for n in rows}
+                for h in hits:
+                    n = rows.get(h["item_id"])
+                    if not n:
+                        continue
                     results["notes"].append({
-                        "id": n["id"], "title": n["title"], "tags": tags_list,
-                        "updated_at": n["updated_at"], "similarity": score, "type": "note"
+                        "id": n["id"], "title": n["title"], "tags": json.loads(n["tags"] or "[]"),
+                        "updated_at": n["updated_at"], "similarity": h["similarity"], "score": h["score"],
+                        "type": "note"
                     })
 
         if include_docs:
-            conditions = []
-            params = [current_user["id"]]
-            for term in search_terms:
-                conditions.append("(original_name ILIKE %s OR summary ILIKE %s)")
-                params.extend([f"%{term}%", f"%{term}%"])
-            where = " OR ".join(conditions) if conditions else "1=0"
-            cursor.execute(
-                f"SELECT id, original_name, summary, created_at FROM documents WHERE user_id = %s AND ({where}) ORDER BY created_at DESC LIMIT 10",
-                params
-            )
-            docs = cursor.fetchall()
-            seen_ids = set()
-            for d in docs:
-                if d["id"] in seen_ids:
-                    continue
-                seen_ids.add(d["id"])
-                summary = d["summary"] or ""
-                score = score_match(query_tokens, d["original_name"], "", summary)
-                if score > 0:
+            tokens = await query_tokens_for(conn, uid, "document", raw_query, search_terms) if mode != "semantic" else []
+            hits, results["total_documents"] = await rank(conn, uid, "document", mode, tokens, query_vector, limit, offset)
+            if hits:
+                rows = await fetchall(
+                    conn,
+                    "SELECT id, original_name, summary, created_at FROM documents WHERE user_id = %s AND id = ANY(%s)",
+                    (uid, [h["item_id"] for h in hits])
+                )
+                rows = {d["id"]: d for d in rows}
+                for h in hits:
+                    d = rows.get(h["item_id"])
+                    if not d:
+                        continue
+                    summary = d["summary"] or ""
                     results["documents"].append({
                         "id": d["id"], "name": d["original_name"],
                         "summary": summary[:200] + ("…" if len(summary) > 200 else ""),
-                        "created_at": d["created_at"], "similarity": score, "type": "document"
+                        "created_at": d["created_at"], "similarity": h["similarity"], "score": h["score"],
+                        "type": "document"
                     })
-        cursor.close()
 
-    results["notes"].sort(key=lambda x: x["similarity"], reverse=True)
-    results["documents"].sort(key=lambda x: x["similarity"], reverse=True)
     results["total"] = len(results["notes"]) + len(results["documents"])
     results["expanded_terms"] = search_terms if ai_boost else []
-    return results
\ No newline at end of file
+    results["expansion_pending"] = expansion_pending
+    return results
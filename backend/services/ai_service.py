@@ -1,26 +1,14 @@
 import os
 import json
 import re
-from groq import Groq
-
-
-def get_client():
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
-        raise ValueError("GROQ_API_KEY is not set")
-    return Groq(api_key=api_key)
+import asyncio
+from services import llm_cache, llm_scheduler, llm_client
+from utils import metrics
 
 
 # ── Text Cleanup ─────────────────────────────────────────────────────────────
 
-def clean_extracted_text(text: str) -> str:
-    """Clean up raw extracted text from PDFs."""
-    if not text:
-        return ""
-    
-    lines = text.split("\n")
-    cleaned = []
-    
+def _clean_lines(lines, cleaned: list):
     for line in lines:
         stripped = line.strip()
         
@@ -43,6 +31,19 @@ def clean_extracted_text(text: str) -> str:
             continue
         
         cleaned.append(stripped)
+
+
+def clean_extracted_pages(pages) -> str:
+    """Clean extracted text page by page, as pages arrive from the extractor."""
+    cleaned = []
+    
+    for page in pages:
+        if not page or not page.strip():
+            continue
+        # Blank line between pages
+        if cleaned and cleaned[-1] != "":
+            cleaned.append("")
+        _clean_lines(page.split("\n"), cleaned)
     
     result = "\n".join(cleaned)
     
@@ -54,25 +55,32 @@ def clean_extracted_text(text: str) -> str:
 
 # ── Text Extraction ──────────────────────────────────────────────────────────
 
+EXTRACT_SECONDS = metrics.histogram("extract_duration_seconds", "Text extraction time per file", ("type",),
+                                    buckets=metrics.SLOW_BUCKETS)
+EXTRACT_PAGES = metrics.counter("extract_pages_total", "PDF pages extracted")
+
+
+def _counted_pages(pages):
+    for page in pages:
+        EXTRACT_PAGES.inc()
+        yield page
+
+
 def extract_text_from_file(file_path: str, mimetype: str = "") -> str:
     ext = os.path.splitext(file_path)[1].lower()
+    with EXTRACT_SECONDS.time((ext.lstrip(".") if ext in (".txt", ".pdf", ".docx") else "other",)):
+        return _extract_text(file_path, ext)
+
 
+def _extract_text(file_path: str, ext: str) -> str:
     try:
         if ext == ".txt":
             with open(file_path, "r", encoding="utf-8") as f:
                 return f.read()
 
         elif ext == ".pdf":
-            import pdfplumber
-            pages_text = []
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text() or ""
-                    if page_text.strip():
-                        pages_text.append(page_text)
-            
-            raw_text = "\n\n".join(pages_text)
-            return clean_extracted_text(raw_text) or "No text found in PDF."
+            from services.extractors import iter_pdf_pages
+            return clean_extracted_pages(_counted_pages(iter_pdf_pages(file_path))) or "No text found in PDF."
 
         elif ext == ".docx":
             from docx import Document
@@ -88,72 +96,42 @@ def extract_text_from_file(file_path: str, mimetype: str = "") -> str:
 
 # ── Summarization ────────────────────────────────────────────────────────────
 
-def summarize_text(text: str) -> str:
-    """Generate a comprehensive summary using Groq LLM.
-    
-    Strategy:
-    - Groq free tier limit is 6000 TPM, so we cap input to ~12000 chars (~3500 tokens)
-    - Short docs: send the whole thing
-    - Long docs: send beginning + middle + end chunks
-    """
-    if not text or len(text.strip()) < 50:
-        return text[:200] if text else "No content available."
+SUMMARY_MODEL = "llama-3.1-8b-instant"
+# Part of the LLM cache key: bump whenever the summary prompt or strategy changes
+SUMMARY_PROMPT_VERSION = "2"
+CHUNK_PROMPT_VERSION = "1"
 
-    clean = text.strip()
-    char_count = len(clean)
-    
-    # Cap total text at ~12000 chars to stay under Groq's 6000 TPM limit
-    # (~3.5 chars per token, plus system prompt + output tokens)
-    MAX_CHARS = 12000
-    
-    if char_count <= MAX_CHARS:
-        doc_text = clean
-    else:
-        # Long document: sample beginning, middle, and end
-        chunk_size = 3500
-        beginning = clean[:chunk_size]
-        
-        mid_start = (char_count // 2) - (chunk_size // 2)
-        middle = clean[mid_start:mid_start + chunk_size]
-        
-        ending = clean[-chunk_size:]
-        
-        doc_text = (
-            f"[BEGINNING OF DOCUMENT]\n{beginning}\n\n"
-            f"[MIDDLE OF DOCUMENT]\n{middle}\n\n"
-            f"[END OF DOCUMENT]\n{ending}"
-        )
-    
-    client = get_client()
-    
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are a document summarizer. Write a clear, comprehensive summary "
-                    "of the provided document. Your summary should:\n"
-                    "- Be 5-8 sentences long\n"
-                    "- Cover the main themes, key points, and conclusions\n"
-                    "- For fiction: include genre, setting, main characters, and central conflict (no spoilers)\n"
-                    "- For non-fiction: include the main argument, key evidence, and conclusions\n"
-                    "- Start directly with the summary content — do NOT begin with phrases like "
-                    "'Here is a summary' or 'This document is about' or 'The provided passage'\n"
-                    "- Write in a natural, informative tone"
-                )
-            },
-            {
-                "role": "user",
-                "content": f"Summarize this document:\n\n{doc_text}"
-            }
-        ],
-        max_tokens=500,
-        temperature=0.3
-    )
-    
-    summary = response.choices[0].message.content.strip()
-    
+# Cap a single request at ~12000 chars to stay under Groq's 6000 TPM limit
+# (~3.5 chars per token, plus system prompt + output tokens)
+MAX_CHARS = 12000
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "10000"))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You are a document summarizer. Write a clear, comprehensive summary "
+    "of the provided document. Your summary should:\n"
+    "- Be 5-8 sentences long\n"
+    "- Cover the main themes, key points, and conclusions\n"
+    "- For fiction: include genre, setting, main characters, and central conflict (no spoilers)\n"
+    "- For non-fiction: include the main argument, key evidence, and conclusions\n"
+    "- Start directly with the summary content — do NOT begin with phrases like "
+    "'Here is a summary' or 'This document is about' or 'The provided passage'\n"
+    "- Write in a natural, informative tone"
+)
+
+CHUNK_SYSTEM_PROMPT = (
+    "You are summarizing one section of a longer document. Write 3-5 sentences "
+    "covering the key facts, names, events and arguments in this section, so the "
+    "summaries of all sections can later be combined. Start directly with the content."
+)
+
+
+async def _chat(messages: list, max_tokens: int, priority: int, model: str = SUMMARY_MODEL, timeout: float = None) -> str:
+    """One Groq completion through the shared client (services/llm_client.py)."""
+    return await llm_client.chat(messages, model, max_tokens, priority, timeout=timeout)
+
+
+def _strip_preamble(summary: str) -> str:
     # Clean up any preamble the LLM might still add
     preamble_patterns = [
         r"^Here(?:'s| is) (?:a |the )?(?:\d+-?\d*\s+)?(?:sentence )?summary[:\s]*",
@@ -162,38 +140,149 @@ def summarize_text(text: str) -> str:
     ]
     for pattern in preamble_patterns:
         summary = re.sub(pattern, "", summary, count=1, flags=re.IGNORECASE)
-    
     return summary.strip()
 
 
+def summarize_text(text: str, priority: int = llm_scheduler.PRIORITY_INTERACTIVE, on_progress=None) -> str:
+    """Blocking wrapper around asummarize_text() for sync callers (the worker)."""
+    return llm_client.run(asummarize_text(text, priority, on_progress))
+
+
+async def asummarize_text(text: str, priority: int = llm_scheduler.PRIORITY_INTERACTIVE, on_progress=None) -> str:
+    """Generate a comprehensive summary using Groq LLM.
+    
+    Strategy:
+    - Short docs (up to MAX_CHARS): send the whole thing
+    - Long docs: map-reduce — summarize every chunk concurrently, then
+      summarize the chunk summaries (recursively if they are still too long)
+    - All calls are paced by the rate limiter (services/llm_scheduler.py);
+      ``priority`` decides who goes first when it runs dry
+    - Summaries are cached (services/llm_cache.py), so unchanged text costs no tokens
+
+    Runs on the LLM loop; ``on_progress(done, total)`` is called in a thread
+    as LLM steps finish.
+    """
+    if not text or len(text.strip()) < 50:
+        return text[:200] if text else "No content available."
+
+    cached = await asyncio.to_thread(llm_cache.get, SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, text)
+    if cached is not None:
+        return cached
+    clean = text.strip()
+    if len(clean) <= MAX_CHARS:
+        summary = await _summarize_document(clean, priority)
+        if on_progress:
+            await asyncio.to_thread(on_progress, 1, 1)
+    else:
+        summary = await _map_reduce(clean, priority, on_progress)
+    await asyncio.to_thread(llm_cache.put, SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, text, summary)
+    return summary
+
+
+async def _summarize_document(doc_text: str, priority: int) -> str:
+    return _strip_preamble(await _chat([
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Summarize this document:\n\n{doc_text}"},
+    ], max_tokens=500, priority=priority))
+
+
+async def _summarize_chunk(chunk: str, priority: int) -> str:
+    cached = await asyncio.to_thread(llm_cache.get, SUMMARY_MODEL, CHUNK_PROMPT_VERSION, chunk)
+    if cached is not None:
+        return cached
+    summary = _strip_preamble(await _chat([
+        {"role": "system", "content": CHUNK_SYSTEM_PROMPT},
+        {"role": "user", "content": chunk},
+    ], max_tokens=250, priority=priority))
+    # Cached per chunk too, so a retried job only pays for the chunks it hadn't finished
+    await asyncio.to_thread(llm_cache.put, SUMMARY_MODEL, CHUNK_PROMPT_VERSION, chunk, summary)
+    return summary
+
+
+def split_chunks(text: str, size: int = SUMMARY_CHUNK_CHARS) -> list:
+    """Split on paragraph boundaries into pieces of at most ``size`` chars."""
+    chunks, current = [], ""
+    for para in text.split("\n\n"):
+        while len(para) > size:
+            cut = para.rfind(" ", 0, size)
+            cut = cut if cut > size // 2 else size
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(para[:cut])
+            para = para[cut:].lstrip()
+        if current and len(current) + len(para) + 2 > size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{para}" if current else para
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+async def _map_reduce(text: str, priority: int, on_progress=None) -> str:
+    chunks = split_chunks(text)
+    progress = {"done": 0, "total": len(chunks) + 1}
+    limit = asyncio.Semaphore(SUMMARY_MAP_CONCURRENCY)
+
+    async def step():
+        progress["done"] += 1
+        if on_progress:
+            await asyncio.to_thread(on_progress, progress["done"], progress["total"])
+
+    async def summarize(chunk):
+        async with limit:
+            summary = await _summarize_chunk(chunk, priority)
+        await step()
+        return summary
+
+    while True:
+        summaries = await asyncio.gather(*(summarize(c) for c in chunks))
+        sections = [f"[SECTION {i + 1}]\n{s}" for i, s in enumerate(summaries)]
+        combined = "\n\n".join(sections)
+        if len(combined) <= MAX_CHARS or len(chunks) == 1:
+            break
+        # Still too long for one request: summarize groups of sections again
+        chunks = split_chunks(combined, MAX_CHARS)
+        progress["total"] += len(chunks)
+
+    summary = _strip_preamble(await _chat([
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": (
+            "The document was too long to read at once, so here are summaries of its "
+            f"consecutive sections. Summarize the whole document:\n\n{combined}"
+        )},
+    ], max_tokens=500, priority=priority))
+    await step()
+    return summary
+
+
 # ── Search Query Expansion ───────────────────────────────────────────────────
 
-def expand_search_query(query: str) -> list[str]:
+# Don't hold a search request for long when the token budget is exhausted
+EXPANSION_BUDGET_WAIT = 2.0
+
+
+async def aexpand_search_query(query: str, priority: int = llm_scheduler.PRIORITY_INTERACTIVE,
+                               budget_wait: float = EXPANSION_BUDGET_WAIT) -> list[str]:
     """
     Use Groq LLM to expand a search query into related keywords/synonyms.
     Returns a list of search terms including the original query.
     """
     try:
-        client = get_client()
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a search query expander. Given a search query, "
-                        "return 3-5 related keywords or short phrases that someone "
-                        "might use as titles or tags for notes about this topic. "
-                        "Return ONLY a JSON array of strings, nothing else. "
-                        'Example: ["machine learning", "ML", "neural networks", "deep learning", "AI"]'
-                    )
-                },
-                {"role": "user", "content": query}
-            ],
-            max_tokens=100,
-            temperature=0.3
-        )
-        raw = response.choices[0].message.content.strip()
+        raw = await _chat([
+            {
+                "role": "system",
+                "content": (
+                    "You are a search query expander. Given a search query, "
+                    "return 3-5 related keywords or short phrases that someone "
+                    "might use as titles or tags for notes about this topic. "
+                    "Return ONLY a JSON array of strings, nothing else. "
+                    'Example: ["machine learning", "ML", "neural networks", "deep learning", "AI"]'
+                )
+            },
+            {"role": "user", "content": query}
+        ], max_tokens=100, priority=priority, timeout=budget_wait)
         if raw.startswith("```"):
             raw = raw.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
         expanded = json.loads(raw)
@@ -201,4 +290,4 @@ def expand_search_query(query: str) -> list[str]:
             return list(set([query] + [str(k) for k in expanded]))
     except Exception:
         pass
-    return [query]
\ No newline at end of file
+    return [query]
@@ -0,0 +1,164 @@
+import os
+import re
+import time
+
+from database import get_db
+from services import document_text
+
+# ── Content-addressed upload store ───────────────────────────────────────────
+#
+# Uploaded files are stored once per distinct content under
+# uploads/<sha256[:2]>/<sha256><ext> and tracked in the blobs table with a
+# reference count (one per document row). Extraction / summary results are
+# kept on the blob so identical uploads reuse them instead of being processed
+# again. The file is unlinked when the last referencing document goes.
+#
+# File operations and the blobs row are kept consistent with a transaction-
+# scoped advisory lock per content hash:
+#   store()      takes the lock and moves the file into place before its
+#                transaction commits, so the file exists once the row does.
+#                If that transaction rolls back, sweep() removes the orphan.
+#   release()    only reports the files; the caller deletes them with
+#                discard_unreferenced() after its transaction has committed,
+#                which takes the lock and leaves them alone if the content has
+#                been stored again in the meantime.
+#
+# Lock order: the blob (advisory lock, then row) before any documents write,
+# so uploads, deletes and the worker can't deadlock on user_versions.
+
+UPLOAD_DIR = "uploads"
+BLOB_SWEEP_GRACE = int(os.getenv("BLOB_SWEEP_GRACE", "3600"))   # seconds before an unreferenced file counts as orphaned
+_LOCK_CLASS = 0x626c6f62   # "blob": first key of pg_advisory_xact_lock(int, int)
+_BLOB_NAME = re.compile(r"^([0-9a-f]{64})[.\w]*$")
+
+
+def blob_filename(sha256: str, ext: str) -> str:
+    return f"{sha256[:2]}/{sha256}{ext}"
+
+
+def is_blob_backed(doc: dict) -> bool:
+    """Whether a document row points into the blob store (vs. a legacy flat upload)."""
+    sha256 = doc.get("content_sha256")
+    return bool(sha256) and doc["filename"].startswith(f"{sha256[:2]}/")
+
+
+def _lock(cursor, sha256: str):
+    cursor.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (_LOCK_CLASS, sha256))
+
+
+def store(cursor, tmp_path: str, sha256: str, size: int, ext: str) -> dict:
+    """Take a reference on the blob for ``sha256``, moving ``tmp_path`` into place.
+
+    Returns the blob row plus ``created`` (False when the content was already stored).
+    """
+    _lock(cursor, sha256)
+    cursor.execute("""
+        INSERT INTO blobs (sha256, filename, size, refcount) VALUES (%s, %s, %s, 1)
+        ON CONFLICT (sha256) DO UPDATE SET refcount = blobs.refcount + 1
+        RETURNING *, (xmax = 0) AS created
+    """, (sha256, blob_filename(sha256, ext), size))
+    blob = cursor.fetchone()
+    path = os.path.join(UPLOAD_DIR, blob["filename"])
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return blob
+
+
+def release(cursor, sha256: str) -> list:
+    """Drop one reference. Returns the files to pass to discard_unreferenced() after commit
+    (empty while other documents still use the content)."""
+    _lock(cursor, sha256)
+    cursor.execute(
+        "UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = %s RETURNING refcount, filename",
+        (sha256,)
+    )
+    blob = cursor.fetchone()
+    if not blob or blob["refcount"] > 0:
+        return []
+    cursor.execute("DELETE FROM blobs WHERE sha256 = %s", (sha256,))
+    path = os.path.join(UPLOAD_DIR, blob["filename"])
+    return [path, path + ".gz"]   # .gz: precompressed copy (utils/downloads.py)
+
+
+def discard_unreferenced(sha256: str, paths: list):
+    """Delete a released blob's files, unless the content has been stored again since."""
+    if not paths:
+        return
+    with get_db() as conn:
+        cursor = conn.cursor()
+        _lock(cursor, sha256)
+        cursor.execute("SELECT 1 FROM blobs WHERE sha256 = %s", (sha256,))
+        if not cursor.fetchone():
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        cursor.close()
+
+
+def user_has_content(cursor, user_id: int, sha256: str, exclude_id: int = 0) -> bool:
+    """Whether the user already has a document with this content.
+
+    Deduplication is only reported (document flag, dashboard savings) and
+    cached results only returned inline within one account, so nobody learns
+    that another account uploaded the same file.
+    """
+    cursor.execute(
+        "SELECT 1 FROM documents WHERE user_id = %s AND content_sha256 = %s AND id != %s LIMIT 1",
+        (user_id, sha256, exclude_id)
+    )
+    return cursor.fetchone() is not None
+
+
+def sweep(grace: int = None) -> int:
+    """Remove store files no blobs row refers to (left behind by rolled-back uploads)
+    and stale upload temp files. Returns the number of files removed."""
+    if not os.path.isdir(UPLOAD_DIR):
+        return 0
+    cutoff = time.time() - (BLOB_SWEEP_GRACE if grace is None else grace)
+    removed = 0
+    candidates = {}
+    for entry in os.scandir(UPLOAD_DIR):
+        if entry.is_file() and entry.name.startswith(".") and entry.name.endswith(".part") \
+                and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+        elif entry.is_dir() and len(entry.name) == 2:
+            for f in os.scandir(entry.path):
+                match = _BLOB_NAME.match(f.name)
+                if match and f.is_file() and f.stat().st_mtime < cutoff:
+                    candidates.setdefault(match.group(1), []).append(f.path)
+    if not candidates:
+        return removed
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT sha256 FROM blobs WHERE sha256 = ANY(%s)", (list(candidates),))
+        for row in cursor.fetchall():
+            candidates.pop(row["sha256"])
+        cursor.close()
+    for sha256, paths in candidates.items():
+        discard_unreferenced(sha256, paths)
+        removed += sum(not os.path.exists(p) for p in paths)
+    return removed
+
+
+def processed(cursor, sha256: str):
+    """Cached extraction results for a blob ({"extracted_text", "summary"}), or None if it hasn't been processed yet."""
+    cursor.execute("SELECT summary FROM blobs WHERE sha256 = %s AND processed_at IS NOT NULL", (sha256,))
+    blob = cursor.fetchone()
+    if not blob:
+        return None
+    return {"extracted_text": document_text.read_blob(cursor, sha256), "summary": blob["summary"]}
+
+
+def save_results(cursor, sha256: str, text: str, summary: str):
+    cursor.execute(
+        "UPDATE blobs SET summary = %s, processed_at = CURRENT_TIMESTAMP WHERE sha256 = %s RETURNING sha256",
+        (summary, sha256)
+    )
+    if cursor.fetchone():
+        document_text.store_blob(cursor, sha256, text)
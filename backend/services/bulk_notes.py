@@ -0,0 +1,268 @@
+import io
+import json
+import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2.extras import execute_values
+
+from database import get_db
+from utils.security import encrypt_content, decrypt_content
+from services import search_index, vector_index, stats, tags as tag_store
+from services.embeddings import embed_text, get_embedder, note_embedding_text, to_bytes
+
+# ── Bulk note import / export / batch edits ──────────────────────────────────
+#
+# The per-note endpoints pay a connection, an INSERT and a re-SELECT, and the
+# index / tag / stats hooks one row at a time. Here a whole batch shares one
+# transaction: notes are inserted with a single execute_values, search
+# postings, the content blind index and note_tags are COPYed in, and tag
+# counts and dashboard rollups
+# are updated with one statement each. Encryption and embedding are done per
+# batch up front (prepare_notes), so the import endpoint can prepare the next
+# batch while the previous one is being written.
+#
+# Exports stream: EXPORT_BATCH_SIZE rows at a time are read by id keyset, each
+# batch in its own short transaction, and a worker decrypts each batch while
+# the next one is fetched. Memory stays flat however many notes a user has,
+# and a slow (or vanished) client never holds a connection or a snapshot open.
+# Notes written during an export may or may not be in it.
+
+IMPORT_BATCH_SIZE = int(os.getenv("NOTE_IMPORT_BATCH_SIZE", "1000"))
+IMPORT_MAX_LINE_BYTES = int(os.getenv("NOTE_IMPORT_MAX_LINE_BYTES", str(4 * 1024 * 1024)))
+EXPORT_BATCH_SIZE = int(os.getenv("NOTE_EXPORT_BATCH_SIZE", "500"))
+ANALYZE_AFTER = int(os.getenv("NOTE_IMPORT_ANALYZE_AFTER", "5000"))
+EXPORT_WORKERS = int(os.getenv("NOTE_EXPORT_WORKERS", "2"))
+
+_pool = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="note-export")
+
+
+def prepare_notes(notes: list) -> list:
+    """[(encrypted content, tags JSON, embedding vector)] for a batch of note dicts."""
+    vectors = get_embedder().embed([note_embedding_text(n["title"], n["tags"], n["content"]) for n in notes])
+    return [(encrypt_content(n["content"]), json.dumps(n["tags"]), v) for n, v in zip(notes, vectors)]
+
+
+# ── Writes ───────────────────────────────────────────────────────────────────
+
+def create_notes(cursor, user_id: int, notes: list, prepared: list = None) -> list:
+    """Insert note dicts (title, content, tags, optional is_pinned / created_at /
+    updated_at) and run the write hooks once for the batch. Returns the new ids
+    in input order."""
+    if not notes:
+        return []
+    prepared = prepared or prepare_notes(notes)
+    rows = execute_values(cursor, """
+        INSERT INTO notes (user_id, title, encrypted_content, tags, embedding, is_pinned, created_at, updated_at)
+        VALUES %s RETURNING id, created_at
+    """, [
+        (user_id, n["title"], encrypted, tags_json, to_bytes(vector), int(bool(n.get("is_pinned"))),
+         n.get("created_at"), n.get("updated_at"), n.get("created_at"))
+        for n, (encrypted, tags_json, vector) in zip(notes, prepared)
+    ], template="(%s, %s, %s, %s, %s, %s, COALESCE(%s::timestamp, CURRENT_TIMESTAMP), "
+                "COALESCE(%s::timestamp, %s::timestamp, CURRENT_TIMESTAMP))",
+       page_size=len(notes), fetch=True)
+    ids = [r["id"] for r in rows]
+    search_index.index_notes(cursor, user_id, [(i, n["title"], n["tags"], n["content"]) for i, n in zip(ids, notes)],
+                             replace=False)
+    tag_store.add_notes_tags(cursor, user_id, {i: n["tags"] for i, n in zip(ids, notes)})
+    stats.notes_created(cursor, user_id, [r["created_at"] for r in rows],
+                        sum(tag_store.has_tags(n["tags"]) for n in notes))
+    for note_id, (_, _, vector) in zip(ids, prepared):
+        vector_index.upsert(cursor, user_id, "note", note_id, vector)
+    return ids
+
+
+def import_batch(user_id: int, notes: list, prepared: list = None) -> list:
+    """create_notes() in its own transaction (one NDJSON import batch)."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        ids = create_notes(cursor, user_id, notes, prepared)
+        cursor.close()
+    return ids
+
+
+def analyze():
+    """Refresh planner statistics after a large import. Until autovacuum catches
+    up, the BM25 query can pick a plan built for the pre-import row counts."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("ANALYZE notes, note_tags, search_items, search_postings")
+        cursor.close()
+
+
+def update_notes(cursor, user_id: int, updates: list) -> list:
+    """Apply partial updates ({id, title?, content?, tags?, is_pinned?}; None =
+    unchanged) to the user's notes. Returns the ids that were updated."""
+    if not updates:
+        return []
+    cursor.execute(
+        "SELECT id, title, encrypted_content, tags FROM notes WHERE user_id = %s AND id = ANY(%s) FOR UPDATE",
+        (user_id, [u["id"] for u in updates])
+    )
+    current = {r["id"]: r for r in cursor.fetchall()}
+    updates = [u for u in updates if u["id"] in current]
+    if not updates:
+        return []
+
+    def prepare(u):
+        note = current[u["id"]]
+        title = u["title"] if u.get("title") is not None else note["title"]
+        tags = u["tags"] if u.get("tags") is not None else json.loads(note["tags"] or "[]")
+        encrypted, vector = note["encrypted_content"], None
+        if u.get("content") is not None:
+            encrypted = encrypt_content(u["content"])
+        if any(u.get(f) is not None for f in ("title", "content", "tags")):
+            content = u["content"] if u.get("content") is not None else decrypt_content(note["encrypted_content"])
+            vector = embed_text(note_embedding_text(title, tags, content))
+        return title, tags, encrypted, vector
+
+    prepared = [prepare(u) for u in updates]
+    execute_values(cursor, """
+        UPDATE notes SET title = v.title, encrypted_content = v.encrypted_content, tags = v.tags,
+            is_pinned = COALESCE(v.is_pinned, notes.is_pinned), embedding = COALESCE(v.embedding, notes.embedding),
+            updated_at = CURRENT_TIMESTAMP
+        FROM (VALUES %s) v (id, title, encrypted_content, tags, is_pinned, embedding)
+        WHERE notes.id = v.id
+    """, [
+        (u["id"], title, encrypted, json.dumps(tags),
+         None if u.get("is_pinned") is None else int(u["is_pinned"]),
+         to_bytes(vector) if vector is not None else None)
+        for u, (title, tags, encrypted, vector) in zip(updates, prepared)
+    ], template="(%s::int, %s, %s, %s, %s::int, %s::bytea)", page_size=len(updates))
+
+    reindex = [(u["id"], title, tags, u.get("content")) for u, (title, tags, _, _) in zip(updates, prepared)
+               if any(u.get(f) is not None for f in ("title", "content", "tags"))]
+    search_index.index_notes(cursor, user_id, reindex)
+    retagged = {u["id"]: tags for u, (_, tags, _, _) in zip(updates, prepared) if u.get("tags") is not None}
+    if retagged:
+        had_tags = tag_store.clear_notes_tags(cursor, user_id, list(retagged))
+        tag_store.add_notes_tags(cursor, user_id, retagged)
+        has_tags = sum(tag_store.has_tags(t) for t in retagged.values())
+        if has_tags != len(had_tags):
+            stats.bump(cursor, user_id, notes_with_tags=has_tags - len(had_tags))
+    for u, (_, _, _, vector) in zip(updates, prepared):
+        if vector is not None:
+            vector_index.upsert(cursor, user_id, "note", u["id"], vector)
+    return [u["id"] for u in updates]
+
+
+def delete_notes(cursor, user_id: int, note_ids: list) -> list:
+    """Delete the user's notes among ``note_ids``; returns the ids deleted."""
+    if not note_ids:
+        return []
+    # user_versions (via the notes trigger), search_stats, tag counts, then
+    # rollups: the order create_notes() takes them in
+    cursor.execute(
+        "DELETE FROM notes WHERE user_id = %s AND id = ANY(%s) RETURNING id, created_at",
+        (user_id, list(note_ids))
+    )
+    deleted = cursor.fetchall()
+    if not deleted:
+        return []
+    ids = [r["id"] for r in deleted]
+    search_index.remove_notes(cursor, user_id, ids)
+    had_tags = tag_store.clear_notes_tags(cursor, user_id, ids)
+    stats.notes_deleted(cursor, user_id, [r["created_at"] for r in deleted], len(had_tags))
+    for note_id in ids:
+        vector_index.remove(cursor, user_id, "note", note_id)
+    return ids
+
+
+# ── Streaming export ─────────────────────────────────────────────────────────
+
+def _decrypt(row: dict) -> dict:
+    try:
+        content = decrypt_content(row["encrypted_content"])
+    except Exception:
+        content = ""
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "content": content,
+        "tags": json.loads(row["tags"] or "[]"),
+        "is_pinned": bool(row["is_pinned"]),
+        "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+        "updated_at": row["updated_at"].isoformat() if row["updated_at"] else None,
+    }
+
+
+def _export_batch(user_id: int, after_id: int) -> list:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, title, encrypted_content, tags, is_pinned, created_at, updated_at
+            FROM notes WHERE user_id = %s AND id > %s ORDER BY id LIMIT %s
+        """, (user_id, after_id, EXPORT_BATCH_SIZE))
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+
+def iter_notes(user_id: int):
+    """Yield the user's notes, decrypted, in id order without loading them all."""
+    after_id, decrypting = 0, None
+    while True:
+        rows = _export_batch(user_id, after_id)
+        if decrypting is not None:
+            yield from decrypting.result()
+        if not rows:
+            break
+        after_id = rows[-1]["id"]
+        decrypting = _pool.submit(lambda batch: [_decrypt(r) for r in batch], rows)
+
+
+def export_ndjson(user_id: int):
+    """One JSON object per line, in the format import accepts."""
+    lines = []
+    for note in iter_notes(user_id):
+        lines.append(json.dumps(note, ensure_ascii=False))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable buffer that zipfile streams into."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self.pending = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.pending += len(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks, self.pending = [], 0
+        return data
+
+
+def _slug(title: str) -> str:
+    return re.sub(r"[^\w\-]+", "-", title or "").strip("-")[:60] or "note"
+
+
+def _markdown(note: dict) -> str:
+    front = "\n".join(f"{k}: {json.dumps(note[k], ensure_ascii=False)}"
+                      for k in ("id", "title", "tags", "is_pinned", "created_at", "updated_at"))
+    return f"---\n{front}\n---\n\n{note['content']}"
+
+
+def export_zip(user_id: int):
+    """A ZIP of notes/<id>-<title>.md files (metadata as front matter), streamed entry by entry."""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for note in iter_notes(user_id):
+            archive.writestr(f"notes/{note['id']}-{_slug(note['title'])}.md", _markdown(note))
+            if sink.pending >= 64 * 1024:
+                yield sink.drain()
+    yield sink.drain()
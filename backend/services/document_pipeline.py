@@ -0,0 +1,74 @@
+import os
+from database import get_db
+from services.ai_service import extract_text_from_file, summarize_text
+from services import search_index, vector_index, stats, blobs, jobs, document_text
+from services.llm_scheduler import PRIORITY_BACKGROUND
+from services.blobs import UPLOAD_DIR
+from services.embeddings import embed_text, document_embedding_text, to_bytes
+
+
+class DocumentGone(Exception):
+    """The document was deleted before its job ran."""
+
+
+def apply_results(cursor, doc_id: int, text: str, summary: str) -> bool:
+    """Store extraction results on one document and refresh its embedding / index entries."""
+    cursor.execute("SELECT user_id, original_name, summary FROM documents WHERE id = %s FOR UPDATE", (doc_id,))
+    doc = cursor.fetchone()
+    if not doc:
+        return False
+    vector = embed_text(document_embedding_text(doc["original_name"], summary, text))
+    cursor.execute(
+        "UPDATE documents SET text_length = %s, summary = %s, embedding = %s WHERE id = %s",
+        (len(text) if text else None, summary, to_bytes(vector), doc_id)
+    )
+    document_text.store(cursor, doc_id, text)
+    search_index.index_document(cursor, doc["user_id"], doc_id, doc["original_name"], summary)
+    stats.document_summary_changed(cursor, doc["user_id"], bool(doc["summary"]), bool(summary))
+    vector_index.upsert(cursor, doc["user_id"], "document", doc_id, vector)
+    return True
+
+
+def process_document(doc_id: int, mimetype: str = "", reuse: bool = True, on_progress=None):
+    """Extract, summarise, embed and index one document (runs in the worker).
+
+    Results cached on the document's blob are reused unless ``reuse`` is
+    False (rescans); fresh results are saved to the blob and copied to any
+    other documents with the same content that are still waiting.
+    ``on_progress(done, total)`` receives summarisation progress.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT filename, content_sha256 FROM documents WHERE id = %s", (doc_id,))
+        doc = cursor.fetchone()
+        cached = blobs.processed(cursor, doc["content_sha256"]) if doc and doc["content_sha256"] and reuse else None
+        if cached:
+            apply_results(cursor, doc_id, cached["extracted_text"], cached["summary"])
+        cursor.close()
+    if not doc:
+        raise DocumentGone(doc_id)
+    if cached:
+        return
+
+    filepath = os.path.join(UPLOAD_DIR, doc["filename"])
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"File not found on disk: {doc['filename']}")
+    text = extract_text_from_file(filepath, mimetype)
+    summary = summarize_text(text, priority=PRIORITY_BACKGROUND, on_progress=on_progress) if text else ""
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        sha256 = doc["content_sha256"]
+        if sha256:
+            # Blob row before the documents rows (lock order in services/blobs.py)
+            blobs.save_results(cursor, sha256, text, summary)
+        apply_results(cursor, doc_id, text, summary)
+        if sha256:
+            cursor.execute(
+                "SELECT id FROM documents WHERE content_sha256 = %s AND id != %s AND status IN ('pending', 'failed')",
+                (sha256, doc_id)
+            )
+            for sibling in cursor.fetchall():
+                apply_results(cursor, sibling["id"], text, summary)
+                jobs.settle(cursor, sibling["id"])
+        cursor.close()
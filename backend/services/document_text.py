@@ -0,0 +1,71 @@
+import os
+import zlib
+
+from psycopg2.extras import execute_values
+
+# ── Extracted document text ──────────────────────────────────────────────────
+#
+# Text extracted from an upload (a whole book, sometimes) lives outside the
+# documents row, in document_text, cut into TEXT_CHUNK_CHARS-character chunks
+# that are zlib-compressed one by one. Document reads never carry it; the text
+# is paged through GET /api/documents/{id}/text?offset=&limit= (offsets and
+# limits in characters), which fetches and inflates only the chunks that
+# overlap the requested range. documents.text_length holds the full length.
+#
+# The blob store's cached extraction results (services/blobs.py) use the same
+# format in blob_text, keyed by content hash.
+
+TEXT_CHUNK_CHARS = int(os.getenv("TEXT_CHUNK_CHARS", "65536"))
+TEXT_COMPRESSION_LEVEL = int(os.getenv("TEXT_COMPRESSION_LEVEL", "6"))
+
+# Chunks overlapping [offset, offset + limit); params (document_id, offset + limit, offset)
+PAGE_SQL = """
+    SELECT start_char, data FROM document_text
+    WHERE document_id = %s AND start_char < %s AND start_char + char_count > %s
+    ORDER BY seq
+"""
+
+
+def _chunks(text: str) -> list:
+    return [
+        (seq, start, len(text[start:start + TEXT_CHUNK_CHARS]),
+         zlib.compress(text[start:start + TEXT_CHUNK_CHARS].encode(), TEXT_COMPRESSION_LEVEL))
+        for seq, start in enumerate(range(0, len(text), TEXT_CHUNK_CHARS))
+    ]
+
+
+def store(cursor, doc_id: int, text: str):
+    """Replace a document's text (callers set documents.text_length in the same transaction)."""
+    cursor.execute("DELETE FROM document_text WHERE document_id = %s", (doc_id,))
+    if text:
+        execute_values(cursor, "INSERT INTO document_text (document_id, seq, start_char, char_count, data) VALUES %s",
+                       [(doc_id, *chunk) for chunk in _chunks(text)])
+
+
+def store_blob(cursor, sha256: str, text: str):
+    cursor.execute("DELETE FROM blob_text WHERE sha256 = %s", (sha256,))
+    if text:
+        execute_values(cursor, "INSERT INTO blob_text (sha256, seq, start_char, char_count, data) VALUES %s",
+                       [(sha256, *chunk) for chunk in _chunks(text)])
+
+
+def read_blob(cursor, sha256: str) -> str:
+    cursor.execute("SELECT start_char, data FROM blob_text WHERE sha256 = %s ORDER BY seq", (sha256,))
+    return assemble(cursor.fetchall(), 0)
+
+
+def assemble(chunks: list, offset: int, limit=None) -> str:
+    """Inflate PAGE_SQL rows and cut out [offset, offset + limit)."""
+    parts = []
+    for chunk in chunks:
+        part = zlib.decompress(chunk["data"]).decode()
+        start = max(offset - chunk["start_char"], 0)
+        parts.append(part[start:] if limit is None else part[start:offset + limit - chunk["start_char"]])
+    return "".join(parts)
+
+
+def read(cursor, doc_id: int, offset: int = 0, limit=None) -> str:
+    """Up to ``limit`` characters of a document's text from ``offset`` (all of it by default)."""
+    end = offset + limit if limit is not None else 2 ** 31 - 1
+    cursor.execute(PAGE_SQL, (doc_id, end, offset))
+    return assemble(cursor.fetchall(), offset, limit)
@@ -0,0 +1,96 @@
+import hashlib
+import importlib
+import os
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+import numpy as np
+
+from services.search_index import tokenize
+from utils.security import SECRET_KEY
+
+# ── Pluggable embedders ──────────────────────────────────────────────────────
+#
+# EMBEDDER selects the implementation: "hashing" (default, pure numpy, no model
+# download) or "package.module:factory" for anything else that returns an
+# object with ``dim`` and ``embed(texts) -> float32 array (n, dim)``, e.g. a
+# locally loaded torch / sentence-transformers model.
+
+EMBEDDER = os.getenv("EMBEDDER", "hashing")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "384"))
+MAX_EMBED_CHARS = 20000
+
+
+class Embedder(ABC):
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: list) -> np.ndarray:
+        """Return an L2-normalised float32 matrix of shape (len(texts), dim)."""
+
+
+class HashingEmbedder(Embedder):
+    """Feature-hashed bag of words + bigrams.
+
+    Hashes are keyed with the app secret, so stored vectors don't reveal which
+    words a (possibly encrypted) note contains to anyone without the key.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, key: bytes = None):
+        self.dim = dim
+        self.key = key if key is not None else hashlib.sha256(b"embeddings:" + SECRET_KEY.encode()).digest()
+        self._bucket = lru_cache(maxsize=200_000)(self._hash_feature)
+
+    def _hash_feature(self, feature: str):
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), key=self.key, digest_size=8).digest(), "little")
+        return h % self.dim, 1.0 if (h >> 63) & 1 else -1.0
+
+    def embed(self, texts: list) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = tokenize((text or "")[:MAX_EMBED_CHARS])
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            row = out[i]
+            for feature in features:
+                idx, sign = self._bucket(feature)
+                row[idx] += sign
+        # Sublinear term weighting, then unit length so a dot product is the cosine
+        np.copysign(np.log1p(np.abs(out)), out, out=out)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        out /= np.maximum(norms, 1e-12)
+        return out
+
+
+_embedder = None
+
+def get_embedder() -> Embedder:
+    global _embedder
+    if _embedder is None:
+        if EMBEDDER == "hashing":
+            _embedder = HashingEmbedder()
+        else:
+            module_name, _, factory = EMBEDDER.partition(":")
+            _embedder = getattr(importlib.import_module(module_name), factory or "get_embedder")()
+    return _embedder
+
+
+def embed_text(text: str) -> np.ndarray:
+    return get_embedder().embed([text])[0]
+
+
+# ── Storage (compact float32 BYTEA) ──────────────────────────────────────────
+
+def to_bytes(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def from_bytes(data) -> np.ndarray:
+    return np.frombuffer(bytes(data), dtype=np.float32)
+
+
+def note_embedding_text(title: str, tags: list, content: str) -> str:
+    return "\n".join([title or "", " ".join(tags or []), content or ""])
+
+
+def document_embedding_text(name: str, summary: str, extracted_text: str) -> str:
+    return "\n".join([name or "", summary or "", (extracted_text or "")[:MAX_EMBED_CHARS]])
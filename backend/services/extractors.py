@@ -0,0 +1,196 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# ── Pluggable PDF text extraction ────────────────────────────────────────────
+#
+# Every backend exposes page_count() and extract_range(); iter_pdf_pages()
+# picks the configured backend (PDF_EXTRACTOR, default "pymupdf"), falls back
+# down PDF_FALLBACK_CHAIN when it is missing or fails, and splits large PDFs
+# into page ranges that are extracted in parallel in a process pool while the
+# caller consumes pages in order.
+
+PDF_EXTRACTOR = os.getenv("PDF_EXTRACTOR", "pymupdf")
+PDF_FALLBACK_CHAIN = ("pymupdf", "pdfium", "pdfplumber", "pypdf2")
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "32"))
+PDF_EXTRACT_PROCESSES = int(os.getenv("PDF_EXTRACT_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+
+class PDFExtractor:
+    name = ""
+
+    def available(self) -> bool:
+        raise NotImplementedError
+
+    def page_count(self, path: str) -> int:
+        raise NotImplementedError
+
+    def extract_range(self, path: str, start: int, stop: int) -> list:
+        """Text of pages [start, stop), one string per page."""
+        raise NotImplementedError
+
+
+def _importable(module: str) -> bool:
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+class PyMuPDFExtractor(PDFExtractor):
+    name = "pymupdf"
+
+    def available(self):
+        return _importable("pymupdf")
+
+    def page_count(self, path):
+        import pymupdf
+        with pymupdf.open(path) as doc:
+            return doc.page_count
+
+    def extract_range(self, path, start, stop):
+        import pymupdf
+        with pymupdf.open(path) as doc:
+            return [doc[i].get_text("text") or "" for i in range(start, stop)]
+
+
+class PdfiumExtractor(PDFExtractor):
+    name = "pdfium"
+
+    def available(self):
+        return _importable("pypdfium2")
+
+    def page_count(self, path):
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    def extract_range(self, path, start, stop):
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(path)
+        try:
+            pages = []
+            for i in range(start, stop):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                pages.append(textpage.get_text_range() or "")
+                textpage.close()
+                page.close()
+            return pages
+        finally:
+            pdf.close()
+
+
+class PdfplumberExtractor(PDFExtractor):
+    name = "pdfplumber"
+
+    def available(self):
+        return _importable("pdfplumber")
+
+    def page_count(self, path):
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            return len(pdf.pages)
+
+    def extract_range(self, path, start, stop):
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            pages = []
+            for i in range(start, stop):
+                page = pdf.pages[i]
+                pages.append(page.extract_text() or "")
+                page.flush_cache()
+            return pages
+
+
+class PyPDF2Extractor(PDFExtractor):
+    name = "pypdf2"
+
+    def available(self):
+        return _importable("PyPDF2")
+
+    def page_count(self, path):
+        from PyPDF2 import PdfReader
+        return len(PdfReader(path).pages)
+
+    def extract_range(self, path, start, stop):
+        from PyPDF2 import PdfReader
+        reader = PdfReader(path)
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+EXTRACTORS = {e.name: e for e in (PyMuPDFExtractor(), PdfiumExtractor(), PdfplumberExtractor(), PyPDF2Extractor())}
+
+
+def backend_chain(preferred: str = None) -> list:
+    preferred = preferred or PDF_EXTRACTOR
+    names = [preferred] + [n for n in PDF_FALLBACK_CHAIN if n != preferred]
+    return [EXTRACTORS[n] for n in names if n in EXTRACTORS and EXTRACTORS[n].available()]
+
+
+def _extract_range(names: tuple, path: str, start: int, stop: int) -> list:
+    """Run in pool processes: try each backend in turn for one page range."""
+    error = None
+    for name in names:
+        try:
+            return EXTRACTORS[name].extract_range(path, start, stop)
+        except Exception as e:
+            error = e
+    raise error or RuntimeError("No PDF extraction backend available")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: PDF libraries hold native state that is not fork-safe
+            _pool = ProcessPoolExecutor(PDF_EXTRACT_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def iter_pdf_pages(path: str, backend: str = None, parallel: bool = True):
+    """Yield page texts in order, extracting large PDFs in parallel page ranges."""
+    chain = backend_chain(backend)
+    if not chain:
+        raise RuntimeError("No PDF extraction backend installed")
+
+    total, error = None, None
+    for i, extractor in enumerate(chain):
+        try:
+            total = extractor.page_count(path)
+        except Exception as e:
+            error = e
+            continue
+        chain = chain[i:]
+        break
+    if total is None:
+        raise error
+    names = tuple(e.name for e in chain)
+
+    step = PDF_PAGES_PER_TASK
+    ranges = [(start, min(start + step, total)) for start in range(0, total, step)]
+    if parallel and PDF_EXTRACT_PROCESSES > 1 and total >= PDF_PARALLEL_MIN_PAGES:
+        pool = _get_pool()
+        # Keep a bounded window of ranges in flight so memory doesn't scale with page count
+        window = PDF_EXTRACT_PROCESSES * 2
+        pending = [pool.submit(_extract_range, names, path, s, e) for s, e in ranges[:window]]
+        next_range = window
+        while pending:
+            pages = pending.pop(0).result()
+            if next_range < len(ranges):
+                s, e = ranges[next_range]
+                pending.append(pool.submit(_extract_range, names, path, s, e))
+                next_range += 1
+            yield from pages
+    else:
+        for s, e in ranges:
+            yield from _extract_range(names, path, s, e)
@@ -0,0 +1,201 @@
+import os
+
+from utils import metrics
+
+# ── Durable document job queue (Postgres) ────────────────────────────────────
+#
+# Jobs live in document_jobs and are claimed with FOR UPDATE SKIP LOCKED, so
+# any number of worker processes can pull from the same queue without
+# double-processing. Failed jobs are retried with exponential backoff until
+# max_attempts, after which the document is marked failed.
+#
+# A running job is owned by the worker named in locked_by, which refreshes
+# locked_at with heartbeat() every JOB_HEARTBEAT_SECONDS. Jobs whose worker
+# stops refreshing (crashed, killed by the OOM killer) are requeued, or failed
+# once they have used up their attempts, so a file that kills its worker
+# can't loop forever. complete() and fail() only touch a job the caller still
+# owns; a worker that lost its job to a requeue can't overwrite the new run.
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "3600"))
+JOB_LOCK_TIMEOUT_SECONDS = float(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "900"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_LOCK_TIMEOUT_SECONDS / 5)))
+
+
+def enqueue(cursor, document_id: int, mimetype: str = "", kind: str = "process"):
+    """Queue a job for a document; a no-op if one is already waiting."""
+    cursor.execute("""
+        INSERT INTO document_jobs (document_id, kind, mimetype, max_attempts)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (document_id) WHERE status = 'queued' DO NOTHING
+    """, (document_id, kind, mimetype, JOB_MAX_ATTEMPTS))
+    cursor.execute("UPDATE documents SET status = 'pending', error = NULL WHERE id = %s", (document_id,))
+
+
+def claim(cursor, worker_id: str):
+    """Lock the next runnable job for this worker, or return None."""
+    cursor.execute("""
+        UPDATE document_jobs SET
+            status = 'running', attempts = attempts + 1, progress_done = 0, progress_total = NULL,
+            locked_at = CURRENT_TIMESTAMP, locked_by = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE id = (
+            SELECT id FROM document_jobs
+            WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP
+              -- one job per document at a time: a rescan waits for the run in progress
+              AND NOT EXISTS (
+                  SELECT 1 FROM document_jobs r WHERE r.document_id = document_jobs.document_id AND r.status = 'running'
+              )
+            ORDER BY run_after, id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING *
+    """, (worker_id,))
+    job = cursor.fetchone()
+    if job:
+        cursor.execute("UPDATE documents SET status = 'processing' WHERE id = %s", (job["document_id"],))
+    return job
+
+
+def complete(cursor, job: dict) -> bool:
+    """Mark a job done. Returns False (and changes nothing) if the caller no longer owns it."""
+    cursor.execute("""
+        UPDATE document_jobs SET status = 'done', error = NULL, locked_at = NULL,
+            finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND status = 'running' AND locked_by = %s
+    """, (job["id"], job["locked_by"]))
+    if not cursor.rowcount:
+        return False
+    cursor.execute("UPDATE documents SET status = 'done', error = NULL WHERE id = %s", (job["document_id"],))
+    return True
+
+
+def heartbeat(cursor, job: dict) -> bool:
+    """Refresh a running job's lock. Returns False if it has been taken away from the caller."""
+    cursor.execute("""
+        UPDATE document_jobs SET locked_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND status = 'running' AND locked_by = %s
+    """, (job["id"], job["locked_by"]))
+    return cursor.rowcount > 0
+
+
+def report_progress(cursor, job: dict, done: int, total: int) -> bool:
+    """Record progress of a running job; also refreshes its lock so long jobs aren't requeued as stale.
+    Returns False if the job has been taken away from the caller."""
+    cursor.execute("""
+        UPDATE document_jobs SET progress_done = %s, progress_total = %s,
+            locked_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND status = 'running' AND locked_by = %s
+    """, (done, total, job["id"], job["locked_by"]))
+    return cursor.rowcount > 0
+
+
+def settle(cursor, document_id: int):
+    """Mark a document done without running its queued job (results were filled in elsewhere)."""
+    cursor.execute("""
+        UPDATE document_jobs SET status = 'done', error = NULL,
+            finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE document_id = %s AND status = 'queued'
+    """, (document_id,))
+    cursor.execute("UPDATE documents SET status = 'done', error = NULL WHERE id = %s", (document_id,))
+
+
+def fail(cursor, job: dict, error: str) -> bool:
+    """Record a failure; reschedule with backoff or give up after max_attempts.
+
+    Returns False (and changes nothing) if the caller no longer owns the job.
+    """
+    error = (error or "Unknown error")[:2000]
+    if job["attempts"] >= job["max_attempts"]:
+        cursor.execute("""
+            UPDATE document_jobs SET status = 'failed', error = %s, locked_at = NULL,
+                finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND status = 'running' AND locked_by = %s
+        """, (error, job["id"], job["locked_by"]))
+        if not cursor.rowcount:
+            return False
+        cursor.execute("UPDATE documents SET status = 'failed', error = %s WHERE id = %s", (error, job["document_id"]))
+        return True
+    delay = min(JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1), JOB_RETRY_MAX_SECONDS)
+    cursor.execute("""
+        UPDATE document_jobs SET error = %s, locked_at = NULL, locked_by = NULL,
+            run_after = CURRENT_TIMESTAMP + %s * INTERVAL '1 second', updated_at = CURRENT_TIMESTAMP,
+            -- a rescan queued meanwhile takes over the retry
+            status = CASE WHEN EXISTS (
+                SELECT 1 FROM document_jobs q WHERE q.document_id = document_jobs.document_id AND q.status = 'queued'
+            ) THEN 'failed' ELSE 'queued' END
+        WHERE id = %s AND status = 'running' AND locked_by = %s
+    """, (error, delay, job["id"], job["locked_by"]))
+    if not cursor.rowcount:
+        return False
+    cursor.execute("UPDATE documents SET status = 'pending', error = %s WHERE id = %s", (error, job["document_id"]))
+    return True
+
+
+STALE_ERROR = "Worker stopped responding while processing this document"
+
+
+def requeue_stale(cursor, timeout: float = JOB_LOCK_TIMEOUT_SECONDS) -> tuple:
+    """Put jobs whose worker died mid-run back on the queue. Jobs that have used
+    up their attempts, or were superseded (by a queued rescan or a newer run of
+    the same document), are failed instead, so at most one job per document is
+    requeued. Returns (requeued, failed)."""
+    cursor.execute("""
+        WITH failed AS (
+            UPDATE document_jobs SET status = 'failed', error = %(error)s, locked_at = NULL,
+                finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE status = 'running' AND locked_at < CURRENT_TIMESTAMP - %(timeout)s * INTERVAL '1 second'
+              AND (attempts >= max_attempts OR EXISTS (
+                  SELECT 1 FROM document_jobs q
+                  WHERE q.document_id = document_jobs.document_id
+                    AND (q.status = 'queued' OR (q.status = 'running' AND q.id > document_jobs.id))
+              ))
+            RETURNING id, document_id
+        ), documents_failed AS (
+            UPDATE documents SET status = 'failed', error = %(error)s
+            FROM failed
+            WHERE documents.id = failed.document_id
+              AND NOT EXISTS (
+                  SELECT 1 FROM document_jobs q
+                  WHERE q.document_id = failed.document_id AND q.status IN ('queued', 'running')
+                    AND q.id NOT IN (SELECT id FROM failed)
+              )
+        )
+        SELECT COUNT(*) AS failed FROM failed
+    """, {"error": STALE_ERROR, "timeout": timeout})
+    failed = cursor.fetchone()["failed"]
+    cursor.execute("""
+        UPDATE document_jobs SET status = 'queued', error = %s, locked_at = NULL, locked_by = NULL,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE status = 'running' AND locked_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+    """, (STALE_ERROR, timeout))
+    return cursor.rowcount, failed
+
+
+LATEST_JOB_SQL = """
+    SELECT id, kind, status, attempts, max_attempts, progress_done, progress_total, error,
+           run_after, created_at, updated_at, finished_at
+    FROM document_jobs WHERE document_id = %s ORDER BY id DESC LIMIT 1
+"""
+
+
+def queue_depth(cursor) -> dict:
+    cursor.execute("SELECT status, COUNT(*) AS c FROM document_jobs WHERE status IN ('queued', 'running') GROUP BY status")
+    depth = {"queued": 0, "running": 0}
+    depth.update({r["status"]: r["c"] for r in cursor.fetchall()})
+    return depth
+
+
+def _queue_depth() -> dict:
+    from database import get_db
+    with get_db() as conn:
+        cursor = conn.cursor()
+        depth = queue_depth(cursor)
+        cursor.close()
+    return {(status,): count for status, count in depth.items()}
+
+
+metrics.callback("document_jobs", "Document jobs waiting or running (queried at scrape time)", _queue_depth, ("status",))
+JOB_SECONDS = metrics.histogram("document_job_duration_seconds", "Time to run a document job in the worker",
+                                ("kind", "outcome"), buckets=metrics.SLOW_BUCKETS)
@@ -0,0 +1,137 @@
+import hashlib
+import hmac
+import os
+import re
+import threading
+import traceback
+
+from database import get_db
+from utils import metrics
+from utils.cache import TTLCache
+from utils.security import SECRET_KEY, encrypt_content, decrypt_content
+
+# ── LLM response cache ───────────────────────────────────────────────────────
+#
+# Two tiers: an in-process LRU (utils/cache.TTLCache) in front of the
+# llm_cache table, so a response computed by any web or worker process is
+# reused by the others. Keys are an HMAC of the normalised input text, the
+# model and the prompt version; bump the prompt version whenever a prompt
+# changes. Responses are stored encrypted, like note content, since they are
+# derived from it. Rows expire after LLM_CACHE_TTL seconds and the table is
+# trimmed to the LLM_CACHE_MAX_ROWS most recently used entries.
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "50000"))
+EVICT_EVERY = 200   # puts between eviction passes over the table
+
+_memory = TTLCache(maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL)
+_key_secret = hashlib.sha256(b"llm-cache:" + SECRET_KEY.encode()).digest()
+_lock = threading.Lock()
+_counts = {"db_hits": 0, "misses": 0, "puts": 0, "errors": 0}
+
+
+def _count(name: str):
+    with _lock:
+        _counts[name] += 1
+        return _counts[name]
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def cache_key(model: str, prompt_version: str, text: str) -> str:
+    message = f"{model}\0{prompt_version}\0{normalize(text)}".encode()
+    return hmac.new(_key_secret, message, hashlib.sha256).hexdigest()
+
+
+def get(model: str, prompt_version: str, text: str):
+    """Cached response for this input, or None."""
+    key = cache_key(model, prompt_version, text)
+    value = _memory.get(key)
+    if value is not None:
+        return value
+    if LLM_CACHE_TTL <= 0:
+        return None
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE llm_cache SET last_used_at = CURRENT_TIMESTAMP, hits = hits + 1
+                WHERE key = %s AND created_at > CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+                RETURNING response
+            """, (key, LLM_CACHE_TTL))
+            row = cursor.fetchone()
+            cursor.close()
+    except Exception:
+        _count("errors")
+        traceback.print_exc()
+        return None
+    if not row:
+        _count("misses")
+        return None
+    _count("db_hits")
+    value = decrypt_content(row["response"])
+    _memory.set(key, value)
+    return value
+
+
+def put(model: str, prompt_version: str, text: str, response: str):
+    if LLM_CACHE_TTL <= 0:
+        return
+    key = cache_key(model, prompt_version, text)
+    _memory.set(key, response)
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO llm_cache (key, model, prompt_version, response) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (key) DO UPDATE SET response = EXCLUDED.response,
+                    created_at = CURRENT_TIMESTAMP, last_used_at = CURRENT_TIMESTAMP
+            """, (key, model, prompt_version, encrypt_content(response)))
+            if _count("puts") % EVICT_EVERY == 0:
+                evict(cursor)
+            cursor.close()
+    except Exception:
+        _count("errors")
+        traceback.print_exc()
+
+
+def evict(cursor) -> int:
+    """Drop expired rows and trim the table to LLM_CACHE_MAX_ROWS."""
+    cursor.execute(
+        "DELETE FROM llm_cache WHERE created_at <= CURRENT_TIMESTAMP - %s * INTERVAL '1 second'",
+        (LLM_CACHE_TTL,)
+    )
+    removed = cursor.rowcount
+    cursor.execute("""
+        DELETE FROM llm_cache WHERE key IN (
+            SELECT key FROM llm_cache ORDER BY last_used_at DESC OFFSET %s
+        )
+    """, (LLM_CACHE_MAX_ROWS,))
+    return removed + cursor.rowcount
+
+
+def stats() -> dict:
+    memory = _memory.stats()
+    with _lock:
+        counts = dict(_counts)
+    lookups = memory["hits"] + counts["db_hits"] + counts["misses"]
+    hits = memory["hits"] + counts["db_hits"]
+    return {
+        "memory": memory,
+        "db_hits": counts["db_hits"],
+        "misses": counts["misses"],
+        "puts": counts["puts"],
+        "errors": counts["errors"],
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+def _lookups() -> dict:
+    s = stats()
+    return {("memory_hit",): s["memory"]["hits"], ("db_hit",): s["db_hits"], ("miss",): s["misses"]}
+
+
+metrics.callback("llm_cache_lookups_total", "LLM response cache lookups by result", _lookups, ("result",), type="counter")
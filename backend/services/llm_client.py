@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import groq
+import httpx
+
+from services import llm_scheduler
+from utils import metrics
+
+# ── Shared async Groq client ─────────────────────────────────────────────────
+#
+# One AsyncGroq client per process, running on a dedicated event loop thread:
+#   - keep-alive connection pooling and explicit timeouts (httpx)
+#   - 429s retried after the server's Retry-After, connection errors / 5xx
+#     with jittered exponential backoff
+#   - every request paced by the shared rate limiter (services/llm_scheduler.py)
+#   - identical requests already in flight (same priority) are coalesced into
+#     one call
+#
+# Sync code calls run(coro); async endpoints await run_async(coro), which
+# doesn't tie up a threadpool worker during the round-trip. Point
+# GROQ_BASE_URL at benchmarks/stub_llm.py to exercise all of this offline.
+
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+RETRY_MAX_DELAY = 60.0
+
+_lock = threading.Lock()
+_loop = None
+_loop_pid = None
+_client = None
+_inflight = {}
+_stats = {"requests": 0, "coalesced": 0, "retries": 0, "errors": 0, "latency_total_ms": 0.0, "latency_max_ms": 0.0}
+
+LLM_SECONDS = metrics.histogram("llm_request_duration_seconds", "Groq chat completion round-trips (each attempt)",
+                                ("model", "outcome"), buckets=metrics.SLOW_BUCKETS)
+LLM_WAIT_SECONDS = metrics.histogram("llm_rate_limit_wait_seconds", "Time waiting for rate-limit budget",
+                                     ("model",), buckets=metrics.SLOW_BUCKETS)
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens used, as reported by the API", ("model", "kind"))
+LLM_COALESCED = metrics.counter("llm_coalesced_total", "Calls answered by an identical request already in flight")
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_pid, _client
+    with _lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            _client = None
+            _inflight.clear()
+            threading.Thread(target=_loop.run_forever, name="llm-loop", daemon=True).start()
+        return _loop
+
+
+def _get_client() -> groq.AsyncGroq:
+    """The process-wide client (only touched from the LLM loop)."""
+    global _client
+    if _client is None:
+        api_key = os.getenv("GROQ_API_KEY")
+        if not api_key:
+            raise ValueError("GROQ_API_KEY is not set")
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                keepalive_expiry=60.0,
+            ),
+        )
+        _client = groq.AsyncGroq(api_key=api_key, base_url=GROQ_BASE_URL, http_client=http_client, max_retries=0)
+    return _client
+
+
+def run(coro):
+    """Run a coroutine on the LLM loop from sync code and wait for its result."""
+    return submit(coro).result()
+
+
+def submit(coro):
+    """Start a coroutine on the LLM loop without waiting; returns a concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+async def run_async(coro):
+    """Await a coroutine on the LLM loop from another event loop (e.g. an async endpoint)."""
+    return await asyncio.wrap_future(submit(coro))
+
+
+def close():
+    global _loop, _client
+    with _lock:
+        loop, client = _loop, _client
+        _loop, _client = None, None
+    if loop is None or _loop_pid != os.getpid():
+        return
+    if client is not None:
+        asyncio.run_coroutine_threadsafe(client.close(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+# ── Requests (run on the LLM loop) ───────────────────────────────────────────
+
+class _Call:
+    """A request in flight and the number of callers waiting on it."""
+
+    def __init__(self):
+        self.granted = asyncio.Event()   # set once it has rate-limit budget (or has finished)
+        self.waiters = 0
+        self.task = None
+
+
+def _forget(key: str, call: _Call):
+    if _inflight.get(key) is call:
+        del _inflight[key]
+
+
+async def chat(messages: list, model: str, max_tokens: int, priority: int,
+               temperature: float = 0.3, timeout: float = None) -> str:
+    """One chat completion; identical requests in flight share a single call.
+
+    ``timeout`` bounds this caller's wait for rate-limit budget, not the HTTP
+    request. Requests only coalesce at the same priority, and a caller that
+    times out leaves the shared call running for the others.
+    """
+    key = hashlib.sha256(json.dumps([model, messages, max_tokens, temperature, priority]).encode()).hexdigest()
+    call = _inflight.get(key)
+    if call is not None:
+        _stats["coalesced"] += 1
+        LLM_COALESCED.inc()
+    else:
+        call = _Call()
+        call.task = asyncio.ensure_future(_request(messages, model, max_tokens, priority, temperature, call.granted))
+        call.task.add_done_callback(lambda _: (call.granted.set(), _forget(key, call)))
+        _inflight[key] = call
+    call.waiters += 1
+    try:
+        if timeout is not None and not call.granted.is_set():
+            try:
+                await asyncio.wait_for(call.granted.wait(), timeout)
+            except TimeoutError:
+                raise TimeoutError("Timed out waiting for LLM rate limit budget") from None
+        # shield: one caller giving up must not cancel the call for the others
+        return await asyncio.shield(call.task)
+    finally:
+        call.waiters -= 1
+        if not call.waiters and not call.granted.is_set():
+            # Nobody is left to take the answer: give up the place in the queue
+            _forget(key, call)
+            call.task.cancel()
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after")), RETRY_MAX_DELAY)
+        except (TypeError, ValueError):
+            pass
+    return min(2 ** attempt, RETRY_MAX_DELAY) * (0.5 + random.random() / 2)
+
+
+async def _request(messages, model, max_tokens, priority, temperature, granted: asyncio.Event) -> str:
+    limiter = llm_scheduler.limiter
+    prompt = "".join(m["content"] for m in messages)
+    with LLM_WAIT_SECONDS.time((model,)):
+        reserved = await limiter.acquire(llm_scheduler.estimate_tokens(prompt, max_tokens), priority)
+    granted.set()
+    client = _get_client()
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+            )
+            LLM_SECONDS.observe(time.perf_counter() - start, (model, "ok"))
+            break
+        except (groq.RateLimitError, groq.APIConnectionError, groq.InternalServerError) as e:
+            LLM_SECONDS.observe(time.perf_counter() - start, (model, type(e).__name__))
+            attempt += 1
+            if attempt > LLM_MAX_RETRIES:
+                _stats["errors"] += 1
+                await limiter.adjust(reserved, reserved)
+                raise
+            _stats["retries"] += 1
+            await asyncio.sleep(_retry_delay(e, attempt))
+        except Exception as e:
+            LLM_SECONDS.observe(time.perf_counter() - start, (model, type(e).__name__))
+            _stats["errors"] += 1
+            await limiter.adjust(reserved, reserved)
+            raise
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    _stats["requests"] += 1
+    _stats["latency_total_ms"] += elapsed_ms
+    _stats["latency_max_ms"] = max(_stats["latency_max_ms"], elapsed_ms)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        LLM_TOKENS.inc((model, "prompt"), getattr(usage, "prompt_tokens", 0) or 0)
+        LLM_TOKENS.inc((model, "completion"), getattr(usage, "completion_tokens", 0) or 0)
+    await limiter.adjust(reserved, getattr(usage, "total_tokens", None) or reserved)
+    return (response.choices[0].message.content or "").strip()
+
+
+def stats() -> dict:
+    s = dict(_stats)
+    s["latency_avg_ms"] = round(s.pop("latency_total_ms") / s["requests"], 2) if s["requests"] else 0.0
+    s["latency_max_ms"] = round(s["latency_max_ms"], 2)
+    s["in_flight"] = len(_inflight)
+    return s
@@ -0,0 +1,130 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+
+# ── Rate limiter for Groq calls ──────────────────────────────────────────────
+#
+# Every LLM request reserves its estimated token cost and one request slot
+# from two buckets that refill at GROQ_TPM tokens / GROQ_RPM requests per
+# minute, so bursts of chunk summaries stay under the account's rate limits
+# instead of tripping 429s. Waiters are served strictly by priority, then
+# arrival order: an interactive note summary queued behind a 200-chunk
+# document batch goes next, not last.
+#
+# The limiter lives on the LLM event loop (services/llm_client.py) and is
+# shared by every caller in the process; when running several workers, split
+# GROQ_TPM / GROQ_RPM between them.
+
+GROQ_TPM = int(os.getenv("GROQ_TPM", "6000"))
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+CHARS_PER_TOKEN = 3.5
+
+
+def estimate_tokens(text: str, max_tokens: int = 0) -> int:
+    """Rough prompt + completion token count (~3.5 chars per token)."""
+    return int(len(text) / CHARS_PER_TOKEN) + max_tokens + 20
+
+
+class RateLimiter:
+    def __init__(self, tokens_per_minute: int, requests_per_minute: int):
+        self.token_capacity = max(1, tokens_per_minute)
+        self.request_capacity = max(1, requests_per_minute)
+        self.tokens = float(self.token_capacity)
+        self.requests = float(self.request_capacity)
+        self._updated = time.monotonic()
+        self._waiters = []   # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = None    # created on first use, on the loop that uses it
+        self.granted = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self.tokens = min(self.token_capacity, self.tokens + elapsed * self.token_capacity / 60.0)
+        self.requests = min(self.request_capacity, self.requests + elapsed * self.request_capacity / 60.0)
+        self._updated = now
+
+    def _shortfall(self, tokens: int) -> float:
+        """Seconds until ``tokens`` and one request are both available."""
+        return max(
+            (tokens - self.tokens) * 60.0 / self.token_capacity,
+            (1 - self.requests) * 60.0 / self.request_capacity,
+            0.0,
+        )
+
+    async def acquire(self, tokens: int, priority: int = PRIORITY_BACKGROUND, timeout: float = None) -> int:
+        """Wait until ``tokens`` (and a request slot) can be spent; returns the amount reserved.
+
+        Requests larger than the bucket are clamped to its capacity so they
+        can still run (at the price of a full minute's budget).
+        """
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        tokens = min(int(tokens), self.token_capacity)
+        entry = (priority, next(self._seq))
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        async with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    wait = None
+                    if self._waiters[0] == entry:
+                        wait = self._shortfall(tokens)
+                        if wait <= 0:
+                            heapq.heappop(self._waiters)
+                            self.tokens -= tokens
+                            self.requests -= 1
+                            self.granted += tokens
+                            self.wait_seconds += time.monotonic() - start
+                            self._cond.notify_all()
+                            return tokens
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError("Timed out waiting for LLM rate limit budget")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+
+    async def adjust(self, reserved: int, actual: int):
+        """Correct a reservation once the real usage is known (refunds over-estimates)."""
+        async with self._cond:
+            self._refill()
+            self.tokens = min(self.token_capacity, self.tokens + reserved - actual)
+            self.granted += actual - reserved
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        waiting = {}
+        for priority, _ in list(self._waiters):
+            name = "interactive" if priority <= PRIORITY_INTERACTIVE else "background"
+            waiting[name] = waiting.get(name, 0) + 1
+        return {
+            "tokens_per_minute": self.token_capacity,
+            "requests_per_minute": self.request_capacity,
+            "available_tokens": int(self.tokens),
+            "available_requests": int(self.requests),
+            "waiting": waiting,
+            "granted_tokens": self.granted,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+limiter = RateLimiter(GROQ_TPM, GROQ_RPM)
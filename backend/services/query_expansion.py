@@ -0,0 +1,213 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from collections import Counter
+
+from psycopg2.extras import execute_values
+
+from database import get_db
+from utils.cache import TTLCache
+from services import llm_client
+from services.ai_service import aexpand_search_query, EXPANSION_BUDGET_WAIT
+from services.llm_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+# ── Cached / precomputed ai_boost query expansion ────────────────────────────
+#
+# Expansions are keyed by the normalised query and kept in an in-process LRU
+# in front of the query_expansions table. A search that misses both starts
+# the LLM call but only waits EXPANSION_BUDGET_MS for it; past that it
+# returns plain results flagged expansion_pending, and the expansion lands in
+# the cache for the next keystroke.
+#
+# Searches never write: a search answered from the cache counts a hit in
+# process memory, and a background thread adds the counts to
+# query_expansions.hits every EXPANSION_HITS_FLUSH_SECONDS. Only queries
+# whose expansion had already settled get hits, so the prefixes typed on the
+# way to a query don't, and no per-user search history is kept. prefetch()
+# (manage.py prefetch-expansions, or the worker) re-expands popular entries
+# before they expire and expands each user's top tags ahead of time.
+
+EXPANSION_CACHE_SIZE = int(os.getenv("EXPANSION_CACHE_SIZE", "5000"))
+EXPANSION_CACHE_TTL = float(os.getenv("EXPANSION_CACHE_TTL", str(7 * 24 * 3600)))
+EXPANSION_BUDGET_MS = float(os.getenv("EXPANSION_BUDGET_MS", "150"))
+EXPANSION_PREFETCH_LIMIT = int(os.getenv("EXPANSION_PREFETCH_LIMIT", "20"))
+EXPANSION_REFRESH_LIMIT = int(os.getenv("EXPANSION_REFRESH_LIMIT", "200"))   # popular entries re-expanded per run
+EXPANSION_PREFETCH_MIN_HITS = int(os.getenv("EXPANSION_PREFETCH_MIN_HITS", "3"))
+EXPANSION_REFRESH_MARGIN = float(os.getenv("EXPANSION_REFRESH_MARGIN", str(24 * 3600)))   # re-expand this long before expiry
+EXPANSION_HITS_FLUSH_SECONDS = float(os.getenv("EXPANSION_HITS_FLUSH_SECONDS", "60"))
+
+_memory = TTLCache(maxsize=EXPANSION_CACHE_SIZE, ttl=EXPANSION_CACHE_TTL)
+_inflight = {}
+_lock = threading.Lock()
+_hits = Counter()
+_flusher_pid = None
+
+
+def normalize(query: str) -> str:
+    return re.sub(r"\s+", " ", query or "").strip().lower()
+
+
+LOOKUP_SQL = """
+    SELECT terms FROM query_expansions
+    WHERE query = %s AND created_at > CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+"""
+
+
+def _cached(query: str, row):
+    if not row:
+        return None
+    terms = json.loads(row["terms"])
+    _memory.set(query, terms)
+    return terms
+
+
+def lookup(cursor, query: str):
+    """Cached expansion terms for a normalised query, or None."""
+    terms = _memory.get(query)
+    if terms is not None:
+        return terms
+    cursor.execute(LOOKUP_SQL, (query, EXPANSION_CACHE_TTL))
+    return _cached(query, cursor.fetchone())
+
+
+def _hit(query: str):
+    global _flusher_pid
+    with _lock:
+        _hits[query] += 1
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(target=_flush_loop, name="expansion-hits", daemon=True).start()
+
+
+def flush_hits():
+    """Add the hits counted in this process to query_expansions.hits."""
+    global _hits
+    with _lock:
+        hits, _hits = _hits, Counter()
+    if not hits:
+        return
+    with get_db() as conn:
+        cursor = conn.cursor()
+        execute_values(cursor, """
+            UPDATE query_expansions e SET hits = e.hits + v.n
+            FROM (VALUES %s) AS v (query, n) WHERE e.query = v.query
+        """, sorted(hits.items()))
+        cursor.close()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(EXPANSION_HITS_FLUSH_SECONDS)
+        try:
+            flush_hits()
+        except Exception:
+            traceback.print_exc()
+
+
+def _store(query: str, terms: list):
+    _memory.set(query, terms)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO query_expansions (query, terms) VALUES (%s, %s)
+            ON CONFLICT (query) DO UPDATE SET terms = EXCLUDED.terms, created_at = CURRENT_TIMESTAMP,
+                hits = query_expansions.hits / 2   -- decay, so popularity follows recent use
+        """, (query, json.dumps(terms)))
+        cursor.close()
+
+
+async def _expand_and_store(query: str, priority: int, budget_wait) -> list:
+    terms = await aexpand_search_query(query, priority=priority, budget_wait=budget_wait)
+    if len(terms) > 1:   # a bare [query] means the LLM call failed; try again next time
+        await asyncio.to_thread(_store, query, terms)
+    return terms
+
+
+def start(query: str, priority: int = PRIORITY_INTERACTIVE, budget_wait=EXPANSION_BUDGET_WAIT):
+    """Start (or join) the expansion of a normalised query; returns a concurrent Future.
+
+    ``budget_wait`` bounds the wait for LLM rate-limit budget (None = no limit).
+    """
+    with _lock:
+        future = _inflight.get(query)
+        if future is None:
+            future = llm_client.submit(_expand_and_store(query, priority, budget_wait))
+            _inflight[query] = future
+            future.add_done_callback(lambda _: _inflight.pop(query, None))
+    return future
+
+
+async def aexpand(conn, query: str, budget_ms: float = EXPANSION_BUDGET_MS):
+    """Expansion terms for a live search: ``(terms, pending)``.
+
+    ``pending`` is True when the expansion didn't arrive within the budget;
+    the terms are then just the query, and the expansion keeps running in the
+    background so the next search finds it cached.
+    """
+    key = normalize(query)
+    terms = _memory.get(key)
+    if terms is None:
+        cursor = await conn.execute(LOOKUP_SQL, (key, EXPANSION_CACHE_TTL))
+        terms = _cached(key, await cursor.fetchone())
+    if terms is not None:
+        _hit(key)
+        return terms, False
+    future = start(key)
+    try:
+        # shield: timing out must leave the expansion running for the next search
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), budget_ms / 1000), False
+    except asyncio.TimeoutError:
+        return [query], True
+    except Exception:
+        return [query], False
+
+
+# ── Prefetch ─────────────────────────────────────────────────────────────────
+
+def prefetch(user_id: int = None, limit: int = EXPANSION_PREFETCH_LIMIT) -> int:
+    """Re-expand popular cached queries before they expire and expand each user's
+    top ``limit`` tags that aren't cached yet (background priority)."""
+    flush_hits()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM query_expansions WHERE created_at <= CURRENT_TIMESTAMP - %s * INTERVAL '1 second'",
+            (EXPANSION_CACHE_TTL,)
+        )
+        cursor.execute("""
+            SELECT query FROM query_expansions
+            WHERE hits >= %s AND created_at <= CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+            ORDER BY hits DESC LIMIT %s
+        """, (EXPANSION_PREFETCH_MIN_HITS, max(EXPANSION_CACHE_TTL - EXPANSION_REFRESH_MARGIN, 0), EXPANSION_REFRESH_LIMIT))
+        queries = [r["query"] for r in cursor.fetchall()]
+        user_filter = "WHERE user_id = %(uid)s" if user_id is not None else ""
+        cursor.execute(f"""
+            SELECT DISTINCT lower(label) AS query FROM (
+                SELECT label, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY count DESC, tag) AS rank
+                FROM user_tag_counts {user_filter}
+            ) t
+            WHERE rank <= %(limit)s
+              AND NOT EXISTS (SELECT 1 FROM query_expansions e WHERE e.query = lower(t.label))
+        """, {"uid": user_id, "limit": limit})
+        queries += [normalize(r["query"]) for r in cursor.fetchall()]
+        cursor.close()
+
+    for q in queries:
+        _memory.delete(q)   # so start() goes to the LLM instead of the stale entry
+    expanded = 0
+    futures = [start(q, priority=PRIORITY_BACKGROUND, budget_wait=None) for q in dict.fromkeys(queries) if q]
+    for future in futures:
+        try:
+            if len(future.result()) > 1:
+                expanded += 1
+        except Exception:
+            traceback.print_exc()
+    return expanded
+
+
+def stats() -> dict:
+    return {"cache": _memory.stats(), "in_flight": len(_inflight), "budget_ms": EXPANSION_BUDGET_MS}
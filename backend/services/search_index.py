@@ -0,0 +1,337 @@
+import hashlib
+import hmac
+import json
+import re
+from collections import Counter
+from functools import lru_cache
+from psycopg2.extras import execute_values
+
+from database import copy_rows, fetchall
+from utils.security import SECRET_KEY, decrypt_content
+
+# ── Per-user inverted index with BM25 ranking ─────────────────────────────────
+#
+# search_items     one row per indexed note/document with its (weighted) length
+# search_postings  token → (item, weighted term frequency)
+# search_stats     per-user, per-type document count and total length for BM25
+#
+# Field weights make a title hit count more than a tag hit, and a tag hit more
+# than a summary hit — the same weighting the old ILIKE scorer used.
+#
+# note_content_index is the blind index over note bodies, which are only
+# stored encrypted. Each content token is stored as a keyed hash,
+# HMAC-SHA256(key, "user_id:token") truncated to 64 bits, so plaintext never
+# reaches the database. A query hashes its tokens the same way and the BM25
+# query scores the matches like any other posting, without decrypting
+# anything. Without SECRET_KEY the hashes say nothing about the words. They
+# do reveal repetition: the same word in two of one user's notes has the
+# same hash, as in any deterministic index. Content lengths count toward
+# search_items.length.
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_TOKEN_LEN = 64
+MAX_PREFIX_EXPANSIONS = 10
+
+NOTE_WEIGHTS = {"title": 3.0, "tags": 2.0}
+CONTENT_WEIGHT = 1.0
+DOCUMENT_WEIGHTS = {"name": 3.0, "summary": 1.0}
+
+_TOKEN_RE = re.compile(r"\w+")
+_BLIND_KEY = hashlib.sha256(b"blind-index:" + SECRET_KEY.encode()).digest()
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if len(t) <= MAX_TOKEN_LEN]
+
+
+def _term_frequencies(fields: dict, weights: dict) -> Counter:
+    tf = Counter()
+    for field, text in fields.items():
+        weight = weights[field]
+        for token in tokenize(text):
+            tf[token] += weight
+    return tf
+
+
+@lru_cache(maxsize=200_000)
+def blind_token(user_id: int, token: str) -> int:
+    """Keyed 64-bit hash of a content token (signed, to fit a BIGINT)."""
+    digest = hmac.new(_BLIND_KEY, f"{user_id}:{token}".encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def _content_frequencies(user_id: int, content: str) -> Counter:
+    return Counter({blind_token(user_id, token): n * CONTENT_WEIGHT for token, n in Counter(tokenize(content)).items()})
+
+
+# ── Index maintenance ────────────────────────────────────────────────────────
+
+def remove_item(cursor, user_id: int, item_type: str, item_id: int):
+    cursor.execute(
+        "DELETE FROM search_items WHERE user_id = %s AND item_type = %s AND item_id = %s RETURNING length",
+        (user_id, item_type, item_id)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return
+    cursor.execute(
+        "DELETE FROM search_postings WHERE user_id = %s AND item_type = %s AND item_id = %s",
+        (user_id, item_type, item_id)
+    )
+    cursor.execute(
+        "UPDATE search_stats SET item_count = item_count - 1, total_length = total_length - %s WHERE user_id = %s AND item_type = %s",
+        (row["length"], user_id, item_type)
+    )
+
+
+def _index_item(cursor, user_id: int, item_type: str, item_id: int, tf: Counter, extra_length: float = 0):
+    remove_item(cursor, user_id, item_type, item_id)
+    length = sum(tf.values()) + extra_length
+    if not length:
+        return
+    cursor.execute(
+        "INSERT INTO search_items (user_id, item_type, item_id, length) VALUES (%s, %s, %s, %s)",
+        (user_id, item_type, item_id, length)
+    )
+    execute_values(
+        cursor,
+        "INSERT INTO search_postings (user_id, item_type, token, item_id, tf) VALUES %s",
+        [(user_id, item_type, token, item_id, weight) for token, weight in tf.items()]
+    )
+    cursor.execute("""
+        INSERT INTO search_stats (user_id, item_type, item_count, total_length) VALUES (%s, %s, 1, %s)
+        ON CONFLICT (user_id, item_type) DO UPDATE
+        SET item_count = search_stats.item_count + 1, total_length = search_stats.total_length + EXCLUDED.total_length
+    """, (user_id, item_type, length))
+
+
+def remove_note(cursor, user_id: int, note_id: int):
+    remove_item(cursor, user_id, "note", note_id)
+    cursor.execute("DELETE FROM note_content_index WHERE note_id = %s", (note_id,))
+
+
+def _set_content(cursor, user_id: int, note_id: int, content_tf: Counter) -> float:
+    cursor.execute("DELETE FROM note_content_index WHERE note_id = %s", (note_id,))
+    if content_tf:
+        execute_values(
+            cursor,
+            "INSERT INTO note_content_index (user_id, token_hash, note_id, tf) VALUES %s",
+            [(user_id, h, note_id, weight) for h, weight in content_tf.items()]
+        )
+    return sum(content_tf.values())
+
+
+def index_note(cursor, user_id: int, note_id: int, title: str, tags: list, content: str = None):
+    """Index a note's title and tags; pass the plaintext ``content`` when it
+    changed to refresh its blind index too (None keeps the stored one)."""
+    tf = _term_frequencies({"title": title, "tags": " ".join(tags or [])}, NOTE_WEIGHTS)
+    if content is not None:
+        content_length = _set_content(cursor, user_id, note_id, _content_frequencies(user_id, content))
+    else:
+        cursor.execute("SELECT COALESCE(SUM(tf), 0) AS length FROM note_content_index WHERE note_id = %s", (note_id,))
+        content_length = cursor.fetchone()["length"]
+    _index_item(cursor, user_id, "note", note_id, tf, content_length)
+
+
+def index_document(cursor, user_id: int, doc_id: int, name: str, summary: str = ""):
+    tf = _term_frequencies({"name": name, "summary": summary}, DOCUMENT_WEIGHTS)
+    _index_item(cursor, user_id, "document", doc_id, tf)
+
+
+# ── Batch variants (bulk note import / batch edits) ──────────────────────────
+
+def remove_items(cursor, user_id: int, item_type: str, item_ids: list):
+    if not item_ids:
+        return
+    cursor.execute(
+        "DELETE FROM search_items WHERE user_id = %s AND item_type = %s AND item_id = ANY(%s) RETURNING length",
+        (user_id, item_type, list(item_ids))
+    )
+    lengths = [r["length"] for r in cursor.fetchall()]
+    if not lengths:
+        return
+    cursor.execute(
+        "DELETE FROM search_postings WHERE user_id = %s AND item_type = %s AND item_id = ANY(%s)",
+        (user_id, item_type, list(item_ids))
+    )
+    cursor.execute(
+        "UPDATE search_stats SET item_count = item_count - %s, total_length = total_length - %s WHERE user_id = %s AND item_type = %s",
+        (len(lengths), sum(lengths), user_id, item_type)
+    )
+
+
+def remove_notes(cursor, user_id: int, note_ids: list):
+    remove_items(cursor, user_id, "note", note_ids)
+    if note_ids:
+        cursor.execute("DELETE FROM note_content_index WHERE note_id = ANY(%s)", (list(note_ids),))
+
+
+def index_notes(cursor, user_id: int, notes: list, replace: bool = True):
+    """index_note() for many notes at once; ``notes`` is [(note_id, title, tags, content)]
+    with content None where it is unchanged.
+
+    Pass ``replace=False`` for freshly inserted notes to skip the removal pass.
+    """
+    if not notes:
+        return
+    content_tfs = {n[0]: _content_frequencies(user_id, n[3]) for n in notes if n[3] is not None}
+    stored_lengths = {}
+    if replace:
+        remove_items(cursor, user_id, "note", [n[0] for n in notes])
+        if content_tfs:
+            cursor.execute("DELETE FROM note_content_index WHERE note_id = ANY(%s)", (list(content_tfs),))
+        unchanged = [n[0] for n in notes if n[3] is None]
+        if unchanged:
+            cursor.execute(
+                "SELECT note_id, SUM(tf) AS length FROM note_content_index WHERE note_id = ANY(%s) GROUP BY note_id",
+                (unchanged,)
+            )
+            stored_lengths = {r["note_id"]: r["length"] for r in cursor.fetchall()}
+    if content_tfs:
+        copy_rows(cursor, "note_content_index", ("user_id", "token_hash", "note_id", "tf"),
+                  ((user_id, h, note_id, weight) for note_id, tf in content_tfs.items() for h, weight in tf.items()))
+    items = []
+    for note_id, title, tags, _ in notes:
+        tf = _term_frequencies({"title": title, "tags": " ".join(tags or [])}, NOTE_WEIGHTS)
+        content_tf = content_tfs.get(note_id)
+        length = sum(tf.values()) + (sum(content_tf.values()) if content_tf is not None else stored_lengths.get(note_id, 0))
+        if length:
+            items.append((note_id, tf, length))
+    if not items:
+        return
+    copy_rows(cursor, "search_items", ("user_id", "item_type", "item_id", "length"),
+              ((user_id, "note", note_id, length) for note_id, _, length in items))
+    copy_rows(cursor, "search_postings", ("user_id", "item_type", "token", "item_id", "tf"),
+              ((user_id, "note", token, note_id, weight) for note_id, tf, _ in items for token, weight in tf.items()))
+    cursor.execute("""
+        INSERT INTO search_stats (user_id, item_type, item_count, total_length) VALUES (%s, 'note', %s, %s)
+        ON CONFLICT (user_id, item_type) DO UPDATE
+        SET item_count = search_stats.item_count + EXCLUDED.item_count, total_length = search_stats.total_length + EXCLUDED.total_length
+    """, (user_id, len(items), sum(length for _, _, length in items)))
+
+
+def _decrypt(encrypted: str) -> str:
+    try:
+        return decrypt_content(encrypted)
+    except Exception:
+        return ""
+
+
+def reindex_user(cursor, user_id: int) -> int:
+    """Rebuild one user's index from the base tables. Returns the number of items indexed."""
+    cursor.execute("DELETE FROM search_postings WHERE user_id = %s", (user_id,))
+    cursor.execute("DELETE FROM search_items WHERE user_id = %s", (user_id,))
+    cursor.execute("DELETE FROM search_stats WHERE user_id = %s", (user_id,))
+    cursor.execute("DELETE FROM note_content_index WHERE user_id = %s", (user_id,))
+    cursor.execute("SELECT id, title, tags, encrypted_content FROM notes WHERE user_id = %s", (user_id,))
+    notes = cursor.fetchall()
+    index_notes(cursor, user_id, [
+        (n["id"], n["title"], json.loads(n["tags"] or "[]"), _decrypt(n["encrypted_content"])) for n in notes
+    ], replace=False)
+    cursor.execute("SELECT id, original_name, summary FROM documents WHERE user_id = %s", (user_id,))
+    docs = cursor.fetchall()
+    for d in docs:
+        index_document(cursor, user_id, d["id"], d["original_name"], d["summary"] or "")
+    return len(notes) + len(docs)
+
+
+# ── Querying ─────────────────────────────────────────────────────────────────
+
+def _prefix_query(user_id: int, item_type: str, prefix: str):
+    pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return (
+        "SELECT DISTINCT token FROM search_postings WHERE user_id = %s AND item_type = %s AND token LIKE %s LIMIT %s",
+        (user_id, item_type, pattern, MAX_PREFIX_EXPANSIONS)
+    )
+
+
+def expand_prefix(cursor, user_id: int, item_type: str, prefix: str) -> list:
+    """Indexed tokens starting with ``prefix`` (for search-as-you-type on the last word)."""
+    cursor.execute(*_prefix_query(user_id, item_type, prefix))
+    return [r["token"] for r in cursor.fetchall()]
+
+
+async def aexpand_prefix(conn, user_id: int, item_type: str, prefix: str) -> list:
+    """expand_prefix() on an async connection (database.get_adb)."""
+    rows = await fetchall(conn, *_prefix_query(user_id, item_type, prefix))
+    return [r["token"] for r in rows]
+
+
+def _search_query(user_id: int, item_type: str, tokens: list, limit: int, offset: int):
+    # Notes also match on their encrypted content, through the blind index
+    content_hits = """
+            UNION ALL
+            SELECT q.token, c.note_id, c.tf
+            FROM note_content_index c
+            JOIN unnest(%(hashes)s::bigint[], %(tokens)s::text[]) AS q (hash, token) ON q.hash = c.token_hash
+            WHERE c.user_id = %(uid)s
+    """ if item_type == "note" else ""
+    return f"""
+        WITH stats AS (
+            SELECT item_count AS n, total_length / GREATEST(item_count, 1) AS avgdl
+            FROM search_stats WHERE user_id = %(uid)s AND item_type = %(type)s
+        ),
+        hits AS (
+            SELECT token, item_id, tf
+            FROM search_postings
+            WHERE user_id = %(uid)s AND item_type = %(type)s AND token = ANY(%(tokens)s)
+            {content_hits}
+        ),
+        matches AS (
+            SELECT token, item_id, SUM(tf) AS tf FROM hits GROUP BY token, item_id
+        ),
+        df AS (
+            SELECT token, COUNT(*) AS df FROM matches GROUP BY token
+        ),
+        scored AS (
+            SELECT m.item_id,
+                   SUM(
+                       ln(1 + (s.n - df.df + 0.5) / (df.df + 0.5))
+                       * m.tf * (%(k1)s + 1)
+                       / (m.tf + %(k1)s * (1 - %(b)s + %(b)s * i.length / GREATEST(s.avgdl, 1)))
+                   ) AS score
+            FROM matches m
+            JOIN df ON df.token = m.token
+            JOIN search_items i ON i.user_id = %(uid)s AND i.item_type = %(type)s AND i.item_id = m.item_id
+            CROSS JOIN stats s
+            GROUP BY m.item_id
+        )
+        SELECT item_id, score, MAX(score) OVER () AS max_score, COUNT(*) OVER () AS total
+        FROM scored
+        ORDER BY score DESC, item_id DESC
+        LIMIT %(limit)s OFFSET %(offset)s
+    """, {"uid": user_id, "type": item_type, "tokens": tokens, "hashes": [blind_token(user_id, t) for t in tokens],
+          "k1": BM25_K1, "b": BM25_B, "limit": limit, "offset": offset}
+
+
+def _hits(rows: list):
+    if not rows:
+        return [], 0
+    hits = [{
+        "item_id": r["item_id"],
+        "score": round(float(r["score"]), 4),
+        "similarity": round(float(r["score"]) / float(r["max_score"]), 2) if r["max_score"] else 0.0,
+    } for r in rows]
+    return hits, rows[0]["total"]
+
+
+def search(cursor, user_id: int, item_type: str, tokens: list, limit: int = 20, offset: int = 0):
+    """BM25 top-k over one user's items of ``item_type``.
+
+    Returns ``(hits, total)`` where hits are ``{"item_id", "score", "similarity"}``
+    ordered by score, and similarity is the score relative to the best match.
+    """
+    tokens = sorted(set(tokens))
+    if not tokens:
+        return [], 0
+    cursor.execute(*_search_query(user_id, item_type, tokens, limit, offset))
+    return _hits(cursor.fetchall())
+
+
+async def asearch(conn, user_id: int, item_type: str, tokens: list, limit: int = 20, offset: int = 0):
+    """search() on an async connection."""
+    tokens = sorted(set(tokens))
+    if not tokens:
+        return [], 0
+    return _hits(await fetchall(conn, *_search_query(user_id, item_type, tokens, limit, offset)))
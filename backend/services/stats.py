@@ -0,0 +1,171 @@
+from psycopg2.extras import execute_values
+
+# ── Per-user dashboard rollups ───────────────────────────────────────────────
+#
+# user_stats            counters shown on the dashboard; dedup_bytes_saved is the
+#                       size of uploads whose content was already in the blob store
+# user_weekly_activity  notes / documents created per ISO week ('IYYY-IW')
+# user_tag_counts       notes per tag (maintained by services/tags.py)
+#
+# Write paths call the helpers below inside their own transaction, so the
+# rollups commit or roll back together with the change they describe.
+# rebuild_user() recomputes everything from the base tables.
+
+COUNTERS = ("total_notes", "total_documents", "ai_summaries", "storage_bytes", "notes_with_tags", "dedup_bytes_saved")
+
+
+def bump(cursor, user_id: int, **deltas):
+    values = [deltas.get(c, 0) for c in COUNTERS]
+    cursor.execute(f"""
+        INSERT INTO user_stats (user_id, {", ".join(COUNTERS)}) VALUES (%s, {", ".join(["%s"] * len(COUNTERS))})
+        ON CONFLICT (user_id) DO UPDATE SET
+            {", ".join(f"{c} = user_stats.{c} + EXCLUDED.{c}" for c in COUNTERS)},
+            updated_at = CURRENT_TIMESTAMP
+    """, (user_id, *values))
+
+
+def bump_week(cursor, user_id: int, created_at=None, notes: int = 0, documents: int = 0):
+    """Adjust the activity bucket of ``created_at`` (now, for new rows)."""
+    cursor.execute("""
+        INSERT INTO user_weekly_activity (user_id, week, notes, documents)
+        VALUES (%s, to_char(COALESCE(%s, CURRENT_TIMESTAMP), 'IYYY-IW'), %s, %s)
+        ON CONFLICT (user_id, week) DO UPDATE SET
+            notes = user_weekly_activity.notes + EXCLUDED.notes,
+            documents = user_weekly_activity.documents + EXCLUDED.documents
+    """, (user_id, created_at, notes, documents))
+
+
+# ── Hooks for the note / document write paths ────────────────────────────────
+
+def note_created(cursor, user_id: int, has_tags: bool):
+    bump(cursor, user_id, total_notes=1, notes_with_tags=int(has_tags))
+    bump_week(cursor, user_id, notes=1)
+
+
+def note_tags_changed(cursor, user_id: int, had_tags: bool, has_tags: bool):
+    if had_tags != has_tags:
+        bump(cursor, user_id, notes_with_tags=1 if has_tags else -1)
+
+
+def note_deleted(cursor, user_id: int, created_at, had_tags: bool):
+    bump(cursor, user_id, total_notes=-1, notes_with_tags=-int(had_tags))
+    bump_week(cursor, user_id, created_at, notes=-1)
+
+
+def notes_created(cursor, user_id: int, created_ats: list, with_tags: int):
+    """note_created() for a batch; ``created_ats`` may hold None for "now"."""
+    bump(cursor, user_id, total_notes=len(created_ats), notes_with_tags=with_tags)
+    _bump_weeks(cursor, user_id, created_ats, 1)
+
+
+def notes_deleted(cursor, user_id: int, created_ats: list, with_tags: int):
+    bump(cursor, user_id, total_notes=-len(created_ats), notes_with_tags=-with_tags)
+    _bump_weeks(cursor, user_id, created_ats, -1)
+
+
+def _bump_weeks(cursor, user_id: int, created_ats: list, sign: int):
+    # One upsert per ISO week rather than per note; weeks are bucketed in SQL
+    # so timestamps are read exactly as the notes table stores them.
+    execute_values(cursor, f"""
+        INSERT INTO user_weekly_activity (user_id, week, notes, documents)
+        SELECT {int(user_id)}, to_char(COALESCE(v.created_at, CURRENT_TIMESTAMP), 'IYYY-IW') AS week, {int(sign)} * COUNT(*), 0
+        FROM (VALUES %s) v (created_at) GROUP BY week
+        ON CONFLICT (user_id, week) DO UPDATE SET notes = user_weekly_activity.notes + EXCLUDED.notes
+    """, [(c,) for c in created_ats], template="(%s::timestamp)", page_size=10000)
+
+
+def document_created(cursor, user_id: int, file_size: int, deduplicated: bool = False):
+    bump(cursor, user_id, total_documents=1, storage_bytes=file_size, dedup_bytes_saved=file_size if deduplicated else 0)
+    bump_week(cursor, user_id, documents=1)
+
+
+def document_summary_changed(cursor, user_id: int, had_summary: bool, has_summary: bool):
+    if had_summary != has_summary:
+        bump(cursor, user_id, ai_summaries=1 if has_summary else -1)
+
+
+def document_deleted(cursor, user_id: int, created_at, file_size: int, had_summary: bool, deduplicated: bool = False):
+    bump(cursor, user_id, total_documents=-1, storage_bytes=-(file_size or 0), ai_summaries=-int(had_summary),
+         dedup_bytes_saved=-(file_size or 0) if deduplicated else 0)
+    bump_week(cursor, user_id, created_at, documents=-1)
+
+
+# ── Reads ────────────────────────────────────────────────────────────────────
+
+def read_query(user_id: int, weeks: int = 8, top_tags: int = 8):
+    return """
+        SELECT s.*,
+               (SELECT COALESCE(json_object_agg(w.week, json_build_object('notes', w.notes, 'documents', w.documents)), '{}')
+                FROM user_weekly_activity w
+                WHERE w.user_id = %(uid)s AND w.week >= to_char(CURRENT_TIMESTAMP - %(days)s * INTERVAL '1 day', 'IYYY-IW')
+               ) AS weekly,
+               (SELECT COALESCE(json_agg(json_build_object('tag', t.label, 'count', t.count) ORDER BY t.count DESC, t.tag), '[]')
+                FROM (SELECT tag, label, count FROM user_tag_counts WHERE user_id = %(uid)s
+                      ORDER BY count DESC, tag LIMIT %(tags)s) t
+               ) AS top_tags
+        FROM (SELECT %(uid)s AS uid) u
+        LEFT JOIN user_stats s ON s.user_id = u.uid
+    """, {"uid": user_id, "days": weeks * 7, "tags": top_tags}
+
+
+def read_result(row) -> dict:
+    result = {c: (row[c] or 0) for c in COUNTERS}
+    result["weekly"] = row["weekly"]
+    result["top_tags"] = row["top_tags"]
+    return result
+
+
+def read(cursor, user_id: int, weeks: int = 8, top_tags: int = 8) -> dict:
+    """Counters, the last ``weeks`` activity buckets and top tags in one indexed round-trip."""
+    cursor.execute(*read_query(user_id, weeks, top_tags))
+    return read_result(cursor.fetchone())
+
+
+# ── Rebuild / consistency check ──────────────────────────────────────────────
+
+def compute_user(cursor, user_id: int) -> dict:
+    cursor.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM notes WHERE user_id = %(uid)s) AS total_notes,
+            (SELECT COUNT(*) FROM documents WHERE user_id = %(uid)s) AS total_documents,
+            (SELECT COUNT(*) FROM documents WHERE user_id = %(uid)s AND summary IS NOT NULL AND summary != '') AS ai_summaries,
+            (SELECT COALESCE(SUM(file_size), 0) FROM documents WHERE user_id = %(uid)s) AS storage_bytes,
+            (SELECT COUNT(DISTINCT note_id) FROM note_tags WHERE user_id = %(uid)s) AS notes_with_tags,
+            (SELECT COALESCE(SUM(file_size), 0) FROM documents WHERE user_id = %(uid)s AND deduplicated) AS dedup_bytes_saved
+    """, {"uid": user_id})
+    counters = dict(cursor.fetchone())
+    cursor.execute("""
+        SELECT week, SUM(notes)::int AS notes, SUM(documents)::int AS documents FROM (
+            SELECT to_char(created_at, 'IYYY-IW') AS week, 1 AS notes, 0 AS documents FROM notes WHERE user_id = %(uid)s
+            UNION ALL
+            SELECT to_char(created_at, 'IYYY-IW'), 0, 1 FROM documents WHERE user_id = %(uid)s
+        ) t GROUP BY week
+    """, {"uid": user_id})
+    weekly = {r["week"]: (r["notes"], r["documents"]) for r in cursor.fetchall()}
+    return {"counters": counters, "weekly": weekly}
+
+
+def stored_user(cursor, user_id: int) -> dict:
+    cursor.execute(f"SELECT {', '.join(COUNTERS)} FROM user_stats WHERE user_id = %s", (user_id,))
+    row = cursor.fetchone()
+    counters = {c: (row[c] if row else 0) for c in COUNTERS}
+    cursor.execute(
+        "SELECT week, notes, documents FROM user_weekly_activity WHERE user_id = %s AND (notes != 0 OR documents != 0)",
+        (user_id,)
+    )
+    weekly = {r["week"]: (r["notes"], r["documents"]) for r in cursor.fetchall()}
+    return {"counters": counters, "weekly": weekly}
+
+
+def rebuild_user(cursor, user_id: int) -> dict:
+    """Recompute a user's rollups from the base tables and store them."""
+    fresh = compute_user(cursor, user_id)
+    cursor.execute("DELETE FROM user_stats WHERE user_id = %s", (user_id,))
+    cursor.execute("DELETE FROM user_weekly_activity WHERE user_id = %s", (user_id,))
+    bump(cursor, user_id, **fresh["counters"])
+    for week, (notes, documents) in fresh["weekly"].items():
+        cursor.execute(
+            "INSERT INTO user_weekly_activity (user_id, week, notes, documents) VALUES (%s, %s, %s, %s)",
+            (user_id, week, notes, documents)
+        )
+    return fresh
@@ -0,0 +1,137 @@
+from psycopg2.extras import execute_values
+
+from database import copy_rows
+
+# ── Normalised tag store ─────────────────────────────────────────────────────
+#
+# notes.tags keeps the JSON list as entered (display order and casing);
+# note_tags holds one case-folded row per (note, tag) so overlap, counts and
+# filters are indexed lookups instead of JSON parsing in Python.
+# user_tag_counts is a per-user rollup of note_tags that serves "top tags".
+
+
+def normalize_tag(tag: str) -> str:
+    return tag.strip().lower()
+
+
+def has_tags(tags: list) -> bool:
+    return any(normalize_tag(t) for t in tags or [])
+
+
+def _apply_deltas(cursor, user_id: int, deltas: dict):
+    """``deltas`` is {tag: (label, delta)}."""
+    if not deltas:
+        return
+    execute_values(cursor, """
+        INSERT INTO user_tag_counts (user_id, tag, label, count) VALUES %s
+        ON CONFLICT (user_id, tag) DO UPDATE SET count = user_tag_counts.count + EXCLUDED.count
+    """, [(user_id, tag, label, delta) for tag, (label, delta) in sorted(deltas.items())])
+    if any(delta < 0 for _, delta in deltas.values()):
+        cursor.execute("DELETE FROM user_tag_counts WHERE user_id = %s AND count <= 0", (user_id,))
+
+
+def _adjust_counts(cursor, user_id: int, labels: dict, delta: int):
+    _apply_deltas(cursor, user_id, {tag: (label, delta) for tag, label in labels.items()})
+
+
+def _rows(tags: list) -> dict:
+    rows = {}
+    for label in tags or []:
+        tag = normalize_tag(label)
+        if tag and tag not in rows:
+            rows[tag] = label.strip()
+    return rows
+
+
+def clear_note_tags(cursor, user_id: int, note_id: int) -> dict:
+    """Remove a note's tags; returns the removed {tag: label}."""
+    cursor.execute("DELETE FROM note_tags WHERE note_id = %s RETURNING tag, label", (note_id,))
+    removed = {r["tag"]: r["label"] for r in cursor.fetchall()}
+    _adjust_counts(cursor, user_id, removed, -1)
+    return removed
+
+
+def set_note_tags(cursor, user_id: int, note_id: int, tags: list) -> dict:
+    """Replace a note's tags; returns the previous {tag: label}."""
+    rows = _rows(tags)
+    cursor.execute("SELECT tag, label FROM note_tags WHERE note_id = %s", (note_id,))
+    previous = {r["tag"]: r["label"] for r in cursor.fetchall()}
+    removed = {t: l for t, l in previous.items() if t not in rows}
+    added = {t: l for t, l in rows.items() if t not in previous}
+    if removed:
+        cursor.execute("DELETE FROM note_tags WHERE note_id = %s AND tag = ANY(%s)", (note_id, list(removed)))
+        _adjust_counts(cursor, user_id, removed, -1)
+    if added:
+        execute_values(
+            cursor, "INSERT INTO note_tags (note_id, user_id, tag, label) VALUES %s",
+            [(note_id, user_id, t, l) for t, l in added.items()]
+        )
+        _adjust_counts(cursor, user_id, added, 1)
+    return previous
+
+
+def clear_notes_tags(cursor, user_id: int, note_ids: list) -> set:
+    """clear_note_tags() for many notes; returns the ids of notes that had tags."""
+    if not note_ids:
+        return set()
+    cursor.execute(
+        "DELETE FROM note_tags WHERE user_id = %s AND note_id = ANY(%s) RETURNING note_id, tag, label",
+        (user_id, list(note_ids))
+    )
+    removed = cursor.fetchall()
+    deltas = {}
+    for r in removed:
+        label, delta = deltas.get(r["tag"], (r["label"], 0))
+        deltas[r["tag"]] = (label, delta - 1)
+    _apply_deltas(cursor, user_id, deltas)
+    return {r["note_id"] for r in removed}
+
+
+def add_notes_tags(cursor, user_id: int, note_tags: dict):
+    """Tag notes that have none yet; ``note_tags`` is {note_id: tags}."""
+    rows, deltas = [], {}
+    for note_id, tags in note_tags.items():
+        for tag, label in _rows(tags).items():
+            rows.append((note_id, user_id, tag, label))
+            label, delta = deltas.get(tag, (label, 0))
+            deltas[tag] = (label, delta + 1)
+    if not rows:
+        return
+    copy_rows(cursor, "note_tags", ("note_id", "user_id", "tag", "label"), rows)
+    _apply_deltas(cursor, user_id, deltas)
+
+
+def rebuild_tag_counts(cursor, user_id: int):
+    cursor.execute("DELETE FROM user_tag_counts WHERE user_id = %s", (user_id,))
+    cursor.execute("""
+        INSERT INTO user_tag_counts (user_id, tag, label, count)
+        SELECT user_id, tag, MIN(label), COUNT(*) FROM note_tags WHERE user_id = %s GROUP BY user_id, tag
+    """, (user_id,))
+
+
+def related_notes(cursor, user_id: int, note_id: int, limit: int = 5) -> list:
+    """Notes sharing tags with ``note_id``, ranked by shared / max(tag counts)."""
+    cursor.execute("""
+        WITH mine AS (
+            SELECT tag FROM note_tags WHERE note_id = %(nid)s
+        ),
+        overlap AS (
+            SELECT o.note_id, COUNT(*) AS shared
+            FROM note_tags o JOIN mine ON mine.tag = o.tag
+            WHERE o.user_id = %(uid)s AND o.note_id != %(nid)s
+            GROUP BY o.note_id
+        ),
+        sizes AS (
+            SELECT t.note_id, COUNT(*) AS n
+            FROM note_tags t JOIN overlap ON overlap.note_id = t.note_id
+            GROUP BY t.note_id
+        )
+        SELECT n.id, n.title, n.tags, n.updated_at,
+               ROUND(overlap.shared::numeric / GREATEST(sizes.n, (SELECT COUNT(*) FROM mine)), 2)::float AS similarity
+        FROM overlap
+        JOIN sizes ON sizes.note_id = overlap.note_id
+        JOIN notes n ON n.id = overlap.note_id
+        ORDER BY similarity DESC, n.updated_at DESC
+        LIMIT %(limit)s
+    """, {"uid": user_id, "nid": note_id, "limit": limit})
+    return cursor.fetchall()
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import threading
+
+import numpy as np
+
+from database import after_commit, fetchall
+from services.embeddings import from_bytes, get_embedder
+from utils.cache import TTLCache
+
+# ── In-memory per-user vector matrices ───────────────────────────────────────
+#
+# Each (user, item type) gets one contiguous float32 matrix of unit vectors, so
+# a query is a single mat-vec product plus argpartition. Matrices are loaded on
+# first use, patched in place by the write paths once their transaction has
+# committed (database.after_commit), and expire after VECTOR_CACHE_TTL so
+# other worker processes pick up their changes.
+
+VECTOR_CACHE_USERS = int(os.getenv("VECTOR_CACHE_USERS", "256"))
+VECTOR_CACHE_TTL = float(os.getenv("VECTOR_CACHE_TTL", "120"))
+
+_TABLES = {"note": "notes", "document": "documents"}
+
+
+class UserVectors:
+    def __init__(self, dim: int, ids=(), vectors=None):
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._ids = np.array(ids, dtype=np.int64)
+        self._matrix = vectors if vectors is not None else np.zeros((0, dim), dtype=np.float32)
+        self._size = len(self._ids)
+        self._rows = {int(i): r for r, i in enumerate(self._ids)}
+
+    def __len__(self):
+        return self._size
+
+    def upsert(self, item_id: int, vector: np.ndarray):
+        with self._lock:
+            row = self._rows.get(item_id)
+            if row is None:
+                if self._size == len(self._matrix):
+                    # Grow geometrically so bursts of inserts stay amortised O(1)
+                    capacity = max(16, len(self._matrix) * 2)
+                    matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+                    matrix[:self._size] = self._matrix[:self._size]
+                    ids = np.zeros(capacity, dtype=np.int64)
+                    ids[:self._size] = self._ids[:self._size]
+                    self._matrix, self._ids = matrix, ids
+                row = self._size
+                self._size += 1
+                self._rows[item_id] = row
+                self._ids[row] = item_id
+            self._matrix[row] = vector
+
+    def remove(self, item_id: int):
+        with self._lock:
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                return
+            last = self._size - 1
+            if row != last:
+                # Move the last row into the hole to keep the matrix dense
+                moved = int(self._ids[last])
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+            self._size = last
+
+    def vector(self, item_id: int):
+        with self._lock:
+            row = self._rows.get(item_id)
+            return None if row is None else self._matrix[row].copy()
+
+    def _scores(self, query: np.ndarray):
+        with self._lock:
+            n = self._size
+            return self._matrix[:n] @ query, self._ids[:n].copy()
+
+    @staticmethod
+    def _best(scores, ids, candidates, k: int):
+        k = min(k, len(candidates))
+        if k <= 0:
+            return []
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def top_k(self, query: np.ndarray, k: int):
+        """Return [(item_id, cosine)] for the k nearest items, best first."""
+        scores, ids = self._scores(query)
+        return self._best(scores, ids, np.arange(len(ids)), k)
+
+    def matches(self, query: np.ndarray, k: int):
+        """top_k() over items with a positive cosine, plus how many such items there are."""
+        scores, ids = self._scores(query)
+        positive = np.flatnonzero(scores > 0)
+        return self._best(scores, ids, positive, k), len(positive)
+
+
+_cache = TTLCache(maxsize=VECTOR_CACHE_USERS, ttl=VECTOR_CACHE_TTL)
+_load_lock = threading.Lock()
+
+
+def _load_query(user_id: int, item_type: str):
+    return f"SELECT id, embedding FROM {_TABLES[item_type]} WHERE user_id = %s AND embedding IS NOT NULL", (user_id,)
+
+
+def _build(rows: list) -> UserVectors:
+    dim = get_embedder().dim
+    rows = [r for r in rows if len(r["embedding"]) == dim * 4]
+    vectors = np.empty((len(rows), dim), dtype=np.float32)
+    for i, r in enumerate(rows):
+        vectors[i] = from_bytes(r["embedding"])
+    return UserVectors(dim, [r["id"] for r in rows], vectors)
+
+
+def _load(cursor, user_id: int, item_type: str) -> UserVectors:
+    cursor.execute(*_load_query(user_id, item_type))
+    return _build(cursor.fetchall())
+
+
+def get_user_vectors(cursor, user_id: int, item_type: str) -> UserVectors:
+    key = (user_id, item_type)
+    vectors = _cache.get(key)
+    if vectors is None:
+        with _load_lock:
+            vectors = _cache.get(key)
+            if vectors is None:
+                vectors = _load(cursor, user_id, item_type)
+                _cache.set(key, vectors)
+    return vectors
+
+
+async def aget_user_vectors(conn, user_id: int, item_type: str) -> UserVectors:
+    """get_user_vectors() on an async connection. Concurrent misses for the same
+    user may both load (no lock is held across the await); the first one cached wins."""
+    key = (user_id, item_type)
+    vectors = _cache.get(key)
+    if vectors is None:
+        rows = await fetchall(conn, *_load_query(user_id, item_type))
+        vectors = await asyncio.to_thread(_build, rows)
+        with _load_lock:
+            cached = _cache.get(key)
+            if cached is not None:
+                return cached
+            _cache.set(key, vectors)
+    return vectors
+
+
+def _upsert(user_id: int, item_type: str, item_id: int, vector: np.ndarray):
+    vectors = _cache.get((user_id, item_type))
+    if vectors is not None:
+        vectors.upsert(item_id, vector)
+
+
+def _remove(user_id: int, item_type: str, item_id: int):
+    vectors = _cache.get((user_id, item_type))
+    if vectors is not None:
+        vectors.remove(item_id)
+
+
+def upsert(cursor, user_id: int, item_type: str, item_id: int, vector: np.ndarray):
+    """Patch a cached matrix once the write on ``cursor`` commits; uncached users are loaded lazily on next query."""
+    after_commit(cursor, _upsert, user_id, item_type, item_id, vector)
+
+
+def remove(cursor, user_id: int, item_type: str, item_id: int):
+    after_commit(cursor, _remove, user_id, item_type, item_id)
+
+
+def search(cursor, user_id: int, item_type: str, query_vector: np.ndarray, k: int):
+    return get_user_vectors(cursor, user_id, item_type).top_k(query_vector, k)
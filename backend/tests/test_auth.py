@@ -0,0 +1,17 @@
+from database import get_db
+from utils import auth_deps
+
+
+def test_user_cache_holds_no_password_hash(client, user):
+    assert client.get("/api/auth/me", headers=user["headers"]).status_code == 200
+    assert set(auth_deps.user_cache.get(user["id"])) == {"id", "name", "email"}
+
+
+def test_deleted_user_is_rejected_once_invalidated(client, user):
+    assert client.get("/api/auth/me", headers=user["headers"]).status_code == 200
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM users WHERE id = %s", (user["id"],))
+        cursor.close()
+    auth_deps.invalidate_user(user["id"])
+    assert client.get("/api/auth/me", headers=user["headers"]).status_code == 404
@@ -0,0 +1,50 @@
+import os
+import uuid
+
+from services.blobs import UPLOAD_DIR
+
+
+def _upload(client, user, name, data):
+    r = client.post("/api/documents/upload", files={"file": (name, data, "text/plain")}, headers=user["headers"])
+    assert r.status_code == 200, r.text
+    return client.get(f"/api/documents/{r.json()['id']}", headers=user["headers"]).json()
+
+
+def _refcount(cursor, sha256):
+    cursor.execute("SELECT refcount FROM blobs WHERE sha256 = %s", (sha256,))
+    row = cursor.fetchone()
+    return row["refcount"] if row else None
+
+
+def test_identical_uploads_share_one_refcounted_blob(client, user, new_user, cursor):
+    data = f"the same bytes {uuid.uuid4()}".encode()
+    first = _upload(client, user, "a.txt", data)
+    second = _upload(client, user, "b.txt", data)
+    sha256, path = first["content_sha256"], os.path.join(UPLOAD_DIR, first["filename"])
+    assert second["content_sha256"] == sha256 and second["filename"] == first["filename"]
+    assert not first["deduplicated"] and second["deduplicated"]
+    assert _refcount(cursor, sha256) == 2
+    assert os.path.exists(path)
+
+    # Deduplication is only reported within an account
+    other = new_user()
+    third = _upload(client, other, "c.txt", data)
+    assert not third["deduplicated"]
+    assert _refcount(cursor, sha256) == 3
+
+    for doc, owner, left in ((first, user, 2), (third, other, 1)):
+        assert client.delete(f"/api/documents/{doc['id']}", headers=owner["headers"]).status_code == 200
+        assert _refcount(cursor, sha256) == left
+        assert os.path.exists(path)
+
+    assert client.delete(f"/api/documents/{second['id']}", headers=user["headers"]).status_code == 200
+    assert _refcount(cursor, sha256) is None
+    assert not os.path.exists(path)
+
+
+def test_deleting_someone_elses_document_keeps_the_reference(client, user, new_user, cursor):
+    doc = _upload(client, user, "mine.txt", f"private bytes {uuid.uuid4()}".encode())
+    other = new_user()
+    assert client.delete(f"/api/documents/{doc['id']}", headers=other["headers"]).status_code == 404
+    assert _refcount(cursor, doc["content_sha256"]) == 1
+    assert os.path.exists(os.path.join(UPLOAD_DIR, doc["filename"]))
@@ -0,0 +1,19 @@
+def test_batch_merges_updates_of_the_same_note(client, user):
+    h = user["headers"]
+    note_id = client.post("/api/notes/", json={"title": "a", "content": "original", "tags": ["x"]}, headers=h).json()["id"]
+    r = client.post("/api/notes/batch", json={"update": [{"id": note_id, "title": "b"}, {"id": note_id, "content": "zzz"},
+                                                         {"id": note_id, "title": "c"}]}, headers=h)
+    assert r.status_code == 200, r.text
+    assert r.json()["updated"] == [note_id] and r.json()["not_found"] == []
+
+    note = client.get(f"/api/notes/{note_id}", headers=h).json()
+    assert (note["title"], note["content"], note["tags"]) == ("c", "zzz", ["x"])
+    hits = client.get("/api/search/?q=zzz&include_docs=false", headers=h).json()["notes"]
+    assert [n["id"] for n in hits] == [note_id]
+
+
+def test_batch_reports_unknown_ids_once(client, user):
+    r = client.post("/api/notes/batch", json={"update": [{"id": 0, "title": "b"}, {"id": 0, "title": "c"}], "delete": [0]},
+                    headers=user["headers"])
+    assert r.status_code == 200, r.text
+    assert r.json()["not_found"] == [0]
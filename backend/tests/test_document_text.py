@@ -0,0 +1,61 @@
+import pytest
+
+from database import get_db
+from services import document_text
+from services.document_pipeline import apply_results
+
+# Multi-byte characters, so offsets in characters and bytes differ
+TEXT = "".join(f"{i:05d} naïve café ✓\n" for i in range(3000))
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(document_text, "TEXT_CHUNK_CHARS", 1000)
+
+
+@pytest.fixture
+def document(client, user, small_chunks):
+    r = client.post("/api/documents/upload", files={"file": ("book.txt", b"placeholder", "text/plain")},
+                    headers=user["headers"])
+    doc_id = r.json()["id"]
+    with get_db() as conn:
+        cursor = conn.cursor()
+        apply_results(cursor, doc_id, TEXT, "A long book")
+        cursor.close()
+    return doc_id
+
+
+def test_text_is_stored_compressed_in_chunks(cursor, document):
+    cursor.execute("SELECT seq, start_char, char_count, length(data) AS size FROM document_text WHERE document_id = %s "
+                   "ORDER BY seq", (document,))
+    chunks = cursor.fetchall()
+    assert len(chunks) == -(-len(TEXT) // 1000)
+    assert [c["start_char"] for c in chunks] == [i * 1000 for i in range(len(chunks))]
+    assert sum(c["char_count"] for c in chunks) == len(TEXT)
+    assert sum(c["size"] for c in chunks) < len(TEXT.encode()) / 2
+    cursor.execute("SELECT text_length FROM documents WHERE id = %s", (document,))
+    assert cursor.fetchone()["text_length"] == len(TEXT)
+
+
+@pytest.mark.parametrize("offset,limit", [(0, 10), (995, 10), (999, 1), (1000, 1000), (2500, 4321),
+                                          (len(TEXT) - 5, 100), (len(TEXT), 10), (0, None)])
+def test_read_returns_exact_character_ranges(cursor, document, offset, limit):
+    expected = TEXT[offset:] if limit is None else TEXT[offset:offset + limit]
+    assert document_text.read(cursor, document, offset, limit) == expected
+
+
+def test_text_route_pages_through_everything(client, user, document):
+    h = user["headers"]
+    assert "extracted_text" not in client.get(f"/api/documents/{document}", headers=h).json()
+    parts, offset = [], 0
+    while offset is not None:
+        page = client.get(f"/api/documents/{document}/text?offset={offset}&limit=7777", headers=h).json()
+        assert page["offset"] == offset and page["total_length"] == len(TEXT)
+        parts.append(page["text"])
+        offset = page["next_offset"]
+    assert "".join(parts) == TEXT
+    assert len(parts) == -(-len(TEXT) // 7777)
+
+
+def test_text_route_is_per_user(client, new_user, document):
+    assert client.get(f"/api/documents/{document}/text", headers=new_user()["headers"]).status_code == 404
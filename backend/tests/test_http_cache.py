@@ -0,0 +1,48 @@
+def test_list_answers_304_until_a_write(client, user):
+    h = user["headers"]
+    client.post("/api/notes/", json={"title": "First", "content": "body", "tags": []}, headers=h)
+    r = client.get("/api/notes/", headers=h)
+    etag = r.headers["ETag"]
+    assert r.headers["Cache-Control"] == "private, no-cache"
+
+    r = client.get("/api/notes/", headers={**h, "If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["ETag"] == etag
+    assert r.content == b""
+    assert client.get("/api/notes/", headers={**h, "If-None-Match": f'W/{etag}, "other"'}).status_code == 304
+
+    client.post("/api/notes/", json={"title": "Second", "content": "body", "tags": []}, headers=h)
+    r = client.get("/api/notes/", headers={**h, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert len(r.json()) == 2
+
+
+def test_etag_depends_on_the_query(client, user):
+    h = user["headers"]
+    client.post("/api/notes/", json={"title": "Note", "content": "body", "tags": ["a"]}, headers=h)
+    all_notes = client.get("/api/notes/", headers=h).headers["ETag"]
+    tagged = client.get("/api/notes/?tag=a", headers=h).headers["ETag"]
+    assert all_notes != tagged
+    assert client.get("/api/notes/?tag=a", headers={**h, "If-None-Match": all_notes}).status_code == 200
+
+
+def test_note_and_document_writes_both_invalidate(client, user):
+    h = user["headers"]
+    note = client.post("/api/notes/", json={"title": "Note", "content": "body", "tags": []}, headers=h).json()
+    etag = client.get(f"/api/notes/{note['id']}", headers=h).headers["ETag"]
+    client.post("/api/documents/upload", files={"file": ("a.txt", b"some text", "text/plain")}, headers=h)
+    r = client.get(f"/api/notes/{note['id']}", headers={**h, "If-None-Match": etag})
+    assert r.status_code == 200
+
+    etag = r.headers["ETag"]
+    client.put(f"/api/notes/{note['id']}", json={"content": "changed"}, headers=h)
+    r = client.get(f"/api/notes/{note['id']}", headers={**h, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()["content"] == "changed"
+
+
+def test_etags_are_per_user(client, user, new_user):
+    other = new_user()
+    etag = client.get("/api/notes/", headers=user["headers"]).headers["ETag"]
+    assert client.get("/api/notes/", headers={**other["headers"], "If-None-Match": etag}).status_code == 200
@@ -0,0 +1,111 @@
+import pytest
+
+from services import jobs
+
+
+@pytest.fixture
+def job_doc(client, user, cursor):
+    """A freshly uploaded document whose job is the only runnable one (in the test's transaction)."""
+    r = client.post("/api/documents/upload", files={"file": ("job.txt", b"job retry test", "text/plain")},
+                    headers=user["headers"])
+    doc_id = r.json()["id"]
+    cursor.execute("""
+        UPDATE document_jobs SET run_after = CURRENT_TIMESTAMP + INTERVAL '1 day'
+        WHERE status = 'queued' AND document_id != %s
+    """, (doc_id,))
+    return doc_id
+
+
+def _job(cursor, doc_id):
+    cursor.execute("SELECT *, run_after - CURRENT_TIMESTAMP AS delay FROM document_jobs WHERE document_id = %s", (doc_id,))
+    return cursor.fetchone()
+
+
+def _document_status(cursor, doc_id):
+    cursor.execute("SELECT status FROM documents WHERE id = %s", (doc_id,))
+    return cursor.fetchone()["status"]
+
+
+def test_failures_back_off_exponentially_then_give_up(cursor, job_doc):
+    cursor.execute("UPDATE document_jobs SET max_attempts = 3 WHERE document_id = %s", (job_doc,))
+    for attempt in (1, 2):
+        job = jobs.claim(cursor, "worker-a")
+        assert job["document_id"] == job_doc and job["attempts"] == attempt
+        assert _document_status(cursor, job_doc) == "processing"
+        assert jobs.fail(cursor, job, "boom")
+
+        job = _job(cursor, job_doc)
+        assert job["status"] == "queued" and job["locked_by"] is None
+        assert job["delay"].total_seconds() == jobs.JOB_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+        assert _document_status(cursor, job_doc) == "pending"
+        assert jobs.claim(cursor, "worker-a") is None   # not due yet
+        cursor.execute("UPDATE document_jobs SET run_after = CURRENT_TIMESTAMP WHERE document_id = %s", (job_doc,))
+
+    job = jobs.claim(cursor, "worker-a")
+    assert job["attempts"] == 3
+    assert jobs.fail(cursor, job, "boom")
+    assert _job(cursor, job_doc)["status"] == "failed"
+    assert _document_status(cursor, job_doc) == "failed"
+
+
+def test_only_the_owner_can_finish_a_job(cursor, job_doc):
+    job = jobs.claim(cursor, "worker-a")
+    stolen = {**job, "locked_by": "worker-b"}
+    assert not jobs.complete(cursor, stolen)
+    assert not jobs.fail(cursor, stolen, "boom")
+    assert not jobs.heartbeat(cursor, stolen)
+    assert jobs.heartbeat(cursor, job)
+    assert jobs.complete(cursor, job)
+    assert _job(cursor, job_doc)["status"] == "done"
+    assert _document_status(cursor, job_doc) == "done"
+
+
+def test_stale_jobs_are_requeued_until_out_of_attempts(cursor, job_doc):
+    cursor.execute("UPDATE document_jobs SET max_attempts = 2 WHERE document_id = %s", (job_doc,))
+    stale = "UPDATE document_jobs SET locked_at = CURRENT_TIMESTAMP - INTERVAL '1 hour' WHERE document_id = %s"
+
+    jobs.claim(cursor, "worker-a")
+    cursor.execute(stale, (job_doc,))
+    assert jobs.requeue_stale(cursor, timeout=60) == (1, 0)
+    assert _job(cursor, job_doc)["status"] == "queued"
+
+    jobs.claim(cursor, "worker-a")
+    cursor.execute(stale, (job_doc,))
+    assert jobs.requeue_stale(cursor, timeout=60) == (0, 1)
+    assert _job(cursor, job_doc)["error"] == jobs.STALE_ERROR
+    assert _document_status(cursor, job_doc) == "failed"
+
+
+def test_a_rescan_waits_for_the_running_job(cursor, job_doc):
+    first = jobs.claim(cursor, "worker-a")
+    jobs.enqueue(cursor, job_doc, kind="rescan")
+    assert jobs.claim(cursor, "worker-b") is None
+    assert jobs.complete(cursor, first)
+    rescan = jobs.claim(cursor, "worker-b")
+    assert rescan["document_id"] == job_doc and rescan["kind"] == "rescan"
+
+
+def test_progress_from_a_previous_owner_is_ignored(cursor, job_doc):
+    job = jobs.claim(cursor, "worker-a")
+    assert jobs.report_progress(cursor, job, 1, 4)
+    cursor.execute("UPDATE document_jobs SET locked_by = 'worker-b' WHERE id = %s", (job["id"],))
+    assert not jobs.report_progress(cursor, job, 3, 4)
+    assert _job(cursor, job_doc)["progress_done"] == 1
+
+
+def test_only_the_newest_stale_run_of_a_document_is_requeued(cursor, job_doc):
+    older = jobs.claim(cursor, "worker-a")
+    # Two runs of one document at once (possible before claim() skipped documents with a running job)
+    jobs.enqueue(cursor, job_doc, kind="rescan")
+    cursor.execute("""
+        UPDATE document_jobs SET status = 'running', attempts = 1, locked_by = 'worker-b', locked_at = CURRENT_TIMESTAMP
+        WHERE document_id = %s AND status = 'queued' RETURNING id
+    """, (job_doc,))
+    newer = cursor.fetchone()["id"]
+    cursor.execute("UPDATE document_jobs SET locked_at = CURRENT_TIMESTAMP - INTERVAL '1 hour' WHERE document_id = %s",
+                   (job_doc,))
+
+    assert jobs.requeue_stale(cursor, timeout=60) == (1, 1)
+    cursor.execute("SELECT id, status FROM document_jobs WHERE document_id = %s", (job_doc,))
+    assert {r["id"]: r["status"] for r in cursor.fetchall()} == {older["id"]: "failed", newer: "queued"}
+    assert _document_status(cursor, job_doc) != "failed"
@@ -0,0 +1,68 @@
+import base64
+import json
+
+
+def _cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def _pages(client, path, headers, limit):
+    ids, url = [], f"{path}?limit={limit}"
+    while True:
+        r = client.get(url, headers=headers)
+        assert r.status_code == 200, r.text
+        assert len(r.json()) <= limit
+        ids.extend(item["id"] for item in r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+        url = f"{path}?limit={limit}&cursor={cursor}"
+
+
+def test_note_pages_follow_the_unpaged_order(client, user):
+    h = user["headers"]
+    ids = [client.post("/api/notes/", json={"title": f"Note {i}", "content": "body", "tags": []}, headers=h).json()["id"]
+           for i in range(7)]
+    client.put(f"/api/notes/{ids[2]}", json={"is_pinned": True}, headers=h)
+
+    everything = [n["id"] for n in client.get("/api/notes/", headers=h).json()]
+    assert everything[0] == ids[2]
+    assert sorted(everything) == sorted(ids)
+    for limit in (1, 3, 7):
+        assert _pages(client, "/api/notes/", h, limit) == everything
+
+
+def test_note_pages_are_stable_under_inserts(client, user):
+    h = user["headers"]
+    for i in range(4):
+        client.post("/api/notes/", json={"title": f"Old {i}", "content": "body", "tags": []}, headers=h)
+    first = client.get("/api/notes/?limit=2", headers=h)
+    client.post("/api/notes/", json={"title": "New", "content": "body", "tags": []}, headers=h)
+    rest = client.get(f"/api/notes/?limit=10&cursor={first.headers['X-Next-Cursor']}", headers=h).json()
+    seen = [n["title"] for n in first.json() + rest]
+    assert "New" not in seen
+    assert sorted(seen) == [f"Old {i}" for i in range(4)]
+
+
+def test_document_pages(client, user):
+    h = user["headers"]
+    for i in range(5):
+        r = client.post("/api/documents/upload", files={"file": (f"doc{i}.txt", f"document {i}".encode(), "text/plain")},
+                        headers=h)
+        assert r.status_code == 200, r.text
+    everything = [d["id"] for d in client.get("/api/documents/", headers=h).json()]
+    assert len(everything) == 5
+    assert _pages(client, "/api/documents/", h, 2) == everything
+
+
+def test_malformed_cursors_are_rejected(client, user):
+    h = user["headers"]
+    client.post("/api/notes/", json={"title": "One", "content": "body", "tags": []}, headers=h)
+    for cursor in ("not-base64!", _cursor({"a": 1}), _cursor([0, "2024-01-01T00:00:00"]),
+                   _cursor([True, "2024-01-01T00:00:00", 1]), _cursor([0, "yesterday", 1]),
+                   _cursor([0, "2024-01-01T00:00:00", "1"]), _cursor([0, "2024-01-01T00:00:00", 2 ** 64])):
+        r = client.get(f"/api/notes/?limit=5&cursor={cursor}", headers=h)
+        assert r.status_code == 400, cursor
+    r = client.get(f"/api/documents/?limit=5&cursor={_cursor(['2024-01-01T00:00:00', 1.5])}", headers=h)
+    assert r.status_code == 400
+    assert client.get(f"/api/notes/?limit=5&cursor={_cursor([0, '2999-01-01T00:00:00', 1])}", headers=h).status_code == 200
@@ -0,0 +1,19 @@
+def test_route_queries_are_index_backed(client):
+    """manage.py check-plans: no route statement needs a Seq Scan, or a Sort to serve a LIMIT."""
+    from manage import _route_plan_problems, _route_statements
+    routes = _route_statements(client)
+    assert len(routes) > 20
+    problems = [(label, problem, " ".join(sql.split())[:200])
+                for (label, _), scans in zip(routes, _route_plan_problems(routes)) for problem, sql in scans]
+    assert problems == []
+
+
+def test_plan_problems_flags_seq_scans_and_unindexed_sorts():
+    from manage import _plan_problems
+    seq = {"Node Type": "Seq Scan", "Relation Name": "notes"}
+    index = {"Node Type": "Index Scan", "Relation Name": "notes"}
+    assert _plan_problems(seq) == ["Seq Scan on notes"]
+    assert _plan_problems({"Node Type": "Seq Scan", "Relation Name": "runtime_settings"}) == []
+    assert _plan_problems({"Node Type": "Limit", "Plans": [index]}) == []
+    assert _plan_problems({"Node Type": "Limit", "Plans": [{"Node Type": "Sort", "Plans": [index]}]}) == \
+        ["Sort of notes for a LIMIT"]
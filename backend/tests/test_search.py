@@ -0,0 +1,53 @@
+def _note(client, user, title, content, tags=()):
+    r = client.post("/api/notes/", json={"title": title, "content": content, "tags": list(tags)}, headers=user["headers"])
+    return r.json()["id"]
+
+
+def _search(client, user, q, **params):
+    query = "&".join(f"{k}={v}" for k, v in {"q": q, "include_docs": "false", **params}.items())
+    r = client.get(f"/api/search/?{query}", headers=user["headers"])
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_bm25_prefers_frequent_terms_and_title_hits(client, user):
+    once = _note(client, user, "Groceries", "buy a pineapple and " + "other things " * 40)
+    often = _note(client, user, "Fruit", "pineapple pineapple pineapple salad")
+    title = _note(client, user, "Pineapple", "a recipe")
+    _note(client, user, "Unrelated", "nothing to see here")
+
+    result = _search(client, user, "pineapple")
+    assert [n["id"] for n in result["notes"]] == [title, often, once]
+    assert result["total_notes"] == 3
+    scores = [n["score"] for n in result["notes"]]
+    assert scores == sorted(scores, reverse=True) and scores[-1] > 0
+
+
+def test_rare_terms_weigh_more(client, user):
+    common = [_note(client, user, f"Meeting {i}", "weekly sync notes") for i in range(5)]
+    rare = _note(client, user, "Meeting 5", "visit from the auditor")
+    result = _search(client, user, "weekly auditor")
+    assert result["notes"][0]["id"] == rare
+    assert {n["id"] for n in result["notes"]} == set(common) | {rare}
+
+
+def test_paging_and_totals(client, user):
+    ids = [_note(client, user, f"Lemon {i}", "lemon " * (i + 1)) for i in range(6)]
+    first = _search(client, user, "lemon", limit=4)
+    second = _search(client, user, "lemon", limit=4, offset=4)
+    assert first["total_notes"] == second["total_notes"] == 6
+    assert len(first["notes"]) == 4 and len(second["notes"]) == 2
+    assert sorted(n["id"] for n in first["notes"] + second["notes"]) == sorted(ids)
+
+
+def test_semantic_total_counts_every_match(client, user):
+    for i in range(5):
+        _note(client, user, f"Banana bread {i}", "banana bread recipe")
+    result = _search(client, user, "banana bread", mode="semantic", limit=2)
+    assert len(result["notes"]) == 2
+    assert result["total_notes"] == 5
+
+
+def test_search_is_per_user(client, user, new_user):
+    _note(client, user, "Mango", "mango")
+    assert _search(client, new_user(), "mango")["total_notes"] == 0
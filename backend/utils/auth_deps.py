@@ -1,12 +1,44 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import hmac
 from jose import JWTError
 from utils.security import decode_token
-from database import get_db
+from utils.cache import TTLCache
+from database import get_adb, fetchone
+import os
 
 security = HTTPBearer()
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+# ── Authenticated user cache ──────────────────────
+# User rows almost never change, so the hot path resolves `sub` from memory.
+# Anything that updates or deletes a user must call invalidate_user(); other
+# processes see the change once their entry expires (USER_CACHE_TTL).
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+def invalidate_user(user_id: int):
+    user_cache.delete(int(user_id))
+
+def clear_user_cache():
+    user_cache.clear()
+
+# Only what request handlers use; the password hash never enters the cache
+USER_SQL = "SELECT id, name, email FROM users WHERE id = %s"
+
+async def aload_user(user_id: int):
+    """The user row for ``sub``, from the cache or the async pool."""
+    user = user_cache.get(user_id)
+    if user is None:
+        async with get_adb() as conn:
+            user = await fetchone(conn, USER_SQL, (user_id,))
+        if not user:
+            return None
+        user_cache.set(user_id, user)
+    return dict(user)
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     try:
         payload = decode_token(token)
@@ -17,13 +49,22 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             detail="Invalid or expired token"
         )
     
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
-        cursor.close()
+    user = await aload_user(user_id)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return dict(user)
\ No newline at end of file
+    return user
+
+# ── Operator endpoints ────────────────────────────
+# Diagnostics (routers/admin.py) and on-demand profiling are authorised by a
+# shared ADMIN_TOKEN rather than a user account; without one they are off.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+admin_security = HTTPBearer(auto_error=False)
+
+def require_admin(credentials: HTTPAuthorizationCredentials = Depends(admin_security)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(credentials.credentials.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token")
@@ -0,0 +1,132 @@
+import base64
+import gzip
+import hashlib
+import hmac
+import mimetypes
+import os
+import shutil
+import time
+import uuid
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from utils.security import SECRET_KEY
+
+# ── Document file delivery ───────────────────────────────────────────────────
+#
+# Files are only reachable through the authenticated download route or a
+# short-lived signed URL (GET .../download-url hands one out; the link works
+# without an Authorization header, so <a href>, <embed> and PDF viewers can use
+# it directly). Either way the file is sent in one of two modes:
+#
+#   DOWNLOAD_ACCEL_PREFIX unset   the app streams it with FileResponse, which
+#                                 answers Range / If-Range requests (resumable
+#                                 downloads, page-wise PDF loading)
+#   DOWNLOAD_ACCEL_PREFIX set     the app only checks access and answers with
+#                                 X-Accel-Redirect: <prefix><blob path>; nginx
+#                                 then serves the bytes itself with sendfile and
+#                                 Range support, off the Python workers:
+#
+#       location /protected-uploads/ {
+#           internal;
+#           alias /srv/vault/backend/uploads/;
+#           gzip_static on;
+#       }
+#
+# Types in PRECOMPRESS_EXTENSIONS get a gzip sibling (<file>.gz) the first
+# time they are downloaded. Blobs are content-addressed and never rewritten,
+# so the sibling never goes stale. It is sent to clients that accept gzip
+# and didn't ask for a range (ranges always refer to the plain file).
+
+DOWNLOAD_ACCEL_PREFIX = os.getenv("DOWNLOAD_ACCEL_PREFIX", "")
+DOWNLOAD_URL_TTL = int(os.getenv("DOWNLOAD_URL_TTL", "300"))   # seconds a signed URL stays valid
+PRECOMPRESS_EXTENSIONS = {e.strip().lower() for e in os.getenv("PRECOMPRESS_EXTENSIONS", ".txt").split(",") if e.strip()}
+PRECOMPRESS_MIN_BYTES = int(os.getenv("PRECOMPRESS_MIN_BYTES", "1024"))
+PRECOMPRESSED_SUFFIX = ".gz"
+# Document bytes never change under an id, so clients may reuse them for a while
+CACHE_CONTROL = "private, max-age=3600"
+
+_SIGNING_KEY = hashlib.sha256(b"download-url:" + SECRET_KEY.encode()).digest()
+
+
+def _signature(doc_id: int, expires: int, inline: bool) -> str:
+    message = f"{doc_id}:{expires}:{int(inline)}".encode()
+    return base64.urlsafe_b64encode(hmac.new(_SIGNING_KEY, message, hashlib.sha256).digest()).decode().rstrip("=")
+
+
+def sign(doc_id: int, inline: bool = False, ttl: int = DOWNLOAD_URL_TTL) -> dict:
+    """Query parameters of a signed URL for one document, valid for ``ttl`` seconds."""
+    expires = int(time.time()) + ttl
+    params = {"expires": expires, "sig": _signature(doc_id, expires, inline)}
+    if inline:
+        params["inline"] = 1
+    return params
+
+
+def verify(doc_id: int, expires: int, sig: str, inline: bool) -> bool:
+    return expires >= time.time() and hmac.compare_digest(sig, _signature(doc_id, expires, inline))
+
+
+def content_disposition(name: str, inline: bool) -> str:
+    kind = "inline" if inline else "attachment"
+    fallback = name.encode("ascii", "replace").decode().replace('"', "'").replace("\\", "_")
+    return f"{kind}; filename=\"{fallback}\"; filename*=utf-8''{quote(name)}"
+
+
+def precompressed(path: str):
+    """Path of the gzip sibling of ``path``, written on first use; None for small files."""
+    gz_path = path + PRECOMPRESSED_SUFFIX
+    if os.path.exists(gz_path):
+        return gz_path
+    if os.path.getsize(path) < PRECOMPRESS_MIN_BYTES:
+        return None
+    tmp_path = f"{gz_path}.{uuid.uuid4().hex}.part"
+    try:
+        with open(path, "rb") as src, gzip.GzipFile(tmp_path, "wb", compresslevel=9, mtime=0) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(tmp_path, gz_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return gz_path
+
+
+def _accepts_gzip(request: Request) -> bool:
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, param = coding.partition(";")
+        if name.strip().lower() == "gzip":
+            param = param.replace(" ", "")
+            try:
+                return not param.startswith("q=") or float(param[2:]) > 0
+            except ValueError:
+                return False
+    return False
+
+
+def file_response(request: Request, upload_dir: str, filename: str, original_name: str, inline: bool = False) -> Response:
+    """Send ``upload_dir/filename`` to the client as ``original_name`` (see the modes above)."""
+    path = os.path.join(upload_dir, filename)
+    media_type = mimetypes.guess_type(original_name)[0] or "application/octet-stream"
+    headers = {
+        "Content-Disposition": content_disposition(original_name, inline),
+        "Cache-Control": CACHE_CONTROL,
+        "X-Content-Type-Options": "nosniff",
+    }
+    gzip_eligible = os.path.splitext(filename)[1].lower() in PRECOMPRESS_EXTENSIONS
+    if gzip_eligible:
+        headers["Vary"] = "Accept-Encoding"
+
+    if DOWNLOAD_ACCEL_PREFIX:
+        if gzip_eligible:
+            precompressed(path)   # for nginx's gzip_static
+        headers["X-Accel-Redirect"] = DOWNLOAD_ACCEL_PREFIX + quote(filename)
+        return Response(headers=headers, media_type=media_type)
+
+    if gzip_eligible and "range" not in request.headers and _accepts_gzip(request):
+        gz_path = precompressed(path)
+        if gz_path:
+            headers["Content-Encoding"] = "gzip"
+            return FileResponse(gz_path, headers=headers, media_type=media_type)
+    return FileResponse(path, headers=headers, media_type=media_type)
@@ -0,0 +1,65 @@
+import hashlib
+
+from fastapi import Request, Response
+
+from database import fetchone
+
+# ── Conditional GET ──────────────────────────────────────────────────────────
+#
+# Note and document reads carry a strong ETag built from the user's change
+# version: user_versions.version is bumped by statement triggers on notes and
+# documents (migrations/0004_user_versions.py), so any write to either table
+# changes every ETag of that user. Routes read the version before their data
+# queries, so a write landing in between only makes the ETag older than the
+# body (the next request refetches) and never the other way round. When
+# If-None-Match matches, the route answers 304 after that single lookup.
+#
+# Responses are per user and must be revalidated on every use, so they are
+# sent as "private, no-cache" and vary on Authorization.
+
+CACHE_CONTROL = "private, no-cache"
+VERSION_SQL = "SELECT version FROM user_versions WHERE user_id = %s"
+
+
+async def user_version(conn, user_id: int) -> int:
+    row = await fetchone(conn, VERSION_SQL, (user_id,))
+    return row["version"] if row else 0
+
+
+def touch(cursor, user_id: int):
+    """Bump a user's version for writes that change responses without touching notes or documents."""
+    cursor.execute("""
+        INSERT INTO user_versions (user_id, version) VALUES (%s, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = user_versions.version + 1
+    """, (user_id,))
+
+
+def etag(kind: str, user_id: int, version: int, *parts) -> str:
+    """Strong ETag for one response; parts are whatever else selects the body (query string, ids, dates)."""
+    tag = f"{kind}-{user_id}-{version}"
+    if parts:
+        tag += "-" + hashlib.sha1(repr(parts).encode()).hexdigest()[:12]
+    return f'"{tag}"'
+
+
+def not_modified(request: Request, tag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == tag:
+            return True
+    return False
+
+
+def set_headers(response: Response, tag: str):
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    response.headers["Vary"] = "Authorization"
+
+
+def not_modified_response(tag: str) -> Response:
+    response = Response(status_code=304)
+    set_headers(response, tag)
+    return response
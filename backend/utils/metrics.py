@@ -0,0 +1,250 @@
+import bisect
+import os
+import threading
+import time
+
+# ── Prometheus metrics ───────────────────────────────────────────────────────
+#
+# A small in-process registry rendered in the Prometheus text format (0.0.4)
+# on /metrics. Counters and histograms are plain dicts keyed by label-value
+# tuples behind one lock each, so recording a sample costs a dict lookup and
+# a bisect; values that already live elsewhere (pool sizes, queue depth) are
+# read by callbacks only when /metrics is scraped.
+#
+# Every process keeps its own registry: run one uvicorn worker per scrape
+# target, and the document worker serves its own on WORKER_METRICS_PORT.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")   # if set, /metrics requires "Authorization: Bearer <token>"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, value in items:
+            lines.extend(self._samples(values, value))
+        return lines
+
+    def _samples(self, values: tuple, value) -> list:
+        return [f"{self.name}{_labels(self.label_names, values)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, labels: tuple = ()):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: tuple = ()):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    def _samples(self, values: tuple, state) -> list:
+        counts, total = state
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = 'le="%s"' % _number(bound)
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, values)} {cumulative}")
+        return lines
+
+    def time(self, labels: tuple = ()):
+        return _Timer(self, labels)
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, self.labels)
+
+
+class Callback(_Metric):
+    """Values read at scrape time from ``fn() -> {label values: value}``."""
+
+    def __init__(self, name: str, help: str, fn, labels: tuple = (), type: str = "gauge"):
+        super().__init__(name, help, labels)
+        self.type = type
+        self.fn = fn
+
+    def render(self) -> list:
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in sorted(values.items()):
+            lines.extend(self._samples(labels, value))
+        return lines
+
+
+def counter(name: str, help: str, labels: tuple = ()) -> Counter:
+    return Counter(name, help, labels)
+
+
+def gauge(name: str, help: str, labels: tuple = ()) -> Gauge:
+    return Gauge(name, help, labels)
+
+
+def histogram(name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+    return Histogram(name, help, labels, buckets)
+
+
+def callback(name: str, help: str, fn, labels: tuple = (), type: str = "gauge") -> Callback:
+    return Callback(name, help, fn, labels, type)
+
+
+def render() -> str:
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ── HTTP request metrics ─────────────────────────────────────────────────────
+
+HTTP_SECONDS = histogram("http_request_duration_seconds", "Time to handle a request, including streaming the body",
+                         ("router", "method", "route"))
+HTTP_REQUESTS = counter("http_requests_total", "Requests handled", ("router", "method", "route", "status"))
+HTTP_IN_PROGRESS = gauge("http_requests_in_progress", "Requests currently being handled")
+
+
+def _route_labels(scope) -> tuple:
+    # Route templates are relative to their router's prefix ("/{note_id}" under
+    # router="notes"); unmatched paths share one label so scanners can't blow up cardinality
+    route = scope.get("route")
+    if route is None:
+        return "none", "unmatched"
+    module = getattr(getattr(route, "endpoint", None), "__module__", "") or ""
+    router = module.split(".", 1)[1] if module.startswith("routers.") else "app"
+    return router, getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware:
+    """Latency histogram and request counts per router and route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = [500]
+
+        async def observed_send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, observed_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_PROGRESS.dec()
+            router, route = _route_labels(scope)
+            HTTP_SECONDS.observe(elapsed, (router, scope["method"], route))
+            HTTP_REQUESTS.inc((router, scope["method"], route, str(status[0])))
+
+
+def serve(port: int):
+    """Serve /metrics from a background thread (processes without a web app, e.g. the worker)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            if METRICS_TOKEN and self.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+                self.send_error(401)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
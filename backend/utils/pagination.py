@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+
+# ── Keyset pagination helpers ────────────────────────────────────────────────
+#
+# A cursor is the sort key of the last row of a page, base64url-encoded, so
+# the next page is `WHERE (sort columns) < (cursor values)` on an index
+# rather than an OFFSET that rescans everything before it. Pages stay stable
+# while rows are inserted or deleted. List endpoints return the cursor for
+# the next page in the X-Next-Cursor header, keeping the JSON array body
+# unchanged for existing clients.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _cursor_value(value, kind):
+    if kind is datetime:
+        return datetime.fromisoformat(value) if isinstance(value, str) else None
+    if kind is int and (isinstance(value, bool) or not isinstance(value, int) or not -2 ** 63 <= value < 2 ** 63):
+        return None
+    return value if isinstance(value, kind) else None
+
+
+def decode_cursor(cursor: str, types: tuple) -> list:
+    """Sort key values of a cursor, checked against the sort columns' ``types`` (int or datetime)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        values = [_cursor_value(v, kind) for v, kind in zip(values, types)]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if None in values:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def parse_fields(fields: str, allowed: tuple) -> list:
+    """Columns requested with ``fields=a,b``; all of ``allowed`` when not given."""
+    if not fields:
+        return list(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}. Use: {', '.join(allowed)}")
+    return list(dict.fromkeys(requested))
@@ -0,0 +1,239 @@
+import asyncio
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+
+from utils import runtime_config, slow_queries
+from utils.auth_deps import ADMIN_TOKEN
+
+# ── Per-request sampling profiler ────────────────────────────────────────────
+#
+# A profiled request is sampled every profile_interval_ms by a background
+# thread reading sys._current_frames(), and its stacks are written to
+# PROFILE_DIR in the folded format flamegraph.pl, speedscope and inferno read
+# ("frame;frame;frame count" per line). A request is profiled when it sends
+# "X-Profile: <ADMIN_TOKEN>" (the response then names the dump in
+# X-Profile-Id), or at random with probability profile_sample_rate; both
+# the rate and the interval are runtime settings (utils/runtime_config.py).
+#
+# Stacks have one of three roots:
+#   event-loop          the request's own task running on the event loop
+#   event-loop-await    the request's task suspended; the await chain shows
+#                       what it is waiting on (a query, the LLM, a thread)
+#   worker-thread       threadpool threads running app code; under load this
+#                       can include other requests' threads
+#
+# Nothing is sampled while no profiled request is in flight.
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "500"))   # newest dumps kept on disk
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_NAME = re.compile(r"^[\w.-]+\.folded$")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SELF = os.path.abspath(__file__)
+# Our own housekeeping threads sleep inside app code; never sample them
+_BACKGROUND_THREADS = {"runtime-settings", "slow-query-log", "metrics-http"}
+_background = set()
+_labels = {}
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        if path.startswith(BACKEND_DIR):
+            path = os.path.relpath(path, BACKEND_DIR)
+        elif "site-packages" + os.sep in path:
+            path = path.split("site-packages" + os.sep, 1)[1]
+        else:
+            path = os.path.basename(path)
+        label = _labels[code] = f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":")
+    return label
+
+
+def _frame_stack(frame) -> list:
+    stack = []
+    while frame is not None:
+        stack.append(frame.f_code)
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_stack(coro) -> list:
+    stack = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(frame.f_code)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+def _is_app_code(code) -> bool:
+    return code.co_filename.startswith(BACKEND_DIR) and code.co_filename != _SELF
+
+
+class Profile:
+    def __init__(self, loop, task):
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.task = task
+        self.stacks = Counter()
+        self.samples = 0
+
+    def sample(self, frames: dict):
+        self.samples += 1
+        for ident, frame in frames.items():
+            if ident in _background:
+                continue
+            if ident == self.loop_thread:
+                if asyncio.current_task(self.loop) is self.task:
+                    self._add("event-loop", _frame_stack(frame))
+                elif not self.task.done():
+                    self._add("event-loop-await", _await_stack(self.task.get_coro()))
+            else:
+                stack = _frame_stack(frame)
+                if any(_is_app_code(code) for code in stack):
+                    self._add("worker-thread", stack)
+
+    def _add(self, root: str, stack: list):
+        if stack:
+            self.stacks[";".join([root] + [_label(code) for code in stack])] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class _Sampler:
+    """One thread samples every profile in flight; it exits when there are none."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = set()
+        self._thread = None
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: Profile):
+        with self._lock:
+            self._active.discard(profile)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active)
+            frames = sys._current_frames()
+            frames.pop(me, None)
+            _background.update(t.ident for t in threading.enumerate() if t.name in _BACKGROUND_THREADS)
+            for profile in active:
+                try:
+                    profile.sample(frames)
+                except Exception:
+                    pass   # a frame or task changed under us; skip this tick
+            del frames
+            time.sleep(max(runtime_config.get("profile_interval_ms"), 1) / 1000)
+
+
+_sampler = _Sampler()
+
+
+def _write(name: str, profile: Profile):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, name), "w", encoding="utf-8") as f:
+        f.write(profile.folded())
+    dumps = sorted(list_profiles(), key=lambda p: p["at"])
+    for old in dumps[:max(len(dumps) - PROFILE_KEEP, 0)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, old["name"]))
+        except OSError:
+            pass
+
+
+def list_profiles() -> list:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    dumps = []
+    for name in os.listdir(PROFILE_DIR):
+        if PROFILE_NAME.match(name):
+            st = os.stat(os.path.join(PROFILE_DIR, name))
+            dumps.append({"name": name, "size": st.st_size, "at": st.st_mtime})
+    return dumps
+
+
+def profile_path(name: str):
+    """Path of a dump, or None for names that aren't one (no traversal)."""
+    path = os.path.join(PROFILE_DIR, name)
+    return path if PROFILE_NAME.match(name) and os.path.isfile(path) else None
+
+
+def _requested(scope) -> bool:
+    if not ADMIN_TOKEN:
+        return False
+    for key, value in scope["headers"]:
+        if key == PROFILE_HEADER.encode():
+            return hmac.compare_digest(value, ADMIN_TOKEN.encode())
+    return False
+
+
+class ProfilingMiddleware:
+    """Tags slow-query log entries with the request path and profiles selected requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        token = slow_queries.request_path.set(scope["path"])
+        try:
+            forced = _requested(scope)
+            rate = runtime_config.get("profile_sample_rate")
+            if not forced and not (rate > 0 and scope["path"].startswith("/api/") and random.random() < rate):
+                return await self.app(scope, receive, send)
+            await self._profiled(scope, receive, send, forced)
+        finally:
+            slow_queries.request_path.reset(token)
+
+    async def _profiled(self, scope, receive, send, forced: bool):
+        slug = re.sub(r"[^\w]+", "-", scope["path"]).strip("-")[:60] or "root"
+        name = f"{datetime.now():%Y%m%d-%H%M%S}-{scope['method']}-{slug}-{uuid.uuid4().hex[:8]}.folded"
+
+        async def tagged_send(message):
+            if forced and message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, name)
+            await send(message)
+
+        profile = Profile(asyncio.get_running_loop(), asyncio.current_task())
+        start = time.perf_counter()
+        _sampler.add(profile)
+        try:
+            await self.app(scope, receive, tagged_send)
+        finally:
+            _sampler.remove(profile)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if forced or (profile.stacks and elapsed_ms >= runtime_config.get("profile_min_ms")):
+                await run_in_threadpool(_write, name, profile)
@@ -0,0 +1,37 @@
+import os
+
+from starlette.datastructures import MutableHeaders
+
+import database
+
+# ── X-DB-Queries response header ─────────────────────────────────────────────
+#
+# Counts the statements each request runs on either connection pool and
+# reports them in X-DB-Queries, so load tests (benchmarks/load_test.py) can
+# track query counts per endpoint. Streaming responses report the statements
+# run before their first chunk. Off unless DB_QUERY_COUNT_HEADER=1.
+
+DB_QUERY_COUNT_HEADER = os.getenv("DB_QUERY_COUNT_HEADER", "0") == "1"
+HEADER = "X-DB-Queries"
+
+
+class QueryCountMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        counter = [0]
+        token = database.statement_counter.set(counter)
+
+        async def counted_send(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(HEADER, str(counter[0]))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, counted_send)
+        finally:
+            database.statement_counter.reset(token)
@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import time
+
+# ── Runtime-adjustable settings ──────────────────────────────────────────────
+#
+# Diagnostics knobs that can be changed without a restart. Defaults come from
+# the environment; overrides set through PUT /api/admin/diagnostics are
+# stored in the runtime_settings table, and every process (web workers and
+# document workers alike) reloads them every RUNTIME_SETTINGS_REFRESH seconds
+# from a background thread, so reading a setting never touches the database.
+
+RUNTIME_SETTINGS_REFRESH = float(os.getenv("RUNTIME_SETTINGS_REFRESH", "5"))
+
+# name -> (type, default)
+SETTINGS = {
+    "profile_sample_rate": (float, float(os.getenv("PROFILE_SAMPLE_RATE", "0"))),      # fraction of requests profiled
+    "profile_interval_ms": (float, float(os.getenv("PROFILE_INTERVAL_MS", "5"))),      # sampling interval
+    "profile_min_ms": (float, float(os.getenv("PROFILE_MIN_MS", "0"))),                # only keep slower requests
+    "slow_query_ms": (float, float(os.getenv("SLOW_QUERY_MS", "500"))),                # 0 disables the slow-query log
+    "slow_query_explain": (bool, os.getenv("SLOW_QUERY_EXPLAIN", "1") == "1"),
+}
+
+_values = {name: default for name, (_, default) in SETTINGS.items()}
+_lock = threading.Lock()
+_refresher_pid = None
+
+
+def get(name: str):
+    if _refresher_pid != os.getpid():
+        _start()
+    return _values[name]
+
+
+def snapshot() -> dict:
+    if _refresher_pid != os.getpid():
+        _start()
+    return dict(_values)
+
+
+def coerce(name: str, value):
+    kind = SETTINGS[name][0]
+    if kind is bool and isinstance(value, str):
+        return value.lower() in ("1", "true", "yes", "on")
+    return kind(value)
+
+
+def update(changes: dict) -> dict:
+    """Store overrides (None resets a setting to its default) and apply them in this process now."""
+    from database import get_db
+    unknown = set(changes) - set(SETTINGS)
+    if unknown:
+        raise KeyError(", ".join(sorted(unknown)))
+    changes = {name: None if value is None else coerce(name, value) for name, value in changes.items()}
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for name, value in changes.items():
+            if value is None:
+                cursor.execute("DELETE FROM runtime_settings WHERE name = %s", (name,))
+            else:
+                cursor.execute("""
+                    INSERT INTO runtime_settings (name, value) VALUES (%s, %s)
+                    ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value, updated_at = CURRENT_TIMESTAMP
+                """, (name, json.dumps(value)))
+        cursor.close()
+    refresh()
+    return snapshot()
+
+
+def refresh():
+    from database import get_db
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, value FROM runtime_settings")
+        stored = {r["name"]: r["value"] for r in cursor.fetchall()}
+        cursor.close()
+    values = {}
+    for name, (_, default) in SETTINGS.items():
+        try:
+            values[name] = coerce(name, json.loads(stored[name])) if name in stored else default
+        except (TypeError, ValueError):
+            values[name] = default
+    _values.update(values)
+
+
+def _loop():
+    while True:
+        try:
+            refresh()
+        except Exception:
+            pass   # table missing (migrations pending) or database down: keep the last values
+        time.sleep(RUNTIME_SETTINGS_REFRESH)
+
+
+def _start():
+    global _refresher_pid
+    with _lock:
+        if _refresher_pid != os.getpid():
+            _refresher_pid = os.getpid()
+            threading.Thread(target=_loop, name="runtime-settings", daemon=True).start()
@@ -0,0 +1,152 @@
+import json
+import os
+import queue
+import re
+import threading
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+
+from utils import metrics, runtime_config
+
+# ── Slow-query log ───────────────────────────────────────────────────────────
+#
+# Statements slower than the slow_query_ms runtime setting are logged with
+# their SQL text, the shape of their parameters (types and sizes, never the
+# values), duration, the request path and, if slow_query_explain is on, the
+# plan the planner picks for them. The request thread only queues the entry.
+# A background thread runs EXPLAIN (no ANALYZE, so nothing is executed twice)
+# on its own connection and writes the entry. The statement is explained
+# PREPAREd with $n placeholders under plan_cache_mode = force_generic_plan, so
+# the plan shows $1, $2, ... and no parameter value ever reaches the log. Entries are appended as JSON
+# lines to SLOW_QUERY_LOG and the last SLOW_QUERY_KEEP are kept in memory
+# for GET /api/admin/diagnostics.
+
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "slow_queries.log")   # empty: memory only
+SLOW_QUERY_KEEP = int(os.getenv("SLOW_QUERY_KEEP", "200"))
+# execute_values() inlines its rows into the SQL, so long statements are cut
+# short in the log and not EXPLAINed
+SQL_MAX_CHARS = 2000
+EXPLAIN_MAX_CHARS = 100_000
+
+request_path = ContextVar("request_path", default=None)
+
+SLOW_QUERIES = metrics.counter("db_slow_queries_total", "Statements over the slow_query_ms threshold",
+                               ("operation", "table"))
+_EXPLAINABLE = {"select", "with", "insert", "update", "delete"}
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+_STATEMENT = "slow_query_explain"
+
+recent = deque(maxlen=SLOW_QUERY_KEEP)
+_queue = queue.Queue(maxsize=1000)
+_writer_pid = None
+_writer_lock = threading.Lock()
+_local = threading.local()
+
+
+def threshold_ms() -> float:
+    """Current threshold, or 0 when disabled (and inside the log's own EXPLAIN)."""
+    if getattr(_local, "explaining", False):
+        return 0
+    return runtime_config.get("slow_query_ms")
+
+
+def params_shape(params):
+    def shape(value):
+        if value is None:
+            return "null"
+        if isinstance(value, (str, bytes, bytearray, memoryview)):
+            return f"{type(value).__name__}({len(value)})"
+        if isinstance(value, (list, tuple)):
+            return f"{type(value).__name__}[{len(value)}]"
+        return type(value).__name__
+
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: shape(v) for k, v in params.items()}
+    return [shape(v) for v in params]
+
+
+def record(pool: str, operation: str, table: str, sql: str, params, elapsed: float, failed: bool):
+    """Queue a slow statement for logging (called on the request thread)."""
+    SLOW_QUERIES.inc((operation, table))
+    entry = {
+        "at": datetime.now().isoformat(timespec="milliseconds"),
+        "duration_ms": round(elapsed * 1000, 2),
+        "pool": pool,
+        "operation": operation,
+        "table": table,
+        "path": request_path.get(),
+        "failed": failed,
+        "sql": " ".join(sql[:SQL_MAX_CHARS].split()) + ("…" if len(sql) > SQL_MAX_CHARS else ""),
+        "params": params_shape(params),
+    }
+    _start()
+    try:
+        explain = operation in _EXPLAINABLE and len(sql) <= EXPLAIN_MAX_CHARS
+        _queue.put_nowait((entry, (sql, params) if explain else None))
+    except queue.Full:
+        pass
+
+
+def _positional(sql: str, params) -> tuple:
+    """``sql`` with its %s / %(name)s placeholders as $1, $2, ...; returns (text, placeholder count)."""
+    if params is None:
+        return sql, 0
+    names = {}
+
+    def number(match):
+        if match.group(0) == "%%":
+            return "%"
+        key = match.group(1) if match.group(1) is not None else len(names)
+        return f"${names.setdefault(key, len(names) + 1)}"
+
+    text = _PLACEHOLDER.sub(number, sql)
+    return text, len(names)
+
+
+def _explain(sql: str, params) -> list:
+    from database import get_db
+    text, count = _positional(sql, params)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"PREPARE {_STATEMENT} AS {text}")
+        try:
+            cursor.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+            cursor.execute(f"EXPLAIN EXECUTE {_STATEMENT}" + (f" ({', '.join(['NULL'] * count)})" if count else ""))
+            plan = [r["QUERY PLAN"] for r in cursor.fetchall()]
+        finally:
+            # Prepared statements outlive the transaction; the connection goes back to the pool
+            conn.rollback()
+            cursor.execute(f"DEALLOCATE {_STATEMENT}")
+            cursor.close()
+    return plan
+
+
+def _write_loop():
+    _local.explaining = True
+    while True:
+        entry, statement = _queue.get()
+        if statement and runtime_config.get("slow_query_explain"):
+            try:
+                entry["plan"] = _explain(*statement)
+            except Exception as e:
+                entry["plan_error"] = f"{type(e).__name__}: {e}"
+        recent.append(entry)
+        if SLOW_QUERY_LOG:
+            try:
+                with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, default=str) + "\n")
+            except OSError:
+                pass
+
+
+def _start():
+    global _writer_pid
+    if _writer_pid == os.getpid():
+        return
+    with _writer_lock:
+        if _writer_pid != os.getpid():
+            _writer_pid = os.getpid()
+            threading.Thread(target=_write_loop, name="slow-query-log", daemon=True).start()
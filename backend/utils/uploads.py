@@ -0,0 +1,102 @@
+import hashlib
+import os
+import uuid
+
+import anyio
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+# ── Streaming uploads with bounded memory ─────────────────────────────────────
+#
+# MaxBodySizeMiddleware rejects oversized upload requests with 413 before (or
+# while) the multipart body is read; save_upload() then copies the parsed file
+# to a temp file in fixed-size chunks, hashing as it goes, and the blob store
+# renames it into place atomically. Peak memory per upload is one chunk
+# regardless of file size.
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Allowance for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class MaxBodySizeMiddleware:
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES, paths: tuple = ()):
+        self.app = app
+        self.limit_mb = max_bytes // (1024 * 1024)
+        self.max_bytes = max_bytes + MULTIPART_OVERHEAD
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        too_large = JSONResponse(status_code=413, content={"detail": f"File too large (max {self.limit_mb} MB)"})
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                return await too_large(scope, receive, send)
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                return  # the app's error response is replaced by the 413 below
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+        if exceeded and not response_started:
+            await too_large(scope, receive, send)
+
+
+async def save_upload(file: UploadFile, dest_dir: str, max_bytes: int = MAX_UPLOAD_BYTES):
+    """Stream ``file`` into a temp file in ``dest_dir``; returns (temp path, size, sha256 hex).
+
+    The caller renames the temp file into its final place (services/blobs.py),
+    so readers never see a partial upload.
+    """
+    tmp_path = os.path.join(dest_dir, f".upload-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File too large (max {max_bytes // (1024 * 1024)} MB)")
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        discard(tmp_path)
+        raise
+    return tmp_path, size, digest.hexdigest()
+
+
+def discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,167 @@
+"""Document processing worker.
+
+Pulls jobs from the Postgres-backed queue (services/jobs.py) and runs
+extraction + summarisation outside the web process:
+
+    python worker.py --concurrency 4
+"""
+from dotenv import load_dotenv
+load_dotenv()
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+
+from database import get_db, close_pool
+import migrations
+from services import jobs, llm_client, query_expansion, blobs
+from services.document_pipeline import process_document, DocumentGone
+from utils import metrics
+
+POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+STALE_CHECK_INTERVAL = 60.0
+# Refresh ai_boost expansions for frequent queries / top tags (0 disables)
+EXPANSION_PREFETCH_INTERVAL = float(os.getenv("EXPANSION_PREFETCH_INTERVAL", "3600"))
+# Serve Prometheus metrics (job durations, extraction, LLM calls) on this port (0 disables)
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+# Remove upload files left behind by rolled-back uploads (services/blobs.py; 0 disables)
+BLOB_SWEEP_INTERVAL = float(os.getenv("BLOB_SWEEP_INTERVAL", "3600"))
+
+stop = threading.Event()
+
+
+def run_one(worker_id: str) -> bool:
+    """Claim and run a single job. Returns False when the queue is empty."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        job = jobs.claim(cursor, worker_id)
+        cursor.close()
+    if not job:
+        return False
+
+    def on_progress(done, total):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            jobs.report_progress(cursor, job, done, total)
+            cursor.close()
+
+    # Keeps locked_at fresh through extraction and summarisation alike, so a
+    # long job isn't requeued as stale while its worker is still alive
+    done = threading.Event()
+
+    def heartbeat():
+        while not done.wait(jobs.JOB_HEARTBEAT_SECONDS):
+            try:
+                with get_db() as conn:
+                    cursor = conn.cursor()
+                    owned = jobs.heartbeat(cursor, job)
+                    cursor.close()
+            except Exception:
+                traceback.print_exc()
+                continue
+            if not owned:
+                print(f"[{worker_id}] job {job['id']} lost its lock (requeued as stale)")
+                return
+
+    threading.Thread(target=heartbeat, name=f"{worker_id}-heartbeat", daemon=True).start()
+    start = time.perf_counter()
+    outcome = "failed"
+    try:
+        process_document(job["document_id"], job["mimetype"] or "", reuse=job["kind"] != "rescan", on_progress=on_progress)
+        outcome = "done"
+    except DocumentGone:
+        outcome = "gone"
+        with get_db() as conn:
+            cursor = conn.cursor()
+            jobs.complete(cursor, job)
+            cursor.close()
+    except Exception as e:
+        print(f"[{worker_id}] job {job['id']} (document {job['document_id']}) failed: {e}")
+        traceback.print_exc()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            jobs.fail(cursor, job, f"{type(e).__name__}: {e}")
+            cursor.close()
+    else:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            jobs.complete(cursor, job)
+            cursor.close()
+    finally:
+        done.set()
+        jobs.JOB_SECONDS.observe(time.perf_counter() - start, (job["kind"], outcome))
+    return True
+
+
+def worker_loop(worker_id: str):
+    while not stop.is_set():
+        try:
+            if not run_one(worker_id):
+                stop.wait(POLL_INTERVAL)
+        except Exception:
+            traceback.print_exc()
+            stop.wait(POLL_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Knowledge Vault document worker")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", "2")))
+    args = parser.parse_args()
+
+    migrations.check_on_startup()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(target=worker_loop, args=(f"{prefix}:{i}",), name=f"worker-{i}", daemon=True)
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    print(f"✅ Worker started with {args.concurrency} thread(s)")
+    if WORKER_METRICS_PORT:
+        metrics.serve(WORKER_METRICS_PORT)
+        print(f"✅ Metrics on :{WORKER_METRICS_PORT}/metrics")
+
+    prefetcher = None
+    last_prefetch = 0.0
+    last_sweep = time.monotonic()
+    while not stop.wait(STALE_CHECK_INTERVAL):
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                requeued, failed = jobs.requeue_stale(cursor)
+                cursor.close()
+        except Exception:
+            traceback.print_exc()
+        else:
+            if requeued or failed:
+                print(f"Stale jobs: {requeued} requeued, {failed} failed")
+        if EXPANSION_PREFETCH_INTERVAL > 0 and time.monotonic() - last_prefetch >= EXPANSION_PREFETCH_INTERVAL \
+                and not (prefetcher and prefetcher.is_alive()):
+            last_prefetch = time.monotonic()
+            prefetcher = threading.Thread(target=query_expansion.prefetch, name="expansion-prefetch", daemon=True)
+            prefetcher.start()
+        if BLOB_SWEEP_INTERVAL > 0 and time.monotonic() - last_sweep >= BLOB_SWEEP_INTERVAL:
+            last_sweep = time.monotonic()
+            try:
+                removed = blobs.sweep()
+            except Exception:
+                traceback.print_exc()
+            else:
+                if removed:
+                    print(f"Removed {removed} orphaned upload file(s)")
+
+    print("Stopping, waiting for running jobs to finish…")
+    for t in threads:
+        t.join()
+    llm_client.close()
+    close_pool()
+
+
+if __name__ == "__main__":
+    main()
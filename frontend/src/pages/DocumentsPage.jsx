@@ -132,7 +132,7 @@ function DocModal({ doc, onClose }) {
                         background: 'var(--bg-card)', border: '1px solid var(--border)',
                     }}>
                         <p style={{ fontSize: 13, marginBottom: 12, color: 'var(--text-dim)' }}>
-                            {doc.extracted_text ? 'No summary yet.' : 'Document still processing…'}
+                            {doc.text_length ? 'No summary yet.' : 'Document still processing…'}
                         </p>
                         <button className="btn btn-ghost btn-sm" onClick={handleRescan} disabled={rescanning}>
                             <RefreshCw size={12} /> {rescanning ? 'Processing…' : 'Generate AI Summary'}
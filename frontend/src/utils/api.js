@@ -71,6 +71,8 @@ export const DocumentsAPI = {
   rescan: (id) => api.post(`/documents/${id}/rescan`),
   download: (id) =>
     api.get(`/documents/${id}/download`, { responseType: "blob" }),
+  text: (id, offset = 0, limit) =>
+    api.get(`/documents/${id}/text`, { params: { offset, limit } }),
 };
 
 /* =====================================================